@@ -0,0 +1,142 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+# Selects the newest snapshots out of 10,000 synthetic ones, once by sorting
+# them with the previous pairwise comparison and once by using the cached sort
+# keys, i.e., Subvolume.select_snapshots.
+#
+# Usage: PYTHONPATH=src python benchmarks/snapshot_selection.py
+
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from functools import cmp_to_key
+from pathlib import Path
+from uuid import uuid4
+
+from more_itertools import take
+
+from refind_btrfs.device import NumIdRelation, Subvolume, UuidRelation
+from refind_btrfs.utility.helpers import none_throws
+
+SNAPSHOT_COUNT = 10_000
+SELECTION_COUNTS = [5, sys.maxsize]
+REPEAT_COUNT = 5
+MAX_MINUTES_OFFSET = 10**7
+
+
+def create_parent_with_snapshots(snapshot_count: int) -> Subvolume:
+    time_created = datetime(2020, 1, 1)
+    parent_uuid = uuid4()
+    parent = Subvolume(
+        Path("/"),
+        "@",
+        time_created,
+        UuidRelation(parent_uuid, uuid4()),
+        NumIdRelation(256, 5),
+        False,
+    )
+    snapshots = [
+        Subvolume(
+            Path(f"/.snapshots/{number}/snapshot"),
+            f"@/.snapshots/{number}/snapshot",
+            time_created + timedelta(minutes=random.randint(0, MAX_MINUTES_OFFSET)),
+            UuidRelation(uuid4(), parent_uuid),
+            NumIdRelation(256 + number, 256),
+            True,
+        )
+        for number in range(1, snapshot_count + 1)
+    ]
+
+    return parent.with_snapshots(snapshots)
+
+
+# the comparison which used to be done by Subvolume.__lt__
+def compare_pairwise(first: Subvolume, second: Subvolume) -> int:
+    attributes_for_comparison = [
+        none_throws(subvolume.created_from).time_created
+        if subvolume.is_newly_created()
+        else subvolume.time_created
+        for subvolume in (first, second)
+    ]
+
+    if attributes_for_comparison[0] < attributes_for_comparison[1]:
+        return -1
+
+    if attributes_for_comparison[1] < attributes_for_comparison[0]:
+        return 1
+
+    return 0
+
+
+def select_by_sorting(parent: Subvolume, count: int) -> list[Subvolume]:
+    snapshots = none_throws(parent.snapshots)
+
+    return take(
+        count, sorted(snapshots, key=cmp_to_key(compare_pairwise), reverse=True)
+    )
+
+
+def select_by_sort_keys(parent: Subvolume, count: int) -> list[Subvolume]:
+    return none_throws(parent.select_snapshots(count))
+
+
+def measure(selector_name: str, count: int) -> float:
+    # the sort keys are cached, which is why every measurement gets new ones
+    timings = timeit.repeat(
+        f"{selector_name}(parent, {count})",
+        setup=f"parent = create_parent_with_snapshots({SNAPSHOT_COUNT})",
+        number=1,
+        repeat=REPEAT_COUNT,
+        globals=globals(),
+    )
+
+    return min(timings)
+
+
+def main() -> None:
+    random.seed(SNAPSHOT_COUNT)
+
+    for count in SELECTION_COUNTS:
+        previous_timing = measure(select_by_sorting.__name__, count)
+        current_timing = measure(select_by_sort_keys.__name__, count)
+        count_str = str(count) if count != sys.maxsize else "all"
+
+        print(
+            f"selection_count = {count_str}: "
+            f"{previous_timing * 1000:.1f} ms -> {current_timing * 1000:.1f} ms"
+        )
+
+    parent = create_parent_with_snapshots(SNAPSHOT_COUNT)
+    count = SELECTION_COUNTS[0]
+
+    assert [
+        snapshot.time_created for snapshot in select_by_sorting(parent, count)
+    ] == [
+        snapshot.time_created for snapshot in select_by_sort_keys(parent, count)
+    ], "Both of the selections must be equal!"
+
+
+if __name__ == "__main__":
+    main()
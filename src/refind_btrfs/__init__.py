@@ -23,22 +23,29 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
 from argparse import ArgumentParser
+from pathlib import Path
 from typing import Optional
 
 from injector import Injector
 
-from refind_btrfs.common import constants
+from refind_btrfs.common import ProcessBundle, constants
 from refind_btrfs.common.abc import BaseRunner
 from refind_btrfs.common.abc.factories import BaseLoggerFactory
-from refind_btrfs.common.enums import RunMode
-from refind_btrfs.common.exceptions import PackageConfigError
+from refind_btrfs.common.enums import PersistenceBackend, ProcessBundleMode, RunMode
+from refind_btrfs.common.exceptions import PackageConfigError, ProcessBundleError
 from refind_btrfs.utility.helpers import check_access_rights, checked_cast, none_throws
-from refind_btrfs.utility.injector_modules import CLIModule, WatchdogModule
+from refind_btrfs.utility.injector_modules import (
+    CLIModule,
+    GarbageCollectionModule,
+    WatchdogModule,
+)
 
 
 def initialize_injector() -> Optional[Injector]:
     one_time_mode = RunMode.ONE_TIME.value
     background_mode = RunMode.BACKGROUND.value
+    shelve_backend = PersistenceBackend.SHELVE.value
+    sqlite_backend = PersistenceBackend.SQLITE.value
     parser = ArgumentParser(
         prog="refind-btrfs",
         usage="%(prog)s [options]",
@@ -56,13 +63,72 @@ def initialize_injector() -> Optional[Injector]:
         default=one_time_mode,
     )
 
+    parser.add_argument(
+        "--persistence-backend",
+        help="Storage of the local database",
+        choices=[shelve_backend, sqlite_backend],
+        type=str,
+        default=shelve_backend,
+    )
+
+    parser.add_argument(
+        "--collect-garbage",
+        help="Prune the stale entries from the local database and compact it",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        help="Prepare the changes without modifying the snapshots or the files",
+        action="store_true",
+    )
+
+    process_bundle_group = parser.add_mutually_exclusive_group()
+
+    process_bundle_group.add_argument(
+        "--record-processes",
+        help="Record the outputs of the executed processes to a bundle file",
+        metavar="BUNDLE_FILE",
+        type=Path,
+    )
+    process_bundle_group.add_argument(
+        "--replay-processes",
+        help="Replay the outputs of the processes from a bundle file",
+        metavar="BUNDLE_FILE",
+        type=Path,
+    )
+
     arguments = parser.parse_args()
     run_mode = checked_cast(str, none_throws(arguments.run_mode))
+    persistence_backend = PersistenceBackend(
+        checked_cast(str, arguments.persistence_backend)
+    )
+    is_dry_run = checked_cast(bool, arguments.dry_run)
+    process_bundle = ProcessBundle.none()
+
+    # the replayed outputs don't describe this system's devices so acting
+    # upon them could modify the wrong snapshots and files
+    if arguments.replay_processes is not None and not is_dry_run:
+        parser.error("argument --replay-processes: requires --dry-run")
+
+    if arguments.record_processes is not None:
+        process_bundle = ProcessBundle(
+            ProcessBundleMode.RECORD, arguments.record_processes
+        )
+    elif arguments.replay_processes is not None:
+        process_bundle = ProcessBundle(
+            ProcessBundleMode.REPLAY, arguments.replay_processes
+        )
+
+    if arguments.collect_garbage:
+        return Injector(GarbageCollectionModule(process_bundle, persistence_backend))
 
     if run_mode == one_time_mode:
-        return Injector(CLIModule)
+        return Injector(CLIModule(process_bundle, persistence_backend, is_dry_run))
     elif run_mode == background_mode:
-        return Injector(WatchdogModule)
+        return Injector(
+            WatchdogModule(process_bundle, persistence_backend, is_dry_run)
+        )
 
     return None
 
@@ -78,7 +144,7 @@ def main() -> int:
 
         runner = injector.get(BaseRunner)
         exit_code = runner.run()
-    except PackageConfigError as e:
+    except (PackageConfigError, ProcessBundleError) as e:
         exit_code = constants.EX_NOT_OK
         logger.error(e.formatted_message)
     except PermissionError as e:
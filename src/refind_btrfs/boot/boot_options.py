@@ -139,16 +139,20 @@ class BootOptions:
                         constants.PARAMETERIZED_OPTION_SEPARATOR
                     )
                 )
-                root_location_comparers = [
-                    root_partition.label,
-                    root_partition.uuid,
-                    filesystem.label,
-                    filesystem.uuid,
-                ]
+                live_partition_table = none_throws(block_device.live_partition_table)
+                identified_partitions = (
+                    live_partition_table.find_partitions_identified_by(
+                        normalized_root_location
+                    )
+                )
+
+                is_root_partition_identified = any(
+                    identified_partition is root_partition
+                    for identified_partition in identified_partitions
+                )
 
-                if (
-                    normalized_root_location in root_location_comparers
-                    or block_device.is_matched_with(normalized_root_location)
+                if is_root_partition_identified or block_device.is_matched_with(
+                    normalized_root_location
                 ):
                     root_mount_options = self.root_mount_options
                     subvolume = none_throws(filesystem.subvolume)
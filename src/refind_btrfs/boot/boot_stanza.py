@@ -103,6 +103,17 @@ class BootStanza:
 
         return hash((self.volume, self.loader_path, str(boot_options)))
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        cached_property_names = ["filename", "all_boot_file_paths", "_loader_filename"]
+
+        state["_boot_files_check_result"] = None
+
+        for cached_property_name in cached_property_names:
+            state.pop(cached_property_name, None)
+
+        return state
+
     def __str__(self) -> str:
         result: list[str] = []
         main_indent = constants.EMPTY_STR
@@ -129,7 +129,9 @@ class RefindConfig(BaseConfig):
 
             if has_items(bootable_snapshots):
                 sorted_bootable_snapshots = sorted(
-                    none_throws(bootable_snapshots), reverse=True
+                    none_throws(bootable_snapshots),
+                    key=lambda snapshot: snapshot.sort_key,
+                    reverse=True,
                 )
                 migration = Migration(
                     boot_stanza, block_device, sorted_bootable_snapshots
@@ -22,7 +22,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 from functools import cached_property
-from typing import Iterator, Optional, Set
+from typing import Any, Iterator, Optional, Set
 
 from refind_btrfs.common import constants
 from refind_btrfs.common.enums import (
@@ -60,6 +60,13 @@ class SubMenu:
         self._add_boot_options = add_boot_options
         self._is_disabled = is_disabled
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+
+        state.pop("all_boot_file_paths", None)
+
+        return state
+
     def __str__(self) -> str:
         main_indent = constants.TAB
         option_indent = main_indent * 2
@@ -23,6 +23,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from .boot_files_check_result import BootFilesCheckResult
 from .checkable_observer import CheckableObserver
+from .garbage_collection_result import GarbageCollectionResult
 from .configurable_mixin import ConfigurableMixin
 from .package_config import (
     BootStanzaGeneration,
@@ -32,3 +33,10 @@ from .package_config import (
     SnapshotManipulation,
     SnapshotSearch,
 )
+from .process_bundle import ProcessBundle
+from .snapshot_deletion_result import SnapshotDeletionResult
+from .snapshot_search_state import (
+    DirectorySearchState,
+    SnapshotSearchKey,
+    SnapshotSearchState,
+)
@@ -22,4 +22,5 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 from .base_config import BaseConfig
+from .base_process_executor import BaseProcessExecutor
 from .base_runner import BaseRunner
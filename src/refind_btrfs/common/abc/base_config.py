@@ -29,13 +29,18 @@ from pathlib import Path
 from typing import Any, Optional, Self
 
 from refind_btrfs.common.enums import ConfigInitializationType
-from refind_btrfs.utility.helpers import checked_cast, none_throws
+from refind_btrfs.utility.helpers import (
+    checked_cast,
+    none_throws,
+    try_get_content_hash_of,
+)
 
 
 class BaseConfig(ABC):
     def __init__(self, file_path: Path) -> None:
         self._file_path = file_path
         self._file_stat: Optional[stat_result] = None
+        self._content_hash: Optional[str] = None
         self._initialization_type: Optional[ConfigInitializationType] = None
 
         self.refresh_file_stat()
@@ -76,6 +81,7 @@ class BaseConfig(ABC):
 
         if file_path.exists():
             self._file_stat = file_path.stat()
+            self._content_hash = try_get_content_hash_of(file_path)
 
     def is_modified(self, actual_file_path: Path) -> bool:
         current_file_path = self.file_path
@@ -88,7 +94,21 @@ class BaseConfig(ABC):
         if actual_file_path.exists():
             actual_file_stat = actual_file_path.stat()
 
-            return current_file_stat.st_mtime != actual_file_stat.st_mtime
+            if current_file_stat.st_mtime == actual_file_stat.st_mtime:
+                return False
+
+            # the file could have been touched without its content being changed
+            current_content_hash = self.content_hash
+
+            if current_content_hash is not None:
+                actual_content_hash = try_get_content_hash_of(actual_file_path)
+
+                if current_content_hash == actual_content_hash:
+                    self._file_stat = actual_file_stat
+
+                    return False
+
+            return True
 
         return True
 
@@ -105,6 +125,10 @@ class BaseConfig(ABC):
     def file_stat(self) -> Optional[stat_result]:
         return self._file_stat
 
+    @property
+    def content_hash(self) -> Optional[str]:
+        return self._content_hash
+
     @property
     def initialization_type(self) -> Optional[ConfigInitializationType]:
         return self._initialization_type
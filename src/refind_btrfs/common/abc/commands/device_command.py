@@ -25,7 +25,7 @@ from abc import ABC, abstractmethod
 from functools import singledispatchmethod
 from typing import Any, Iterator
 
-from refind_btrfs.device import BlockDevice, PartitionTable, Subvolume
+from refind_btrfs.device import BlockDevice, Partition, PartitionTable, Subvolume
 
 
 class DeviceCommand(ABC):
@@ -33,6 +33,10 @@ class DeviceCommand(ABC):
     def get_block_devices(self) -> Iterator[BlockDevice]:
         pass
 
+    @abstractmethod
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        pass
+
     @singledispatchmethod
     def get_partition_table_for(self, argument: Any) -> PartitionTable:
         raise NotImplementedError(
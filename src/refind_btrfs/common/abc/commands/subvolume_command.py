@@ -23,8 +23,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import Iterable, Iterator, Optional
 
+from refind_btrfs.common import SnapshotDeletionResult
 from refind_btrfs.device import Subvolume
 
 
@@ -46,5 +47,7 @@ class SubvolumeCommand(ABC):
         pass
 
     @abstractmethod
-    def delete_snapshot(self, snapshot: Subvolume) -> None:
+    def delete_snapshots(
+        self, snapshots: Iterable[Subvolume]
+    ) -> SnapshotDeletionResult:
         pass
@@ -24,16 +24,30 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
 from pathlib import Path
 from typing import TYPE_CHECKING, Optional
 
 if TYPE_CHECKING:
     from refind_btrfs.boot import RefindConfig
-    from refind_btrfs.common import PackageConfig
-    from refind_btrfs.state_management.model import ProcessingResult
+    from refind_btrfs.common import (
+        GarbageCollectionResult,
+        PackageConfig,
+        SnapshotSearchKey,
+        SnapshotSearchState,
+    )
+    from refind_btrfs.device import Subvolume
+    from refind_btrfs.state_management.model import (
+        BlockDeviceTopology,
+        ProcessingResult,
+    )
 
 
 class BasePersistenceProvider(ABC):
+    @abstractmethod
+    def session(self) -> AbstractContextManager[None]:
+        pass
+
     @abstractmethod
     def get_package_config(self) -> Optional[PackageConfig]:
         pass
@@ -57,3 +71,37 @@ class BasePersistenceProvider(ABC):
     @abstractmethod
     def save_current_run_result(self, value: ProcessingResult) -> None:
         pass
+
+    @abstractmethod
+    def get_block_device_topology(self) -> Optional[BlockDeviceTopology]:
+        pass
+
+    @abstractmethod
+    def save_block_device_topology(self, value: BlockDeviceTopology) -> None:
+        pass
+
+    @abstractmethod
+    def get_snapshot_search_states(
+        self,
+    ) -> dict[SnapshotSearchKey, SnapshotSearchState]:
+        pass
+
+    @abstractmethod
+    def save_snapshot_search_states(
+        self, value: dict[SnapshotSearchKey, SnapshotSearchState]
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def get_pending_removals(self) -> list[Subvolume]:
+        pass
+
+    @abstractmethod
+    def save_pending_removals(self, value: list[Subvolume]) -> None:
+        pass
+
+    @abstractmethod
+    def collect_garbage(
+        self, is_compaction_forced: bool = False
+    ) -> GarbageCollectionResult:
+        pass
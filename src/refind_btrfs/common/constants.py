@@ -40,11 +40,21 @@ MESSAGE_CTRL_C_INTERRUPT = "Ctrl+C interrupt detected, exiting..."
 MESSAGE_UNEXPECTED_ERROR = "An unexpected error happened, exiting..."
 
 WATCH_TIMEOUT = 1
+MAX_PARTITION_TABLE_WORKERS = 8
+MAX_SNAPSHOT_ADDITION_WORKERS = 4
+PROCESS_TIMEOUT = 30
+SQLITE_BUSY_TIMEOUT = 30
+MAX_DB_FREE_SPACE_RATIO = 0.25
+MIN_DB_FREE_SPACE_SIZE = 64 * 1024
+DBM_FILE_SUFFIXES: tuple[str, ...] = ("", ".dat", ".dir", ".bak", ".db")
 BACKGROUND_MODE_PID_NAME = f"{PACKAGE_NAME}-watchdog"
 
 MTAB_PT_TYPE = "mtab"
 FSTAB_PT_TYPE = "fstab"
 
+RAM_DEVICE_MAJOR_NUMBER = 1
+SCSI_ROM_DEVICE_TYPE = "5"
+
 ESP_PART_TYPE_CODE = 0xEF
 ESP_PART_TYPE_UUID = UUID(hex="c12a7328-f81f-11d2-ba4b-00a0c93ec93b")
 
@@ -53,10 +63,16 @@ BTRFS_TYPE = "btrfs"
 
 SNAPSHOT_SELECTION_COUNT_INFINITY = "inf"
 SNAPSHOTS_ROOT_DIR_PERMISSIONS = 0o750
+SUBVOLUME_READ_ONLY_FLAG = 0x1
+SUBVOLUME_ROOT_INODE = 256
 
 PARAMETERIZED_OPTION_SEPARATOR = "="
 BOOT_OPTION_SEPARATOR = " "
 COLUMN_SEPARATOR = ","
+MOUNTINFO_FIELDS_SEPARATOR = "-"
+UDEV_PROPERTY_PREFIX = "E:"
+UDEV_BLOCK_DEVICE_PREFIX = "b"
+DM_UUID_SEPARATOR = "-"
 
 ROOT_PREFIX = f"root{PARAMETERIZED_OPTION_SEPARATOR}"
 ROOTFLAGS_PREFIX = f"rootflags{PARAMETERIZED_OPTION_SEPARATOR}"
@@ -79,6 +95,8 @@ DEFAULT_ITEMS_SEPARATOR = COLUMN_SEPARATOR + SPACE
 DEFAULT_DIR_SEPARATOR_REPLACEMENT: tuple[str, str] = (BACKSLASH, FORWARD_SLASH)
 
 WHITESPACE_PATTERN = r"\s+"
+OCTAL_ESCAPE_PATTERN = r"\\([0-7]{3})"
+HEX_ESCAPE_PATTERN = r"\\x([0-9a-fA-F]{2})"
 INCLUDE_OPTION_PATTERN = r"^include .+$"
 PARAMETERIZED_OPTION_PREFIX_PATTERN = r"^\S+="
 DIR_SEPARATOR_PATTERN = f"({BACKSLASH * 2}|{FORWARD_SLASH})"
@@ -90,16 +108,30 @@ CONFIG_FILE_EXTENSION = ".conf"
 CONFIG_FILENAME = PACKAGE_NAME + CONFIG_FILE_EXTENSION
 SNAPSHOT_STANZAS_DIR_NAME = "btrfs-snapshot-stanzas"
 ICONS_DIR = "icons"
+SNAPPER_SNAPSHOT_DIR_NAME = "snapshot"
+TIMESHIFT_DIR_NAME = "timeshift-btrfs"
+TIMESHIFT_SNAPSHOTS_DIR_NAME = "snapshots"
+TIMESHIFT_SUBVOLUME_PREFIX = "@"
 
 ROOT_DIR = Path("/")
 BOOT_DIR = Path("boot")
 ETC_DIR = Path("etc")
 VAR_DIR = Path("var")
 LIB_DIR = Path("lib")
+PROC_DIR = Path("proc")
+RUN_DIR = Path("run")
+SYS_DIR = Path("sys")
+DEV_DIR = Path("dev")
 
 FSTAB_FILE = ETC_DIR / "fstab"
+MOUNTINFO_FILE = PROC_DIR / "self" / "mountinfo"
+PARTITIONS_FILE = PROC_DIR / "partitions"
+UDEV_DATA_DIR = RUN_DIR / "udev" / "data"
+SYS_BLOCK_DIR = SYS_DIR / "block"
+DEV_MAPPER_DIR = ROOT_DIR / DEV_DIR / "mapper"
 PACKAGE_CONFIG_FILE = ROOT_DIR / ETC_DIR / CONFIG_FILENAME
 PACKAGE_LIB_DIR = ROOT_DIR / VAR_DIR / LIB_DIR / PACKAGE_NAME
 BTRFS_LOGOS_DIR = PACKAGE_LIB_DIR / ICONS_DIR / "btrfs_logo"
 DB_FILE = PACKAGE_LIB_DIR / "local_db"
+SQLITE_DB_FILE = PACKAGE_LIB_DIR / "local_db.sqlite3"
 DB_ITEM_VERSION_SUFFIX = "version"
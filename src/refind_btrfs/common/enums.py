@@ -40,6 +40,26 @@ class RunMode(AutoNameToLower):
     BACKGROUND = auto()
 
 
+@unique
+class PersistenceBackend(AutoNameToLower):
+    SHELVE = auto()
+    SQLITE = auto()
+
+
+@unique
+class ProcessBundleMode(AutoNameToLower):
+    NONE = auto()
+    RECORD = auto()
+    REPLAY = auto()
+
+
+@unique
+class ProcessBundleKey(AutoNameToLower):
+    STDOUT = auto()
+    STDERR = auto()
+    RETURN_CODE = auto()
+
+
 @unique
 class LsblkJsonKey(AutoNameToLower):
     BLOCKDEVICES = auto()
@@ -79,6 +99,56 @@ class FindmntColumn(Enum):
     FS_MOUNT_OPTIONS = "options"
 
 
+@unique
+class MountinfoColumn(Enum):
+    MAJOR_MINOR = 2
+    FS_ROOT = 3
+    FS_MOUNT_POINT = 4
+    FS_MOUNT_OPTIONS = 5
+
+
+@unique
+class MountinfoSuffixColumn(Enum):
+    FS_TYPE = 0
+    DEVICE_NAME = 1
+    FS_SUPER_OPTIONS = 2
+
+
+@unique
+class SysfsAttribute(Enum):
+    MAJOR_MINOR = "dev"
+    SIZE = "size"
+    PARTITION = "partition"
+    HOLDERS = "holders"
+    SLAVES = "slaves"
+    DM_NAME = "dm/name"
+    DM_UUID = "dm/uuid"
+    MD_LEVEL = "md/level"
+    SCSI_DEVICE_TYPE = "device/type"
+
+
+@unique
+class BlockDeviceType(AutoNameToLower):
+    DISK = auto()
+    PART = auto()
+    LOOP = auto()
+    ROM = auto()
+    DM = auto()
+
+
+@unique
+class UdevProperty(Enum):
+    PTABLE_UUID = "ID_PART_TABLE_UUID"
+    PTABLE_TYPE = "ID_PART_TABLE_TYPE"
+    PART_UUID = "ID_PART_ENTRY_UUID"
+    PART_TYPE = "ID_PART_ENTRY_TYPE"
+    PART_LABEL = "ID_PART_ENTRY_NAME"
+    FS_UUID = "ID_FS_UUID"
+    FS_TYPE = "ID_FS_TYPE"
+    FS_LABEL = "ID_FS_LABEL"
+    FS_LABEL_ENC = "ID_FS_LABEL_ENC"
+
+
 @unique
 class FstabColumn(Enum):
     DEVICE_NAME = 0
@@ -107,6 +177,8 @@ class ConfigInitializationType(Enum):
 class TopLevelConfigKey(AutoNameToLower):
     EXIT_IF_ROOT_IS_SNAPSHOT = auto()
     EXIT_IF_NO_CHANGES_ARE_DETECTED = auto()
+    SNAPSHOT_SEARCH_CONCURRENCY = auto()
+    DEVICE_TOPOLOGY_SOURCE = auto()
     ESP_UUID = auto()
     SNAPSHOT_SEARCH = "snapshot-search"
     SNAPSHOT_MANIPULATION = "snapshot-manipulation"
@@ -118,6 +190,21 @@ class SnapshotSearchConfigKey(AutoNameToLower):
     DIRECTORY = auto()
     IS_NESTED = auto()
     MAX_DEPTH = auto()
+    LAYOUT = auto()
+
+
+@unique
+class DeviceTopologySource(AutoNameToLower):
+    COMMANDS = auto()
+    KERNEL = auto()
+
+
+@unique
+class SnapshotSearchLayout(AutoNameToLower):
+    AUTO = auto()
+    GENERIC = auto()
+    SNAPPER = auto()
+    TIMESHIFT = auto()
 
 
 @unique
@@ -126,6 +213,7 @@ class SnapshotManipulationConfigKey(AutoNameToLower):
     MODIFY_READ_ONLY_FLAG = auto()
     DESTINATION_DIRECTORY = auto()
     CLEANUP_EXCLUSION = auto()
+    CLEANUP_IN_BACKGROUND = auto()
 
 
 @unique
@@ -191,6 +279,9 @@ class LocalDbKey(AutoNameToLower):
     PACKAGE_CONFIG = auto()
     REFIND_CONFIGS = auto()
     PROCESSING_RESULT = auto()
+    BLOCK_DEVICE_TOPOLOGY = auto()
+    SNAPSHOT_SEARCH_STATES = auto()
+    PENDING_REMOVALS = auto()
 
 
 @unique
@@ -79,6 +79,14 @@ class RefindConfigError(RefindBtrfsError):
     pass
 
 
+class ProcessBundleError(RefindBtrfsError):
+    pass
+
+
+class PersistenceError(RefindBtrfsError):
+    pass
+
+
 class RefindSyntaxError(RefindBtrfsError):
     def __init__(self, line: int, column: int, message: str) -> None:
         super().__init__(message)
@@ -36,6 +36,8 @@ from refind_btrfs.common.enums import (
     BtrfsLogoSize,
     BtrfsLogoVariant,
     BtrfsLogoVerticalAlignment,
+    DeviceTopologySource,
+    SnapshotSearchLayout,
 )
 from refind_btrfs.device import BlockDevice, Subvolume
 from refind_btrfs.utility.helpers import find_all_directories_in, has_items
@@ -45,6 +47,7 @@ class SnapshotSearch(NamedTuple):
     directory: Path
     is_nested: bool
     max_depth: int
+    layout: SnapshotSearchLayout
 
     def __eq__(self, other: object) -> bool:
         if self is other:
@@ -64,6 +67,7 @@ class SnapshotManipulation(NamedTuple):
     modify_read_only_flag: bool
     destination_directory: Path
     cleanup_exclusion: Set[Subvolume]
+    cleanup_in_background: bool
 
 
 class BtrfsLogo(NamedTuple):
@@ -107,6 +111,8 @@ class PackageConfig(BaseConfig):
         esp_uuid: UUID,
         exit_if_root_is_snapshot: bool,
         exit_if_no_changes_are_detected: bool,
+        snapshot_search_concurrency: int,
+        device_topology_source: DeviceTopologySource,
         snapshot_searches: Iterable[SnapshotSearch],
         snapshot_manipulation: SnapshotManipulation,
         boot_stanza_generation: BootStanzaGeneration,
@@ -116,6 +122,8 @@ class PackageConfig(BaseConfig):
         self._esp_uuid = esp_uuid
         self._exit_if_root_is_snapshot = exit_if_root_is_snapshot
         self._exit_if_no_changes_are_detected = exit_if_no_changes_are_detected
+        self._snapshot_search_concurrency = snapshot_search_concurrency
+        self._device_topology_source = device_topology_source
         self._snapshot_searches = list(snapshot_searches)
         self._snapshot_manipulation = snapshot_manipulation
         self._boot_stanza_generation = boot_stanza_generation
@@ -142,6 +150,14 @@ class PackageConfig(BaseConfig):
     def exit_if_no_changes_are_detected(self) -> bool:
         return self._exit_if_no_changes_are_detected
 
+    @property
+    def snapshot_search_concurrency(self) -> int:
+        return self._snapshot_search_concurrency
+
+    @property
+    def device_topology_source(self) -> DeviceTopologySource:
+        return self._device_topology_source
+
     @property
     def snapshot_searches(self) -> list[SnapshotSearch]:
         return self._snapshot_searches
@@ -0,0 +1,44 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import NamedTuple, Optional, Self
+
+from refind_btrfs.common.enums import ProcessBundleMode
+
+
+class ProcessBundle(NamedTuple):
+    mode: ProcessBundleMode
+    file_path: Optional[Path]
+
+    @classmethod
+    def none(cls) -> Self:
+        return cls(ProcessBundleMode.NONE, None)
+
+    def is_recording(self) -> bool:
+        return self.mode == ProcessBundleMode.RECORD
+
+    def is_replaying(self) -> bool:
+        return self.mode == ProcessBundleMode.REPLAY
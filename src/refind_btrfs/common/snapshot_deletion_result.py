@@ -0,0 +1,44 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple
+
+from refind_btrfs.utility.helpers import has_items
+
+if TYPE_CHECKING:
+    from refind_btrfs.device import Subvolume
+
+
+class SnapshotDeletionResult(NamedTuple):
+    deleted_snapshots: list[Subvolume]
+    pending_snapshots: list[Subvolume]
+    skipped_snapshots: list[Subvolume]
+    failed_snapshots: list[Subvolume]
+
+    def has_deleted_snapshots(self) -> bool:
+        return has_items(self.deleted_snapshots)
+
+    def has_failed_snapshots(self) -> bool:
+        return has_items(self.failed_snapshots)
@@ -0,0 +1,98 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Self
+from uuid import UUID
+
+from refind_btrfs.common.enums import SnapshotSearchLayout
+
+if TYPE_CHECKING:
+    from refind_btrfs.common import SnapshotSearch
+    from refind_btrfs.device import Subvolume, SubvolumeRecord
+
+
+class SnapshotSearchKey(NamedTuple):
+    parent_uuid: UUID
+    directory: Path
+    is_nested: bool
+    max_depth: int
+    layout: SnapshotSearchLayout
+
+    @classmethod
+    def of(cls, parent: Subvolume, snapshot_search: SnapshotSearch) -> Self:
+        return cls(
+            parent.uuid,
+            snapshot_search.directory.resolve(),
+            snapshot_search.is_nested,
+            snapshot_search.max_depth,
+            snapshot_search.layout,
+        )
+
+
+# only the records of the found snapshots are kept, as the snapshots themselves
+# are modified later on (e.g., their static partition tables are initialized)
+class DirectorySearchState(NamedTuple):
+    generation: Optional[int]
+    directory_mtimes: dict[Path, int]
+    snapshot_records: list[SubvolumeRecord]
+    selection_count: Optional[int]
+
+    @classmethod
+    def of(
+        cls,
+        generation: Optional[int],
+        directory_mtimes: dict[Path, int],
+        snapshots: Iterable[Subvolume],
+        selection_count: Optional[int],
+    ) -> Self:
+        return cls(
+            generation,
+            directory_mtimes,
+            [snapshot.to_record() for snapshot in snapshots],
+            selection_count,
+        )
+
+    def is_partial(self) -> bool:
+        return self.selection_count is not None
+
+    def is_sufficient_for(self, selection_count: Optional[int]) -> bool:
+        current_selection_count = self.selection_count
+
+        if current_selection_count is None:
+            return True
+
+        return (
+            selection_count is not None and current_selection_count >= selection_count
+        )
+
+
+class SnapshotSearchState(NamedTuple):
+    directory_states: dict[Path, DirectorySearchState]
+
+    @property
+    def snapshot_records(self) -> Iterator[SubvolumeRecord]:
+        for directory_state in self.directory_states.values():
+            yield from directory_state.snapshot_records
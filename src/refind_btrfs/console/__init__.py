@@ -22,3 +22,4 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 from .cli_runner import CLIRunner
+from .garbage_collection_runner import GarbageCollectionRunner
@@ -46,7 +46,13 @@ class CLIRunner(BaseRunner):
         exit_code = os.EX_OK
 
         try:
-            if not machine.run():
+            is_successful = machine.run()
+
+            # unlike the background mode, the one-time mode doesn't leave the
+            # snapshot deletion running after it returns
+            machine.complete_cleanup()
+
+            if not is_successful:
                 exit_code = constants.EX_NOT_OK
         except SnapshotMountedAsRootError as e:
             logger.warning(e.formatted_message)
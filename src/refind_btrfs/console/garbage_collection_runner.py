@@ -0,0 +1,80 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+import os
+
+from injector import inject
+from pid import PidFile, PidFileAlreadyRunningError
+
+from refind_btrfs.common import constants
+from refind_btrfs.common.abc import BaseRunner
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.abc.providers import BasePersistenceProvider
+from refind_btrfs.common.exceptions import PersistenceError
+
+
+class GarbageCollectionRunner(BaseRunner):
+    @inject
+    def __init__(
+        self,
+        logger_factory: BaseLoggerFactory,
+        persistence_provider: BasePersistenceProvider,
+    ) -> None:
+        self._logger = logger_factory.logger(__name__)
+        self._persistence_provider = persistence_provider
+
+    def run(self) -> int:
+        logger = self._logger
+        persistence_provider = self._persistence_provider
+        exit_code = os.EX_OK
+
+        try:
+            # the same PID file as the one of the background mode is claimed,
+            # so the garbage is never collected while the watchdog is running
+            with PidFile(
+                pidname=constants.BACKGROUND_MODE_PID_NAME, lock_pidfile=False
+            ):
+                garbage_collection_result = persistence_provider.collect_garbage(
+                    is_compaction_forced=True
+                )
+        except PidFileAlreadyRunningError as e:
+            exit_code = constants.EX_NOT_OK
+            logger.error(e.message)
+        except PersistenceError as e:
+            exit_code = constants.EX_NOT_OK
+            logger.error(e.formatted_message)
+        else:
+            removed_entry_count = garbage_collection_result.removed_entry_count
+
+            if garbage_collection_result.has_removed_entries():
+                logger.info(f"Removed {removed_entry_count} stale entries.")
+            else:
+                logger.info("No stale entries were found.")
+
+            logger.info(
+                "The size of the local database went from "
+                f"{garbage_collection_result.size_before} to "
+                f"{garbage_collection_result.size_after} bytes."
+            )
+
+        return exit_code
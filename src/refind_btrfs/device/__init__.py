@@ -26,4 +26,4 @@ from .filesystem import Filesystem
 from .mount_options import MountOptions
 from .partition import Partition
 from .partition_table import PartitionTable
-from .subvolume import NumIdRelation, Subvolume, UuidRelation
+from .subvolume import NumIdRelation, Subvolume, SubvolumeRecord, UuidRelation
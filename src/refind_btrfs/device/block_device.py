@@ -27,7 +27,7 @@ import re
 from typing import Iterable, Optional, Self, Union
 
 from refind_btrfs.common.abc.factories import BaseDeviceCommandFactory
-from refind_btrfs.utility.helpers import has_items, none_throws
+from refind_btrfs.utility.helpers import none_throws
 
 from .partition import Partition
 from .partition_table import PartitionTable
@@ -45,15 +45,26 @@ class BlockDevice:
         self._physical_partition_table: Optional[PartitionTable] = None
         self._live_partition_table: Optional[PartitionTable] = None
         self._dependencies: Optional[list[BlockDevice]] = None
+        self._matched_names = {name}
 
     def with_dependencies(self, dependencies: Iterable[BlockDevice]) -> Self:
         self._dependencies = list(dependencies)
+        self._matched_names = self._matched_names.union(
+            *(dependency._matched_names for dependency in self._dependencies)
+        )
 
         return self
 
     def initialize_partition_tables_using(
         self,
         device_command_factory: BaseDeviceCommandFactory,
+    ) -> None:
+        self.initialize_physical_partition_table_using(device_command_factory)
+        self.initialize_live_partition_table_using(device_command_factory)
+
+    def initialize_physical_partition_table_using(
+        self,
+        device_command_factory: BaseDeviceCommandFactory,
     ) -> None:
         if not self.has_physical_partition_table():
             physical_device_command = device_command_factory.physical_device_command()
@@ -62,6 +73,10 @@ class BlockDevice:
                 physical_device_command.get_partition_table_for(self)
             )
 
+    def initialize_live_partition_table_using(
+        self,
+        device_command_factory: BaseDeviceCommandFactory,
+    ) -> None:
         if not self.has_live_partition_table():
             live_device_command = device_command_factory.live_device_command()
 
@@ -70,18 +85,7 @@ class BlockDevice:
             )
 
     def is_matched_with(self, name: str) -> bool:
-        if self.name == name:
-            return True
-        else:
-            dependencies = self.dependencies
-
-            if has_items(dependencies):
-                return any(
-                    dependency.is_matched_with(name)
-                    for dependency in none_throws(dependencies)
-                )
-
-        return False
+        return name in self._matched_names
 
     def has_physical_partition_table(self) -> bool:
         return self.physical_partition_table is not None
@@ -24,7 +24,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional, Self
+from typing import Any, Optional, Self
 
 from refind_btrfs.common.abc.factories import BaseSubvolumeCommandFactory
 from refind_btrfs.utility.helpers import is_none_or_whitespace
@@ -44,6 +44,15 @@ class Filesystem:
         self._mount_options: Optional[MountOptions] = None
         self._subvolume: Optional[Subvolume] = None
 
+    # the subvolume and its snapshots are meant to be discovered during every
+    # run, so they must never be persisted along with the device topology
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+
+        state["_subvolume"] = None
+
+        return state
+
     def with_dump_and_fsck(self, dump: int, fsck: int) -> Self:
         self._dump = dump
         self._fsck = fsck
@@ -76,10 +76,7 @@ class Partition:
 
         if filesystem is not None:
             if uuid == constants.EMPTY_UUID:
-                is_matched = (
-                    self.part_type_code == constants.ESP_PART_TYPE_CODE
-                    or self.part_type_uuid == constants.ESP_PART_TYPE_UUID
-                )
+                is_matched = self.has_esp_part_type()
             else:
                 parsed_uuid = try_parse_uuid(self.uuid)
 
@@ -93,6 +90,12 @@ class Partition:
 
         return False
 
+    def has_esp_part_type(self) -> bool:
+        return (
+            self.part_type_code == constants.ESP_PART_TYPE_CODE
+            or self.part_type_uuid == constants.ESP_PART_TYPE_UUID
+        )
+
     def is_root(self) -> bool:
         filesystem = self.filesystem
 
@@ -24,6 +24,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 import re
+from copy import deepcopy
 from functools import cached_property
 from pathlib import Path
 from typing import Iterable, Optional, Self
@@ -33,7 +34,13 @@ from more_itertools import only, take
 
 from refind_btrfs.common import constants
 from refind_btrfs.common.enums import FstabColumn
-from refind_btrfs.utility.helpers import has_items, is_none_or_whitespace, none_throws
+from refind_btrfs.utility.helpers import (
+    default_if_none,
+    has_items,
+    is_none_or_whitespace,
+    none_throws,
+    try_parse_uuid,
+)
 
 from .partition import Partition
 from .subvolume import Subvolume
@@ -46,6 +53,11 @@ class PartitionTable:
         self._esp_uuid = constants.EMPTY_UUID
         self._fstab_file_path: Optional[Path] = None
         self._partitions: Optional[list[Partition]] = None
+        self._has_shared_partitions = False
+        self._partitions_by_mount_point: dict[str, list[Partition]] = {}
+        self._partitions_by_identifier: dict[str, list[Partition]] = {}
+        self._partitions_by_uuid: dict[UUID, list[Partition]] = {}
+        self._esp_part_type_partitions: list[Partition] = []
 
     def __eq__(self, other: object) -> bool:
         if self is other:
@@ -71,9 +83,36 @@ class PartitionTable:
 
     def with_partitions(self, partitions: Iterable[Partition]) -> Self:
         self._partitions = list(partitions)
+        self._has_shared_partitions = False
+
+        self._index_partitions()
+
+        return self
+
+    def with_shared_partitions(self, partitions: Iterable[Partition]) -> Self:
+        self._partitions = list(partitions)
+        self._has_shared_partitions = True
+
+        self._index_partitions()
 
         return self
 
+    def as_shared_copy(self) -> PartitionTable:
+        shared_copy = PartitionTable(self.uuid, self.pt_type).with_esp_uuid(
+            self.esp_uuid
+        )
+        fstab_file_path = self.fstab_file_path
+
+        if fstab_file_path is not None:
+            shared_copy = shared_copy.with_fstab_file_path(fstab_file_path)
+
+        if self.has_partitions():
+            shared_copy = shared_copy.with_shared_partitions(
+                none_throws(self.partitions)
+            )
+
+        return shared_copy
+
     def is_matched_with(self, subvolume: Subvolume) -> bool:
         root = self.root
 
@@ -88,9 +127,15 @@ class PartitionTable:
     def has_partitions(self) -> bool:
         return has_items(self.partitions)
 
+    def find_partitions_identified_by(self, identifier: str) -> list[Partition]:
+        return self._partitions_by_identifier.get(identifier, [])
+
     def migrate_from_to(
         self, source_subvolume: Subvolume, destination_subvolume: Subvolume
     ) -> None:
+        if self._has_shared_partitions:
+            self._unshare_partitions()
+
         root = none_throws(self.root)
         filesystem = none_throws(root.filesystem)
         mount_options = none_throws(filesystem.mount_options)
@@ -128,6 +173,55 @@ class PartitionTable:
 
         return fstab_line
 
+    def _unshare_partitions(self) -> None:
+        self._partitions = deepcopy(self._partitions)
+        self._has_shared_partitions = False
+
+        for cached_property_name in ["esp", "root", "boot"]:
+            self.__dict__.pop(cached_property_name, None)
+
+        self._index_partitions()
+
+    def _index_partitions(self) -> None:
+        partitions_by_mount_point: dict[str, list[Partition]] = {}
+        partitions_by_identifier: dict[str, list[Partition]] = {}
+        partitions_by_uuid: dict[UUID, list[Partition]] = {}
+        esp_part_type_partitions: list[Partition] = []
+
+        for partition in default_if_none(self.partitions, []):
+            identifiers = [partition.uuid, partition.name, partition.label]
+            filesystem = partition.filesystem
+            parsed_uuid = try_parse_uuid(partition.uuid)
+
+            # the ESP is looked up either by its UUID or by its type, depending
+            # on whether the former is known
+            if parsed_uuid is not None:
+                partitions_by_uuid.setdefault(parsed_uuid, []).append(partition)
+
+            if partition.has_esp_part_type():
+                esp_part_type_partitions.append(partition)
+
+            if filesystem is not None:
+                identifiers.extend([filesystem.uuid, filesystem.label])
+
+                if filesystem.is_mounted():
+                    mount_point = str(Path(filesystem.mount_point))
+
+                    partitions_by_mount_point.setdefault(mount_point, []).append(
+                        partition
+                    )
+
+            for identifier in set(identifiers):
+                if not is_none_or_whitespace(identifier):
+                    partitions_by_identifier.setdefault(identifier, []).append(
+                        partition
+                    )
+
+        self._partitions_by_mount_point = partitions_by_mount_point
+        self._partitions_by_identifier = partitions_by_identifier
+        self._partitions_by_uuid = partitions_by_uuid
+        self._esp_part_type_partitions = esp_part_type_partitions
+
     @staticmethod
     def is_valid_fstab_entry(value: Optional[str]) -> bool:
         if is_none_or_whitespace(value):
@@ -168,33 +262,23 @@ class PartitionTable:
 
     @cached_property
     def esp(self) -> Optional[Partition]:
-        if self.has_partitions():
-            return only(
-                partition
-                for partition in none_throws(self.partitions)
-                if partition.is_esp(self.esp_uuid)
-            )
+        esp_uuid = self.esp_uuid
+        candidates = (
+            self._esp_part_type_partitions
+            if esp_uuid == constants.EMPTY_UUID
+            else self._partitions_by_uuid.get(esp_uuid, [])
+        )
 
-        return None
+        return only(candidate for candidate in candidates if candidate.is_esp(esp_uuid))
 
     @cached_property
     def root(self) -> Optional[Partition]:
-        if self.has_partitions():
-            return only(
-                partition
-                for partition in none_throws(self.partitions)
-                if partition.is_root()
-            )
+        directory = constants.ROOT_DIR
 
-        return None
+        return only(self._partitions_by_mount_point.get(str(directory), []))
 
     @cached_property
     def boot(self) -> Optional[Partition]:
-        if self.has_partitions():
-            return only(
-                partition
-                for partition in none_throws(self.partitions)
-                if partition.is_boot()
-            )
+        directory = constants.ROOT_DIR / constants.BOOT_DIR
 
-        return None
+        return only(self._partitions_by_mount_point.get(str(directory), []))
@@ -23,14 +23,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
 
-from copy import deepcopy
+import heapq
 from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional, Self, Set
 from uuid import UUID
 
-from more_itertools import take
-
 from refind_btrfs.common import BootFilesCheckResult, constants
 from refind_btrfs.common.abc.factories import BaseDeviceCommandFactory
 from refind_btrfs.common.enums import PathRelation
@@ -59,6 +57,19 @@ class UuidRelation(NamedTuple):
     parent_uuid: UUID
 
 
+class SubvolumeRecord(NamedTuple):
+    filesystem_path: str
+    logical_path: str
+    time_created: datetime
+    uuid: bytes
+    parent_uuid: bytes
+    num_id: int
+    parent_num_id: int
+    is_read_only: bool
+    name: Optional[str]
+    created_from: Optional[SubvolumeRecord]
+
+
 class Subvolume:
     def __init__(
         self,
@@ -82,6 +93,7 @@ class Subvolume:
         self._static_partition_table: Optional[PartitionTable] = None
         self._boot_files_check_result: Optional[BootFilesCheckResult] = None
         self._snapshots: Optional[Set[Subvolume]] = None
+        self._sort_key: Optional[tuple[datetime, int]] = None
 
     def __eq__(self, other: object) -> bool:
         if self is other:
@@ -97,17 +109,45 @@ class Subvolume:
 
     def __lt__(self, other: object) -> bool:
         if isinstance(other, Subvolume):
-            attributes_for_comparison = [
-                none_throws(subvolume.created_from).time_created
-                if subvolume.is_newly_created()
-                else subvolume.time_created
-                for subvolume in (self, other)
-            ]
-
-            return attributes_for_comparison[0] < attributes_for_comparison[1]
+            return self.sort_key < other.sort_key
 
         return False
 
+    @classmethod
+    def from_record(cls, record: SubvolumeRecord) -> Self:
+        subvolume = cls(
+            Path(record.filesystem_path),
+            record.logical_path,
+            record.time_created,
+            UuidRelation(UUID(bytes=record.uuid), UUID(bytes=record.parent_uuid)),
+            NumIdRelation(record.num_id, record.parent_num_id),
+            record.is_read_only,
+        )
+        created_from_record = record.created_from
+
+        subvolume._name = record.name
+
+        if created_from_record is not None:
+            subvolume._created_from = cls.from_record(created_from_record)
+
+        return subvolume
+
+    def to_record(self) -> SubvolumeRecord:
+        created_from = self.created_from
+
+        return SubvolumeRecord(
+            str(self.filesystem_path),
+            self.logical_path,
+            self.time_created,
+            self.uuid.bytes,
+            self.parent_uuid.bytes,
+            self.num_id,
+            self.parent_num_id,
+            self.is_read_only,
+            self.name,
+            created_from.to_record() if created_from is not None else None,
+        )
+
     def with_boot_files_check_result(self, boot_stanza: BootStanza) -> Self:
         boot_stanza_check_result = boot_stanza.boot_files_check_result
 
@@ -183,11 +223,12 @@ class Subvolume:
 
     def as_newly_created_from(self, other: Subvolume) -> Self:
         self._created_from = other
+        self._sort_key = None
 
         if other.has_static_partition_table():
-            self._static_partition_table = deepcopy(
-                none_throws(other.static_partition_table)
-            )
+            static_partition_table = none_throws(other.static_partition_table)
+
+            self._static_partition_table = static_partition_table.as_shared_copy()
 
         return self
 
@@ -291,7 +332,9 @@ class Subvolume:
         if self.has_snapshots():
             snapshots = none_throws(self.snapshots)
 
-            return take(count, sorted(snapshots, reverse=True))
+            return heapq.nlargest(
+                count, snapshots, key=lambda snapshot: snapshot.sort_key
+            )
 
         return None
 
@@ -395,6 +438,18 @@ class Subvolume:
     def boot_files_check_result(self) -> Optional[BootFilesCheckResult]:
         return self._boot_files_check_result
 
+    @property
+    def sort_key(self) -> tuple[datetime, int]:
+        if self._sort_key is None:
+            if self.is_newly_created():
+                created_from = none_throws(self.created_from)
+
+                self._sort_key = created_from.sort_key
+            else:
+                self._sort_key = (self.time_created, self.num_id)
+
+        return self._sort_key
+
     @property
     def snapshots(self) -> Optional[Set[Subvolume]]:
         return self._snapshots
@@ -23,10 +23,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from pathlib import Path
 from threading import Lock
-from typing import Set
+from typing import Optional, Set
 
 from injector import inject
-from more_itertools import only
+from more_itertools import first
 from watchdog.events import (
     EVENT_TYPE_CREATED,
     EVENT_TYPE_DELETED,
@@ -48,9 +48,11 @@ from refind_btrfs.common.abc.providers import (
 from refind_btrfs.common.exceptions import SnapshotExcludedFromDeletionError
 from refind_btrfs.device import Subvolume
 from refind_btrfs.state_management import RefindBtrfsMachine
+from refind_btrfs.state_management.model import PreparedSnapshotsBuilder
 from refind_btrfs.utility.helpers import (
     checked_cast,
     discern_distance_between,
+    find_all_matched_subvolumes_in,
     has_items,
 )
 
@@ -141,10 +143,15 @@ class SnapshotEventHandler(FileSystemEventHandler, ConfigurableMixin):
         bootable_snapshots = previous_run_result.bootable_snapshots
 
         if has_items(bootable_snapshots):
-            deleted_snapshot = only(
-                snapshot
-                for snapshot in bootable_snapshots
-                if snapshot.is_located_in(deleted_directory)
+            snapshot_manipulation = self.package_config.snapshot_manipulation
+            prepared_snapshots_builder = PreparedSnapshotsBuilder(
+                snapshot_manipulation.destination_directory,
+                snapshot_manipulation.cleanup_exclusion,
+            ).with_bootable_snapshots(bootable_snapshots)
+            deleted_snapshot = (
+                prepared_snapshots_builder.find_bootable_snapshot_located_in(
+                    deleted_directory
+                )
             )
 
             if deleted_snapshot is not None:
@@ -153,9 +160,6 @@ class SnapshotEventHandler(FileSystemEventHandler, ConfigurableMixin):
 
                 with deletion_lock:
                     if deleted_snapshot not in deleted_snapshots:
-                        snapshot_manipulation = (
-                            self.package_config.snapshot_manipulation
-                        )
                         cleanup_exclusion = snapshot_manipulation.cleanup_exclusion
 
                         deleted_snapshots.add(deleted_snapshot)
@@ -170,26 +174,20 @@ class SnapshotEventHandler(FileSystemEventHandler, ConfigurableMixin):
 
         return False
 
-    def _is_or_contains_snapshot(
-        self, directory: Path, max_depth: int, current_depth: int = 0
-    ) -> bool:
-        if current_depth <= max_depth:
-            subvolume_command = self._subvolume_command_factory.subvolume_command()
-            resolved_path = directory.resolve()
-            subvolume = subvolume_command.get_subvolume_from(resolved_path)
-            is_snapshot = subvolume is not None and subvolume.is_snapshot()
+    def _is_or_contains_snapshot(self, directory: Path, max_depth: int) -> bool:
+        subvolume_command = self._subvolume_command_factory.subvolume_command()
 
-            if is_snapshot:
-                return True
+        def snapshot_matcher(path: Path) -> Optional[Subvolume]:
+            subvolume = subvolume_command.get_subvolume_from(path)
 
-            subdirectories = (child for child in directory.iterdir() if child.is_dir())
+            if subvolume is not None and subvolume.is_snapshot():
+                return subvolume
 
-            if any(
-                self._is_or_contains_snapshot(
-                    subdirectory, max_depth, current_depth + 1
-                )
-                for subdirectory in subdirectories
-            ):
-                return True
+            return None
 
-        return False
+        snapshot = first(
+            find_all_matched_subvolumes_in(directory, max_depth, snapshot_matcher),
+            None,
+        )
+
+        return snapshot is not None
@@ -23,14 +23,19 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import chain
-from typing import Callable, NamedTuple, Optional, Self
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional, Self, Set
+from uuid import UUID
 
 from injector import inject
 from more_itertools import only
 
 from refind_btrfs.boot import BootStanza, RefindConfig
-from refind_btrfs.common import ConfigurableMixin
+from refind_btrfs.common import ConfigurableMixin, SnapshotDeletionResult, constants
+from refind_btrfs.common.abc import BaseProcessExecutor
+from refind_btrfs.common.abc.commands import SubvolumeCommand
 from refind_btrfs.common.abc.factories import (
     BaseDeviceCommandFactory,
     BaseIconCommandFactory,
@@ -42,8 +47,16 @@ from refind_btrfs.common.abc.providers import (
     BasePersistenceProvider,
     BaseRefindConfigProvider,
 )
-from refind_btrfs.device import BlockDevice, Partition, Subvolume
-from refind_btrfs.utility.helpers import has_items, none_throws, replace_item_in
+from refind_btrfs.common.exceptions import PartitionError, SubvolumeError
+from refind_btrfs.device import BlockDevice, Partition, Subvolume, SubvolumeRecord
+from refind_btrfs.utility.helpers import (
+    default_if_none,
+    get_device_topology_fingerprint,
+    has_items,
+    item_count_suffix,
+    none_throws,
+    replace_item_in,
+)
 
 from .conditions import Conditions
 
@@ -60,6 +73,11 @@ class BlockDevices(NamedTuple):
         return cls(None, None, None)
 
 
+class BlockDeviceTopology(NamedTuple):
+    fingerprint: str
+    block_devices: BlockDevices
+
+
 class PreparedSnapshots(NamedTuple):
     snapshots_for_addition: list[Subvolume]
     snapshots_for_removal: list[Subvolume]
@@ -70,6 +88,115 @@ class PreparedSnapshots(NamedTuple):
         )
 
 
+class PreparedSnapshotsBuilder:
+    def __init__(
+        self, destination_directory: Path, cleanup_exclusion: Set[Subvolume]
+    ) -> None:
+        self._destination_directories = {
+            destination_directory,
+            destination_directory.resolve(),
+        }
+        self._cleanup_exclusion = cleanup_exclusion
+        self._bootable_snapshots: list[Subvolume] = []
+        self._bootable_uuids: set[UUID] = set()
+        self._bootable_parent_uuids: set[UUID] = set()
+
+    def with_bootable_snapshots(self, bootable_snapshots: Iterable[Subvolume]) -> Self:
+        self._bootable_snapshots = list(bootable_snapshots)
+        self._bootable_uuids = {
+            bootable_snapshot.uuid for bootable_snapshot in self._bootable_snapshots
+        }
+        self._bootable_parent_uuids = {
+            bootable_snapshot.parent_uuid
+            for bootable_snapshot in self._bootable_snapshots
+            if bootable_snapshot.is_newly_created() and bootable_snapshot.is_snapshot()
+        }
+
+        return self
+
+    def with_pending_removals(self, pending_removals: Iterable[Subvolume]) -> Self:
+        # snapshots whose deletion failed earlier are handled like the bootable
+        # ones, so their deletion is retried unless they are retained again
+        bootable_snapshots = self._bootable_snapshots + [
+            pending_removal
+            for pending_removal in pending_removals
+            if pending_removal.uuid not in self._bootable_uuids
+        ]
+
+        return self.with_bootable_snapshots(bootable_snapshots)
+
+    def find_bootable_snapshot_located_in(
+        self, directory: Path
+    ) -> Optional[Subvolume]:
+        # the directory may have been reached through a symlink (e.g., one of
+        # the watched directories) whereas the snapshots' paths are resolved
+        directories = {directory, directory.resolve()}
+
+        return only(
+            bootable_snapshot
+            for bootable_snapshot in self._bootable_snapshots
+            if PreparedSnapshotsBuilder._is_located_in(bootable_snapshot, directories)
+        )
+
+    def build(
+        self,
+        selected_snapshots: list[Subvolume],
+        destination_snapshots: Iterable[Subvolume] = (),
+    ) -> PreparedSnapshots:
+        bootable_snapshots = self._bootable_snapshots
+        selected_uuids = {snapshot.uuid for snapshot in selected_snapshots}
+        retained_uuids = selected_uuids.union(
+            snapshot.uuid for snapshot in self._cleanup_exclusion
+        )
+
+        if has_items(bootable_snapshots):
+            bootable_uuids = self._bootable_uuids
+            bootable_parent_uuids = self._bootable_parent_uuids
+            snapshots_for_addition = [
+                snapshot
+                for snapshot in selected_snapshots
+                if snapshot.uuid not in bootable_uuids
+                and snapshot.uuid not in bootable_parent_uuids
+            ]
+            snapshots_for_removal = [
+                snapshot
+                for snapshot in bootable_snapshots
+                if self._can_be_removed(snapshot, retained_uuids)
+            ]
+        else:
+            snapshots_for_addition = list(selected_snapshots)
+            snapshots_for_removal = [
+                snapshot
+                for snapshot in destination_snapshots
+                if snapshot.uuid not in retained_uuids
+                and self._can_be_removed(snapshot, selected_uuids)
+            ]
+
+        return PreparedSnapshots(snapshots_for_addition, snapshots_for_removal)
+
+    def _can_be_removed(self, snapshot: Subvolume, retained_uuids: Set[UUID]) -> bool:
+        if snapshot.uuid in retained_uuids:
+            return False
+
+        if snapshot.is_newly_created() or PreparedSnapshotsBuilder._is_located_in(
+            snapshot, self._destination_directories
+        ):
+            return not (snapshot.is_snapshot() and snapshot.parent_uuid in retained_uuids)
+
+        return True
+
+    @staticmethod
+    def _is_located_in(snapshot: Subvolume, directories: Set[Path]) -> bool:
+        filesystem_path = default_if_none(
+            snapshot.created_from, snapshot
+        ).filesystem_path
+
+        return any(
+            directory == filesystem_path or directory in filesystem_path.parents
+            for directory in directories
+        )
+
+
 class BootStanzaWithSnapshots(NamedTuple):
     boot_stanza: BootStanza
     is_excluded: bool
@@ -93,6 +220,10 @@ class BootStanzaWithSnapshots(NamedTuple):
         replace_item_in(matched_snapshots, current_snapshot, replacement_snapshot)
 
 
+class ProcessingResultRecord(NamedTuple):
+    bootable_snapshots: list[SubvolumeRecord]
+
+
 class ProcessingResult(NamedTuple):
     bootable_snapshots: list[Subvolume]
 
@@ -100,6 +231,20 @@ class ProcessingResult(NamedTuple):
     def none(cls) -> Self:
         return cls([])
 
+    @classmethod
+    def from_record(cls, record: ProcessingResultRecord) -> Self:
+        return cls(
+            [
+                Subvolume.from_record(snapshot_record)
+                for snapshot_record in record.bootable_snapshots
+            ]
+        )
+
+    def to_record(self) -> ProcessingResultRecord:
+        return ProcessingResultRecord(
+            [snapshot.to_record() for snapshot in self.bootable_snapshots]
+        )
+
     def has_bootable_snapshots(self) -> bool:
         return has_items(self.bootable_snapshots)
 
@@ -118,15 +263,22 @@ class Model(ConfigurableMixin):
         package_config_provider: BasePackageConfigProvider,
         refind_config_provider: BaseRefindConfigProvider,
         persistence_provider: BasePersistenceProvider,
+        process_executor: BaseProcessExecutor,
     ) -> None:
         ConfigurableMixin.__init__(self, package_config_provider)
 
+        self._logger = logger_factory.logger(__name__)
         self._device_command_factory = device_command_factory
         self._subvolume_command_factory = subvolume_command_factory
         self._icon_command_factory = icon_command_factory
         self._refind_config_provider = refind_config_provider
         self._persistence_provider = persistence_provider
+        self._process_executor = process_executor
         self._conditions = Conditions(logger_factory, self)
+        self._deletion_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="snapshot-deletion"
+        )
+        self._deletion_future: Optional[Future] = None
         self._filtered_block_devices: Optional[BlockDevices] = None
         self._matched_boot_stanzas: Optional[list[BootStanza]] = None
         self._prepared_snapshots: Optional[PreparedSnapshots] = None
@@ -135,20 +287,45 @@ class Model(ConfigurableMixin):
         ] = None
 
     def initialize_block_devices(self) -> None:
+        persistence_provider = self._persistence_provider
+        process_executor = self._process_executor
+        esp_uuid = self.package_config.esp_uuid
+        # the recorded or replayed process outputs must not be mixed with the
+        # topology of the machine this is actually running on
+        fingerprint = (
+            get_device_topology_fingerprint(str(esp_uuid))
+            if not process_executor.has_bundle()
+            else None
+        )
+
+        if fingerprint is not None:
+            block_device_topology = persistence_provider.get_block_device_topology()
+
+            if (
+                block_device_topology is not None
+                and block_device_topology.fingerprint == fingerprint
+            ):
+                self._filtered_block_devices = block_device_topology.block_devices
+
+                return
+
         device_command_factory = self._device_command_factory
         physical_device_command = device_command_factory.physical_device_command()
         all_block_devices = list(physical_device_command.get_block_devices())
 
         if has_items(all_block_devices):
-            for block_device in all_block_devices:
-                block_device.initialize_partition_tables_using(device_command_factory)
+            candidate_block_devices = self._get_candidate_block_devices_from(
+                all_block_devices
+            )
+
+            self._initialize_partition_tables_of(candidate_block_devices)
 
             def block_device_filter(
                 filter_func: Callable[[BlockDevice], bool],
             ) -> Optional[BlockDevice]:
                 return only(
                     block_device
-                    for block_device in all_block_devices
+                    for block_device in candidate_block_devices
                     if filter_func(block_device)
                 )
 
@@ -162,6 +339,11 @@ class Model(ConfigurableMixin):
 
         self._filtered_block_devices = filtered_block_devices
 
+        if fingerprint is not None:
+            persistence_provider.save_block_device_topology(
+                BlockDeviceTopology(fingerprint, filtered_block_devices)
+            )
+
     def initialize_root_subvolume(self) -> None:
         subvolume_command_factory = self._subvolume_command_factory
         root_partition = self.root_partition
@@ -191,34 +373,27 @@ class Model(ConfigurableMixin):
         snapshot_manipulation = self.package_config.snapshot_manipulation
         subvolume = self.root_subvolume
         previous_run_result = persistence_provider.get_previous_run_result()
+        pending_removals = persistence_provider.get_pending_removals()
         selected_snapshots = none_throws(
             subvolume.select_snapshots(snapshot_manipulation.selection_count)
         )
-        destination_directory = snapshot_manipulation.destination_directory
-        snapshots_union = snapshot_manipulation.cleanup_exclusion.union(
-            selected_snapshots
+        prepared_snapshots_builder = PreparedSnapshotsBuilder(
+            snapshot_manipulation.destination_directory,
+            snapshot_manipulation.cleanup_exclusion,
+        ).with_bootable_snapshots(previous_run_result.bootable_snapshots)
+        prepared_snapshots_builder = prepared_snapshots_builder.with_pending_removals(
+            pending_removals
         )
-
-        if previous_run_result.has_bootable_snapshots():
-            bootable_snapshots = previous_run_result.bootable_snapshots
-            snapshots_for_addition = [
-                snapshot
-                for snapshot in selected_snapshots
-                if snapshot.can_be_added(bootable_snapshots)
-            ]
-            snapshots_for_removal = [
-                snapshot
-                for snapshot in bootable_snapshots
-                if snapshot.can_be_removed(destination_directory, snapshots_union)
-            ]
-        else:
-            destination_snapshots = self.destination_snapshots
-            snapshots_for_addition = selected_snapshots
-            snapshots_for_removal = [
-                snapshot
-                for snapshot in destination_snapshots.difference(snapshots_union)
-                if snapshot.can_be_removed(destination_directory, selected_snapshots)
-            ]
+        destination_snapshots = (
+            self.destination_snapshots
+            if not previous_run_result.has_bootable_snapshots()
+            and not has_items(pending_removals)
+            else set()
+        )
+        prepared_snapshots = prepared_snapshots_builder.build(
+            selected_snapshots, destination_snapshots
+        )
+        snapshots_for_addition = prepared_snapshots.snapshots_for_addition
 
         if has_items(snapshots_for_addition):
             device_command_factory = self._device_command_factory
@@ -226,9 +401,7 @@ class Model(ConfigurableMixin):
             for snapshot in snapshots_for_addition:
                 snapshot.initialize_partition_table_using(device_command_factory)
 
-        self._prepared_snapshots = PreparedSnapshots(
-            snapshots_for_addition, snapshots_for_removal
-        )
+        self._prepared_snapshots = prepared_snapshots
 
     def combine_boot_stanzas_with_snapshots(self) -> None:
         usable_boot_stanzas = self.usable_boot_stanzas
@@ -272,13 +445,112 @@ class Model(ConfigurableMixin):
 
     def process_changes(self) -> None:
         persistence_provider = self._persistence_provider
+        snapshot_manipulation = self.package_config.snapshot_manipulation
+        snapshots_for_removal = self.prepared_snapshots.snapshots_for_removal
         bootable_snapshots = self._process_snapshots()
 
-        self._process_boot_stanzas()
+        if snapshot_manipulation.cleanup_in_background:
+            self._process_boot_stanzas()
 
-        persistence_provider.save_current_run_result(
-            ProcessingResult(bootable_snapshots)
-        )
+            persistence_provider.save_current_run_result(
+                ProcessingResult(bootable_snapshots)
+            )
+
+            if has_items(snapshots_for_removal):
+                self._deletion_future = self._deletion_executor.submit(
+                    self._delete_snapshots_in_background, snapshots_for_removal
+                )
+            else:
+                persistence_provider.save_pending_removals([])
+        else:
+            deletion_result = self._delete_snapshots(snapshots_for_removal)
+
+            self._process_boot_stanzas()
+
+            persistence_provider.save_current_run_result(
+                ProcessingResult(bootable_snapshots)
+            )
+            persistence_provider.save_pending_removals(
+                deletion_result.failed_snapshots
+            )
+
+    def skip_changes(self) -> None:
+        logger = self._logger
+
+        logger.info("Skipping the processing of the changes during the dry run.")
+
+    def is_deleting_snapshots(self) -> bool:
+        return self._deletion_future is not None
+
+    def wait_for_snapshot_deletion(self) -> None:
+        deletion_future = self._deletion_future
+
+        if deletion_future is not None:
+            logger = self._logger
+
+            if not deletion_future.done():
+                logger.info("Waiting for the snapshot deletion to complete.")
+
+            deletion_error = deletion_future.exception()
+
+            if deletion_error is not None:
+                logger.error(f"Snapshot deletion failed: {deletion_error}")
+
+            self._deletion_future = None
+
+    def _get_candidate_block_devices_from(
+        self, block_devices: list[BlockDevice]
+    ) -> list[BlockDevice]:
+        device_command_factory = self._device_command_factory
+        live_device_command = device_command_factory.live_device_command()
+        mounted_partition_names = {
+            partition.name
+            for partition in live_device_command.get_mounted_partitions()
+            if partition.is_root()
+            or partition.is_boot()
+            or Model._is_esp_candidate(partition)
+        }
+        candidate_block_devices = [
+            block_device
+            for block_device in block_devices
+            if any(
+                block_device.is_matched_with(mounted_partition_name)
+                for mounted_partition_name in mounted_partition_names
+            )
+        ]
+
+        if has_items(candidate_block_devices):
+            return candidate_block_devices
+
+        return block_devices
+
+    def _initialize_partition_tables_of(self, block_devices: list[BlockDevice]) -> None:
+        device_command_factory = self._device_command_factory
+        initializers = [
+            (block_device, initializer)
+            for block_device in block_devices
+            for initializer in [
+                block_device.initialize_physical_partition_table_using,
+                block_device.initialize_live_partition_table_using,
+            ]
+        ]
+        max_workers = min(constants.MAX_PARTITION_TABLE_WORKERS, len(initializers))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (block_device, executor.submit(initializer, device_command_factory))
+                for block_device, initializer in initializers
+            ]
+
+        for block_device, future in futures:
+            try:
+                future.result()
+            except PartitionError:
+                raise
+            except Exception as e:
+                raise PartitionError(
+                    f"Could not initialize the partition tables for device '{block_device.name}'!"
+                ) from e
 
     def _process_snapshots(self) -> list[Subvolume]:
         subvolume_command_factory = self._subvolume_command_factory
@@ -294,32 +566,105 @@ class Model(ConfigurableMixin):
                 chain.from_iterable(self.usable_boot_stanzas_with_snapshots.values())
             )
 
-            for addition in usable_snapshots_for_addition:
-                if addition in all_usable_snapshots:
-                    bootable_snapshot = subvolume_command.get_bootable_snapshot_from(
-                        addition
-                    )
+            additions = [
+                addition
+                for addition in usable_snapshots_for_addition
+                if addition in all_usable_snapshots
+            ]
+
+            if has_items(additions):
+                max_workers = min(
+                    constants.MAX_SNAPSHOT_ADDITION_WORKERS, len(additions)
+                )
+
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        (
+                            addition,
+                            executor.submit(
+                                Model._prepare_bootable_snapshot_from,
+                                addition,
+                                subvolume,
+                                subvolume_command,
+                                device_command_factory,
+                            ),
+                        )
+                        for addition in additions
+                    ]
+
+                # the results are merged in the original order of the additions
+                for addition, future in futures:
+                    bootable_snapshot = future.result()
 
-                    bootable_snapshot.modify_partition_table_using(
-                        subvolume, device_command_factory
-                    )
                     replace_item_in(
                         actual_bootable_snapshots, addition, bootable_snapshot
                     )
 
                     for item in boot_stanzas_with_snapshots:
                         item.replace_matched_snapshot(addition, bootable_snapshot)
-                else:
+
+            for addition in usable_snapshots_for_addition:
+                if addition not in all_usable_snapshots:
                     actual_bootable_snapshots.remove(addition)
 
-        prepared_snapshots = self.prepared_snapshots
-        snapshots_for_removal = prepared_snapshots.snapshots_for_removal
+        return actual_bootable_snapshots
 
-        if has_items(snapshots_for_removal):
-            for removal in snapshots_for_removal:
-                subvolume_command.delete_snapshot(removal)
+    @staticmethod
+    def _prepare_bootable_snapshot_from(
+        addition: Subvolume,
+        subvolume: Subvolume,
+        subvolume_command: SubvolumeCommand,
+        device_command_factory: BaseDeviceCommandFactory,
+    ) -> Subvolume:
+        bootable_snapshot = subvolume_command.get_bootable_snapshot_from(addition)
 
-        return actual_bootable_snapshots
+        bootable_snapshot.modify_partition_table_using(
+            subvolume, device_command_factory
+        )
+
+        return bootable_snapshot
+
+    def _delete_snapshots(
+        self, snapshots_for_removal: list[Subvolume]
+    ) -> SnapshotDeletionResult:
+        logger = self._logger
+        subvolume_command_factory = self._subvolume_command_factory
+        subvolume_command = subvolume_command_factory.subvolume_command()
+        deletion_result = subvolume_command.delete_snapshots(snapshots_for_removal)
+
+        if deletion_result.has_deleted_snapshots():
+            deleted_snapshots = deletion_result.deleted_snapshots
+            suffix = item_count_suffix(deleted_snapshots)
+
+            logger.info(f"Deleted {len(deleted_snapshots)} snapshot{suffix}.")
+
+        if deletion_result.has_failed_snapshots():
+            failed_snapshots = deletion_result.failed_snapshots
+            suffix = item_count_suffix(failed_snapshots)
+
+            logger.error(
+                f"Could not delete {len(failed_snapshots)} snapshot{suffix}, "
+                "the deletion will be retried during the next run."
+            )
+
+        return deletion_result
+
+    def _delete_snapshots_in_background(
+        self, snapshots_for_removal: list[Subvolume]
+    ) -> None:
+        logger = self._logger
+        persistence_provider = self._persistence_provider
+
+        try:
+            deletion_result = self._delete_snapshots(snapshots_for_removal)
+            failed_snapshots = deletion_result.failed_snapshots
+        except SubvolumeError as e:
+            logger.error(e.formatted_message)
+
+            failed_snapshots = snapshots_for_removal
+
+        # snapshots which couldn't be deleted are retried during the next run
+        persistence_provider.save_pending_removals(failed_snapshots)
 
     def _process_boot_stanzas(self) -> None:
         refind_config = self.refind_config
@@ -357,6 +702,17 @@ class Model(ConfigurableMixin):
 
         return boot_stanza_generation.include_sub_menus
 
+    @staticmethod
+    def _is_esp_candidate(partition: Partition) -> bool:
+        filesystem = partition.filesystem
+
+        if filesystem is not None:
+            return filesystem.is_mounted() and filesystem.is_of_type(
+                constants.ESP_FS_TYPE
+            )
+
+        return False
+
     @property
     def conditions(self) -> list[Callable[[], bool]]:
         conditions = self._conditions
@@ -432,9 +788,7 @@ class Model(ConfigurableMixin):
     def destination_snapshots(self) -> set[Subvolume]:
         subvolume_command_factory = self._subvolume_command_factory
         subvolume_command = subvolume_command_factory.subvolume_command()
-        destination_snapshots = sorted(
-            subvolume_command.get_all_destination_snapshots(), reverse=True
-        )
+        destination_snapshots = subvolume_command.get_all_destination_snapshots()
 
         return set(destination_snapshots)
 
@@ -456,9 +810,14 @@ class Model(ConfigurableMixin):
         prepared_snapshots = self.prepared_snapshots
         usable_snapshots_for_addition = self.usable_snapshots_for_addition
         previous_run_result = persistence_provider.get_previous_run_result()
+        pending_removals = persistence_provider.get_pending_removals()
         snapshots_for_removal = prepared_snapshots.snapshots_for_removal
         bootable_snapshots = set(previous_run_result.bootable_snapshots)
 
+        # the pending removals which weren't prepared for removal are retained again
+        if has_items(pending_removals):
+            bootable_snapshots |= set(pending_removals)
+
         if has_items(usable_snapshots_for_addition):
             bootable_snapshots |= set(usable_snapshots_for_addition)
 
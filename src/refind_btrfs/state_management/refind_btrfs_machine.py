@@ -27,11 +27,14 @@ from injector import inject
 from more_itertools import first, last
 from transitions import Machine, State
 
+from refind_btrfs.common.abc import BaseProcessExecutor
 from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.abc.providers import BasePersistenceProvider
 from refind_btrfs.common.enums import StateNames
 from refind_btrfs.common.exceptions import (
     NoChangesDetectedError,
     PartitionError,
+    PersistenceError,
     RefindConfigError,
     SubvolumeError,
 )
@@ -47,10 +50,14 @@ class RefindBtrfsMachine(Machine):
     def __init__(
         self,
         logger_factory: BaseLoggerFactory,
+        process_executor: BaseProcessExecutor,
+        persistence_provider: BasePersistenceProvider,
         model: Model,
         states: States,
     ):
         self._logger = logger_factory.logger(__name__)
+        self._process_executor = process_executor
+        self._persistence_provider = persistence_provider
 
         if not has_items(states) or is_singleton(states):
             raise ValueError(
@@ -90,26 +97,80 @@ class RefindBtrfsMachine(Machine):
         )
 
         self._initial_state = initial
+        self._is_garbage_collection_pending = False
 
     def run(self) -> bool:
         logger = self._logger
         model = self.model
         initial_state = self._initial_state
+        process_executor = self._process_executor
+        persistence_provider = self._persistence_provider
 
+        is_successful = False
+        are_changes_processed = False
+
+        # the previous run's snapshot deletion must be completed beforehand
+        self.complete_cleanup()
+        process_executor.clear_cache()
         self.set_state(initial_state)
 
+        # the persisted items are read once and written back once per run
+        with persistence_provider.session():
+            try:
+                while model.next_state():
+                    if model.is_final():
+                        is_successful = True
+                        are_changes_processed = True
+                        break
+            except NoChangesDetectedError as e:
+                logger.warning(e.formatted_message)
+                is_successful = True
+            except (
+                PartitionError,
+                SubvolumeError,
+                RefindConfigError,
+            ) as e:
+                logger.error(e.formatted_message)
+
+        process_executor.log_latency_summary()
+
+        if are_changes_processed:
+            self._is_garbage_collection_pending = True
+
+            # the garbage isn't collected alongside the snapshot deletion that
+            # runs in the background, it's deferred until the latter completes
+            if not model.is_deleting_snapshots():
+                self.complete_cleanup()
+
+        return is_successful
+
+    def complete_cleanup(self) -> None:
+        model = self.model
+
+        model.wait_for_snapshot_deletion()
+
+        if self._is_garbage_collection_pending:
+            self._is_garbage_collection_pending = False
+            self._collect_garbage()
+
+    def _collect_garbage(self) -> None:
+        logger = self._logger
+        persistence_provider = self._persistence_provider
+
         try:
-            while model.next_state():
-                if model.is_final():
-                    return True
-        except NoChangesDetectedError as e:
+            garbage_collection_result = persistence_provider.collect_garbage()
+        except PersistenceError as e:
             logger.warning(e.formatted_message)
-            return True
-        except (
-            PartitionError,
-            SubvolumeError,
-            RefindConfigError,
-        ) as e:
-            logger.error(e.formatted_message)
-
-        return False
+        else:
+            is_collected = (
+                garbage_collection_result.has_removed_entries()
+                or garbage_collection_result.is_compacted
+            )
+
+            if is_collected:
+                logger.info(
+                    "Collected the garbage in the local database "
+                    f"(removed entries: {garbage_collection_result.removed_entry_count}, "
+                    f"size before: {garbage_collection_result.size_before} bytes, "
+                    f"size after: {garbage_collection_result.size_after} bytes)."
+                )
@@ -23,34 +23,45 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from datetime import datetime
 from pathlib import Path
-from typing import Iterator, Optional, Set
+from threading import Lock
+from typing import Any, Iterable, Iterator, Optional
 
 import btrfsutil
 
-from refind_btrfs.common import ConfigurableMixin, constants
+from refind_btrfs.common import ConfigurableMixin, SnapshotDeletionResult, constants
 from refind_btrfs.common.abc.commands import SubvolumeCommand
 from refind_btrfs.common.abc.factories import BaseLoggerFactory
-from refind_btrfs.common.abc.providers import BasePackageConfigProvider
+from refind_btrfs.common.abc.providers import (
+    BasePackageConfigProvider,
+    BasePersistenceProvider,
+)
 from refind_btrfs.common.exceptions import SubvolumeError
 from refind_btrfs.device import NumIdRelation, Subvolume, UuidRelation
 from refind_btrfs.utility.helpers import (
     checked_cast,
     default_if_none,
+    has_items,
     none_throws,
     try_convert_bytes_to_uuid,
 )
 
+from .snapshot_searcher import SnapshotSearcher
+
 
 class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
     def __init__(
         self,
         logger_factory: BaseLoggerFactory,
         package_config_provider: BasePackageConfigProvider,
+        persistence_provider: BasePersistenceProvider,
     ) -> None:
         ConfigurableMixin.__init__(self, package_config_provider)
 
         self._logger = logger_factory.logger(__name__)
-        self._searched_directories: Set[Path] = set()
+        self._snapshot_searcher = SnapshotSearcher(
+            logger_factory, package_config_provider, persistence_provider, self
+        )
+        self._destination_directory_lock = Lock()
 
     def get_subvolume_from(self, filesystem_path: Path) -> Optional[Subvolume]:
         logger = self._logger
@@ -77,21 +88,11 @@ class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
                 subvolume_info = btrfsutil.subvolume_info(
                     filesystem_path_str, subvolume_id
                 )
-                self_uuid = default_if_none(
-                    try_convert_bytes_to_uuid(subvolume_info.uuid),
-                    constants.EMPTY_UUID,
-                )
-                parent_uuid = default_if_none(
-                    try_convert_bytes_to_uuid(subvolume_info.parent_uuid),
-                    constants.EMPTY_UUID,
-                )
 
-                return Subvolume(
+                return BtrfsUtilCommand.map_to_subvolume(
                     filesystem_path,
                     subvolume_path,
-                    datetime.fromtimestamp(subvolume_info.otime),
-                    UuidRelation(self_uuid, parent_uuid),
-                    NumIdRelation(subvolume_info.id, subvolume_info.parent_id),
+                    subvolume_info,
                     subvolume_read_only,
                 )
         except btrfsutil.BtrfsUtilError as e:
@@ -103,42 +104,18 @@ class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
         return None
 
     def get_all_source_snapshots_for(self, parent: Subvolume) -> Iterator[Subvolume]:
-        self._searched_directories.clear()
-
-        snapshot_searches = self.package_config.snapshot_searches
-
-        for snapshot_search in snapshot_searches:
-            directory = snapshot_search.directory
-            is_nested = snapshot_search.is_nested
-            max_depth = snapshot_search.max_depth
-            search_result = self._search_for_snapshots_in(
-                directory, max_depth, parent=parent
-            )
-
-            if is_nested:
-                root_directory = directory.root
-
-                for snapshot in search_result:
-                    filesystem_path = snapshot.filesystem_path
-                    nested_directory = filesystem_path / directory.relative_to(
-                        root_directory
-                    )
+        snapshot_searcher = self._snapshot_searcher
 
-                    if nested_directory.exists():
-                        yield from self._search_for_snapshots_in(
-                            nested_directory, max_depth, parent=parent
-                        )
-
-                    yield snapshot
-            else:
-                yield from search_result
+        yield from snapshot_searcher.get_all_source_snapshots_for(parent)
 
     def get_all_destination_snapshots(self) -> Iterator[Subvolume]:
         snapshot_manipulation = self.package_config.snapshot_manipulation
         destination_directory = snapshot_manipulation.destination_directory
 
         if destination_directory.exists():
-            yield from self._search_for_snapshots_in(destination_directory, 1)
+            snapshot_searcher = self._snapshot_searcher
+
+            yield from snapshot_searcher.get_all_snapshots_in(destination_directory)
 
     def get_bootable_snapshot_from(self, source: Subvolume) -> Subvolume:
         if source.is_read_only:
@@ -154,92 +131,65 @@ class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
 
         return destination.as_named()
 
-    def delete_snapshot(self, snapshot: Subvolume) -> None:
+    def delete_snapshots(
+        self, snapshots: Iterable[Subvolume]
+    ) -> SnapshotDeletionResult:
         logger = self._logger
-        filesystem_path = snapshot.filesystem_path
-        logical_path = snapshot.logical_path
+        deletion_result = SnapshotDeletionResult([], [], [], [])
+        snapshots_list = list(snapshots)
+
+        if not has_items(snapshots_list):
+            return deletion_result
 
         try:
-            filesystem_path_str = str(filesystem_path)
-            is_subvolume = filesystem_path.exists() and btrfsutil.is_subvolume(
-                filesystem_path_str
+            root_dir_str = str(constants.ROOT_DIR)
+            deleted_subvolumes = set(
+                checked_cast(list[int], btrfsutil.deleted_subvolumes(root_dir_str))
             )
-
-            if is_subvolume:
-                root_dir_str = str(constants.ROOT_DIR)
-                num_id = snapshot.num_id
-                deleted_subvolumes = checked_cast(
-                    list[int], btrfsutil.deleted_subvolumes(root_dir_str)
-                )
-
-                if num_id not in deleted_subvolumes:
-                    logger.info(f"Deleting the '{logical_path}' snapshot.")
-
-                    btrfsutil.delete_subvolume(filesystem_path_str)
-                else:
-                    logger.warning(
-                        f"The '{logical_path}' snapshot has already "
-                        "been deleted but not yet cleaned up."
-                    )
-            else:
-                logger.warning(f"The '{filesystem_path}' directory is not a subvolume.")
         except btrfsutil.BtrfsUtilError as e:
             logger.exception("btrfsutil call failed!")
             raise SubvolumeError(
-                f"Could not delete the '{logical_path}' snapshot!"
+                "Could not get the deleted but not yet cleaned up subvolumes!"
             ) from e
 
-    def _search_for_snapshots_in(
-        self,
-        directory: Path,
-        max_depth: int,
-        current_depth: int = 0,
-        parent: Optional[Subvolume] = None,
-    ) -> Iterator[Subvolume]:
-        if current_depth > max_depth:
-            return
-
-        logger = self._logger
-        is_initial_call = not bool(current_depth)
-        resolved_path = directory.resolve()
-
-        if is_initial_call:
-            if parent is None:
-                logger.info(f"Getting all snapshots in the '{directory}' directory.")
-            else:
-                logical_path = parent.logical_path
+        for snapshot in snapshots_list:
+            filesystem_path = snapshot.filesystem_path
+            logical_path = snapshot.logical_path
 
-                logger.info(
-                    f"Searching for snapshots of the '{logical_path}' "
-                    f"subvolume in the '{directory}' directory."
+            try:
+                filesystem_path_str = str(filesystem_path)
+                is_subvolume = filesystem_path.exists() and btrfsutil.is_subvolume(
+                    filesystem_path_str
                 )
 
-        searched_directories = self._searched_directories
+                if is_subvolume:
+                    num_id = snapshot.num_id
 
-        if resolved_path not in searched_directories:
-            subvolume = self.get_subvolume_from(resolved_path)
-            can_subvolume_be_yielded = False
+                    if num_id not in deleted_subvolumes:
+                        logger.info(f"Deleting the '{logical_path}' snapshot.")
 
-            if subvolume is not None:
-                can_subvolume_be_yielded = (
-                    subvolume.is_snapshot_of(parent)
-                    if parent is not None
-                    else subvolume.is_snapshot()
-                )
+                        btrfsutil.delete_subvolume(filesystem_path_str)
+                        deletion_result.deleted_snapshots.append(snapshot)
+                    else:
+                        logger.warning(
+                            f"The '{logical_path}' snapshot has already "
+                            "been deleted but not yet cleaned up."
+                        )
+
+                        deletion_result.pending_snapshots.append(snapshot)
+                else:
+                    logger.warning(
+                        f"The '{filesystem_path}' directory is not a subvolume."
+                    )
 
-            searched_directories.add(resolved_path)
+                    deletion_result.skipped_snapshots.append(snapshot)
+            except btrfsutil.BtrfsUtilError:
+                logger.exception("btrfsutil call failed!")
+                logger.error(f"Could not delete the '{logical_path}' snapshot!")
 
-            if can_subvolume_be_yielded:
-                yield none_throws(subvolume)
-            else:
-                subdirectories = (
-                    child for child in directory.iterdir() if child.is_dir()
-                )
+                deletion_result.failed_snapshots.append(snapshot)
 
-                for subdirectory in subdirectories:
-                    yield from self._search_for_snapshots_in(
-                        subdirectory, max_depth, current_depth + 1, parent
-                    )
+        return deletion_result
 
     def _modify_read_only_flag_for(self, source: Subvolume) -> Subvolume:
         logger = self._logger
@@ -266,22 +216,26 @@ class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
         snapshot_manipulation = self.package_config.snapshot_manipulation
         destination_directory = snapshot_manipulation.destination_directory
 
-        if not destination_directory.exists():
-            directory_permissions = constants.SNAPSHOTS_ROOT_DIR_PERMISSIONS
-            octal_permissions = "{0:o}".format(directory_permissions)
+        with self._destination_directory_lock:
+            if not destination_directory.exists():
+                directory_permissions = constants.SNAPSHOTS_ROOT_DIR_PERMISSIONS
+                octal_permissions = "{0:o}".format(directory_permissions)
 
-            try:
-                logger.info(
-                    f"Creating the '{destination_directory}' destination "
-                    f"directory with {octal_permissions} permissions."
-                )
+                try:
+                    logger.info(
+                        f"Creating the '{destination_directory}' destination "
+                        f"directory with {octal_permissions} permissions."
+                    )
 
-                destination_directory.mkdir(mode=directory_permissions, parents=True)
-            except OSError as e:
-                logger.exception("Path.mkdir() call failed!")
-                raise SubvolumeError(
-                    f"Could not create the '{destination_directory}' destination directory!"
-                ) from e
+                    destination_directory.mkdir(
+                        mode=directory_permissions, parents=True
+                    )
+                except OSError as e:
+                    logger.exception("Path.mkdir() call failed!")
+                    raise SubvolumeError(
+                        f"Could not create the '{destination_directory}' "
+                        "destination directory!"
+                    ) from e
 
         destination = source.to_destination(destination_directory)
         source_logical_path = source.logical_path
@@ -317,3 +271,28 @@ class BtrfsUtilCommand(SubvolumeCommand, ConfigurableMixin):
         writable_snapshot = self.get_subvolume_from(snapshot_directory)
 
         return none_throws(writable_snapshot).as_newly_created_from(source)
+
+    @staticmethod
+    def map_to_subvolume(
+        filesystem_path: Path,
+        logical_path: str,
+        subvolume_info: Any,
+        is_read_only: bool,
+    ) -> Subvolume:
+        self_uuid = default_if_none(
+            try_convert_bytes_to_uuid(subvolume_info.uuid),
+            constants.EMPTY_UUID,
+        )
+        parent_uuid = default_if_none(
+            try_convert_bytes_to_uuid(subvolume_info.parent_uuid),
+            constants.EMPTY_UUID,
+        )
+
+        return Subvolume(
+            filesystem_path,
+            logical_path,
+            datetime.fromtimestamp(subvolume_info.otime),
+            UuidRelation(self_uuid, parent_uuid),
+            NumIdRelation(subvolume_info.id, subvolume_info.parent_id),
+            is_read_only,
+        )
@@ -21,8 +21,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 # endregion
 
+from threading import Lock
+from typing import Optional
+
 from injector import inject
 
+from refind_btrfs.common.abc import BaseProcessExecutor
 from refind_btrfs.common.abc.commands import (
     DeviceCommand,
     IconCommand,
@@ -34,13 +38,19 @@ from refind_btrfs.common.abc.factories import (
     BaseLoggerFactory,
     BaseSubvolumeCommandFactory,
 )
-from refind_btrfs.common.abc.providers import BasePackageConfigProvider
+from refind_btrfs.common.abc.providers import (
+    BasePackageConfigProvider,
+    BasePersistenceProvider,
+)
+from refind_btrfs.common.enums import DeviceTopologySource
 
 from .btrfsutil_command import BtrfsUtilCommand
 from .findmnt_command import FindmntCommand
 from .fstab_command import FstabCommand
 from .lsblk_command import LsblkCommand
+from .mountinfo_command import MountinfoCommand
 from .pillow_command import PillowCommand
+from .sysfs_command import SysfsCommand
 
 
 class SystemDeviceCommandFactory(BaseDeviceCommandFactory):
@@ -49,18 +59,68 @@ class SystemDeviceCommandFactory(BaseDeviceCommandFactory):
         self,
         logger_factory: BaseLoggerFactory,
         package_config_provider: BasePackageConfigProvider,
+        process_executor: BaseProcessExecutor,
     ) -> None:
         self._logger_factory = logger_factory
         self._package_config_provider = package_config_provider
+        self._process_executor = process_executor
+        self._physical_device_command: Optional[DeviceCommand] = None
+        self._live_device_command: Optional[DeviceCommand] = None
+        self._static_device_command: Optional[DeviceCommand] = None
+        self._device_command_lock = Lock()
 
     def physical_device_command(self) -> DeviceCommand:
-        return LsblkCommand(self._logger_factory, self._package_config_provider)
+        with self._device_command_lock:
+            if self._physical_device_command is None:
+                logger_factory = self._logger_factory
+                package_config_provider = self._package_config_provider
+                process_executor = self._process_executor
+                sysfs_command = SysfsCommand(logger_factory, package_config_provider)
+
+                self._physical_device_command = (
+                    sysfs_command
+                    if self._is_kernel_topology_source()
+                    and sysfs_command.is_available()
+                    else LsblkCommand(
+                        logger_factory, package_config_provider, process_executor
+                    )
+                )
+
+            return self._physical_device_command
 
     def live_device_command(self) -> DeviceCommand:
-        return FindmntCommand(self._logger_factory)
+        with self._device_command_lock:
+            if self._live_device_command is None:
+                logger_factory = self._logger_factory
+                process_executor = self._process_executor
+                mountinfo_command = MountinfoCommand(logger_factory)
+
+                self._live_device_command = (
+                    mountinfo_command
+                    if self._is_kernel_topology_source()
+                    and mountinfo_command.is_available()
+                    else FindmntCommand(logger_factory, process_executor)
+                )
+
+            return self._live_device_command
 
     def static_device_command(self) -> DeviceCommand:
-        return FstabCommand(self._logger_factory)
+        with self._device_command_lock:
+            if self._static_device_command is None:
+                self._static_device_command = FstabCommand(self._logger_factory)
+
+            return self._static_device_command
+
+    def _is_kernel_topology_source(self) -> bool:
+        package_config_provider = self._package_config_provider
+        package_config = package_config_provider.get_config()
+        process_executor = self._process_executor
+
+        # recorded or replayed runs must go through the process executor
+        return (
+            package_config.device_topology_source == DeviceTopologySource.KERNEL
+            and not process_executor.has_bundle()
+        )
 
 
 class BtrfsUtilSubvolumeCommandFactory(BaseSubvolumeCommandFactory):
@@ -69,12 +129,18 @@ class BtrfsUtilSubvolumeCommandFactory(BaseSubvolumeCommandFactory):
         self,
         logger_factory: BaseLoggerFactory,
         package_config_provider: BasePackageConfigProvider,
+        persistence_provider: BasePersistenceProvider,
     ) -> None:
         self._logger_factory = logger_factory
         self._package_config_provider = package_config_provider
+        self._persistence_provider = persistence_provider
 
     def subvolume_command(self) -> SubvolumeCommand:
-        return BtrfsUtilCommand(self._logger_factory, self._package_config_provider)
+        return BtrfsUtilCommand(
+            self._logger_factory,
+            self._package_config_provider,
+            self._persistence_provider,
+        )
 
 
 class PillowIconCommandFactory(BaseIconCommandFactory):
@@ -22,13 +22,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 import json
-import subprocess
 from subprocess import CalledProcessError
 from typing import Any, Iterable, Iterator
 
 from more_itertools import always_iterable
 
 from refind_btrfs.common import constants
+from refind_btrfs.common.abc import BaseProcessExecutor
 from refind_btrfs.common.abc.commands import DeviceCommand
 from refind_btrfs.common.abc.factories import BaseLoggerFactory
 from refind_btrfs.common.enums import FindmntColumn, FindmntJsonKey
@@ -48,8 +48,13 @@ from refind_btrfs.utility.helpers import (
 
 
 class FindmntCommand(DeviceCommand):
-    def __init__(self, logger_factory: BaseLoggerFactory) -> None:
+    def __init__(
+        self,
+        logger_factory: BaseLoggerFactory,
+        process_executor: BaseProcessExecutor,
+    ) -> None:
         self._logger = logger_factory.logger(__name__)
+        self._process_executor = process_executor
 
     def get_block_devices(self) -> Iterator[BlockDevice]:
         raise NotImplementedError(
@@ -64,10 +69,53 @@ class FindmntCommand(DeviceCommand):
             f"'{DeviceCommand.save_partition_table.__name__}' method!"
         )
 
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        logger = self._logger
+
+        logger.info("Initializing the mounted partitions using findmnt.")
+
+        findmnt_partitions = self._get_findmnt_partitions(
+            "Could not initialize the mounted partitions!"
+        )
+
+        yield from FindmntCommand._map_to_partitions(findmnt_partitions)
+
     def _block_device_partition_table(
         self, block_device: BlockDevice
     ) -> PartitionTable:
         logger = self._logger
+        device_name = block_device.name
+
+        logger.info(
+            f"Initializing the live partition table for device '{device_name}' using findmnt."
+        )
+
+        findmnt_partitions = (
+            findmnt_partition
+            for findmnt_partition in self._get_findmnt_partitions(
+                f"Could not initialize the live partition table for '{device_name}'!"
+            )
+            if block_device.is_matched_with(
+                default_if_none(
+                    findmnt_partition.get(FindmntColumn.DEVICE_NAME.value),
+                    constants.EMPTY_STR,
+                )
+            )
+        )
+
+        return PartitionTable(
+            constants.EMPTY_HEX_UUID, constants.MTAB_PT_TYPE
+        ).with_partitions(FindmntCommand._map_to_partitions(findmnt_partitions))
+
+    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
+        raise NotImplementedError(
+            f"Class '{FindmntCommand.__name__}' does not implement the "
+            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
+        )
+
+    def _get_findmnt_partitions(self, error_message: str) -> list[Any]:
+        logger = self._logger
+        process_executor = self._process_executor
         findmnt_columns = [
             FindmntColumn.PART_UUID,
             FindmntColumn.PART_LABEL,
@@ -78,21 +126,15 @@ class FindmntCommand(DeviceCommand):
             FindmntColumn.FS_MOUNT_POINT,
             FindmntColumn.FS_MOUNT_OPTIONS,
         ]
-        device_name = block_device.name
         output = constants.COLUMN_SEPARATOR.join(
             [findmnt_column_key.value.upper() for findmnt_column_key in findmnt_columns]
         )
         findmnt_command = f"findmnt --json --mtab --real --nofsroot --uniq --output {output}"
 
         try:
-            logger.info(
-                f"Initializing the live partition table for device '{device_name}' using findmnt."
-            )
             logger.debug(f"Running command '{findmnt_command}'.")
 
-            findmnt_process = subprocess.run(
-                findmnt_command.split(), capture_output=True, check=True, text=True
-            )
+            findmnt_output = process_executor.run(findmnt_command.split())
         except CalledProcessError as e:
             stderr = checked_cast(str, e.stderr)
 
@@ -102,32 +144,14 @@ class FindmntCommand(DeviceCommand):
                 message = f"findmnt execution failed: '{stderr.rstrip()}'!"
 
             logger.exception(message)
-            raise PartitionError(
-                f"Could not initialize the live partition table for '{device_name}'!"
-            ) from e
+            raise PartitionError(error_message) from e
 
-        findmnt_parsed_output = json.loads(findmnt_process.stdout)
-        findmnt_partitions = (
-            findmnt_partition
-            for findmnt_partition in always_iterable(
+        findmnt_parsed_output = json.loads(findmnt_output)
+
+        return list(
+            always_iterable(
                 findmnt_parsed_output.get(FindmntJsonKey.FILESYSTEMS.value)
             )
-            if block_device.is_matched_with(
-                default_if_none(
-                    findmnt_partition.get(FindmntColumn.DEVICE_NAME.value),
-                    constants.EMPTY_STR,
-                )
-            )
-        )
-
-        return PartitionTable(
-            constants.EMPTY_HEX_UUID, constants.MTAB_PT_TYPE
-        ).with_partitions(FindmntCommand._map_to_partitions(findmnt_partitions))
-
-    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
-        raise NotImplementedError(
-            f"Class '{FindmntCommand.__name__}' does not implement the "
-            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
         )
 
     @staticmethod
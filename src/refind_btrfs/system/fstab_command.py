@@ -21,8 +21,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 # endregion
 
-import fileinput
-from typing import Iterator, TextIO
+import hashlib
+import os
+import stat
+import tempfile
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Iterator
 
 from refind_btrfs.common import constants
 from refind_btrfs.common.abc.commands import DeviceCommand
@@ -46,6 +51,8 @@ from refind_btrfs.utility.helpers import (
 class FstabCommand(DeviceCommand):
     def __init__(self, logger_factory: BaseLoggerFactory) -> None:
         self._logger = logger_factory.logger(__name__)
+        self._partitions_cache: dict[str, list[Partition]] = {}
+        self._partitions_lock = Lock()
 
     def get_block_devices(self) -> Iterator[BlockDevice]:
         raise NotImplementedError(
@@ -53,6 +60,12 @@ class FstabCommand(DeviceCommand):
             f"'{DeviceCommand.get_block_devices.__name__}' method!"
         )
 
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        raise NotImplementedError(
+            f"Class '{FstabCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.get_mounted_partitions.__name__}' method!"
+        )
+
     def _block_device_partition_table(
         self, block_device: BlockDevice
     ) -> PartitionTable:
@@ -66,17 +79,31 @@ class FstabCommand(DeviceCommand):
         fstab_file_path = none_throws(partition_table.fstab_file_path)
 
         try:
-            logger.info(f"Modifying the '{fstab_file_path}' file.")
+            fstab_content = fstab_file_path.read_text()
+        except OSError as e:
+            logger.exception("Path.read_text() call failed!")
+            raise PartitionError(
+                f"Could not read from the '{fstab_file_path}' file!"
+            ) from e
 
-            with fileinput.input(str(fstab_file_path), inplace=True) as fstab_file:
-                for fstab_line in fstab_file:
-                    transformed_fstab_line = partition_table.transform_fstab_line(
-                        fstab_line
-                    )
+        transformed_fstab_content = constants.EMPTY_STR.join(
+            partition_table.transform_fstab_line(fstab_line)
+            for fstab_line in fstab_content.splitlines(keepends=True)
+        )
 
-                    print(transformed_fstab_line, end=constants.EMPTY_STR)
+        if transformed_fstab_content == fstab_content:
+            logger.info(
+                f"Skipping the '{fstab_file_path}' file, its content is unchanged."
+            )
+
+            return
+
+        try:
+            logger.info(f"Writing to the '{fstab_file_path}' file.")
+
+            FstabCommand._replace_content_of(fstab_file_path, transformed_fstab_content)
         except OSError as e:
-            logger.exception("fileinput.input() call failed!")
+            logger.exception("Atomic replacement of the file's content failed!")
             raise PartitionError(
                 f"Could not modify the '{fstab_file_path}' file!"
             ) from e
@@ -97,23 +124,62 @@ class FstabCommand(DeviceCommand):
                 f"subvolume '{logical_path}' from its fstab file."
             )
 
-            with fstab_file_path.open("r") as fstab_file:
-                return (
-                    PartitionTable(constants.EMPTY_HEX_UUID, constants.FSTAB_PT_TYPE)
-                    .with_fstab_file_path(fstab_file_path)
-                    .with_partitions(FstabCommand._map_to_partitions(fstab_file))
-                )
+            fstab_content = fstab_file_path.read_bytes()
         except OSError as e:
-            logger.exception("Path.open('r') call failed!")
+            logger.exception("Path.read_bytes() call failed!")
             raise PartitionError(
                 f"Could not read from the '{fstab_file_path}' file!"
             ) from e
 
+        fstab_content_hash = hashlib.sha256(fstab_content).hexdigest()
+
+        with self._partitions_lock:
+            partitions = self._partitions_cache.get(fstab_content_hash)
+
+            if partitions is None:
+                fstab_lines = fstab_content.decode().splitlines(keepends=True)
+                partitions = list(FstabCommand._map_to_partitions(fstab_lines))
+
+                self._partitions_cache[fstab_content_hash] = partitions
+            else:
+                logger.debug(
+                    f"Reusing the already parsed partitions for '{fstab_file_path}'."
+                )
+
+        return (
+            PartitionTable(constants.EMPTY_HEX_UUID, constants.FSTAB_PT_TYPE)
+            .with_fstab_file_path(fstab_file_path)
+            .with_shared_partitions(partitions)
+        )
+
+    @staticmethod
+    def _replace_content_of(file_path: Path, content: str) -> None:
+        # a symlinked file is replaced at its target, the symlink itself is kept
+        file_path = Path(os.path.realpath(file_path))
+        file_stat = file_path.stat()
+        file_descriptor, temp_file_name = tempfile.mkstemp(
+            prefix=f".{file_path.name}.", dir=str(file_path.parent)
+        )
+        temp_file_path = Path(temp_file_name)
+
+        try:
+            with os.fdopen(file_descriptor, "w") as temp_file:
+                temp_file.write(content)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            os.chmod(temp_file_path, stat.S_IMODE(file_stat.st_mode))
+            os.chown(temp_file_path, file_stat.st_uid, file_stat.st_gid)
+            os.replace(temp_file_path, file_path)
+        except OSError:
+            temp_file_path.unlink(missing_ok=True)
+            raise
+
     @staticmethod
     def _map_to_partitions(
-        fstab_file: TextIO,
+        fstab_lines: Iterable[str],
     ) -> Iterator[Partition]:
-        for fstab_line in fstab_file:
+        for fstab_line in fstab_lines:
             if PartitionTable.is_valid_fstab_entry(fstab_line):
                 split_fstab_entry = fstab_line.split()
                 fs_dump = try_parse_int(split_fstab_entry[FstabColumn.FS_DUMP.value])
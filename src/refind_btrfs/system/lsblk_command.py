@@ -22,13 +22,15 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 import json
-import subprocess
 from subprocess import CalledProcessError
-from typing import Any, Iterable, Iterator
+from threading import Lock
+from typing import Any, Iterable, Iterator, Optional
+from uuid import UUID
 
-from more_itertools import always_iterable, one
+from more_itertools import always_iterable
 
 from refind_btrfs.common import ConfigurableMixin, constants
+from refind_btrfs.common.abc import BaseProcessExecutor
 from refind_btrfs.common.abc.commands import DeviceCommand
 from refind_btrfs.common.abc.factories import BaseLoggerFactory
 from refind_btrfs.common.abc.providers import BasePackageConfigProvider
@@ -45,6 +47,7 @@ from refind_btrfs.utility.helpers import (
     checked_cast,
     default_if_none,
     is_none_or_whitespace,
+    none_throws,
 )
 
 
@@ -53,48 +56,30 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
         self,
         logger_factory: BaseLoggerFactory,
         package_config_provider: BasePackageConfigProvider,
+        process_executor: BaseProcessExecutor,
     ) -> None:
         ConfigurableMixin.__init__(self, package_config_provider)
 
         self._logger = logger_factory.logger(__name__)
+        self._process_executor = process_executor
+        self._lsblk_blockdevices_index: Optional[dict[str, Any]] = None
+        self._snapshot_lock = Lock()
 
     def get_block_devices(self) -> Iterator[BlockDevice]:
         logger = self._logger
-        lsblk_columns = [
-            LsblkColumn.DEVICE_NAME,
-            LsblkColumn.DEVICE_TYPE,
-            LsblkColumn.MAJOR_MINOR,
-        ]
-        output = constants.COLUMN_SEPARATOR.join(
-            [lsblk_column_key.value.upper() for lsblk_column_key in lsblk_columns]
-        )
-        lsblk_command = f"lsblk --json --merge --paths --output {output}"
 
-        try:
-            logger.info("Initializing the block devices using lsblk.")
-            logger.debug(f"Running command '{lsblk_command}'.")
+        logger.info("Initializing the block devices using lsblk.")
 
-            lsblk_process = subprocess.run(
-                lsblk_command.split(), capture_output=True, check=True, text=True
-            )
-        except CalledProcessError as e:
-            stderr = checked_cast(str, e.stderr)
+        lsblk_blockdevices = self._take_topology_snapshot()
 
-            if is_none_or_whitespace(stderr):
-                message = "lsblk execution failed!"
-            else:
-                message = f"lsblk execution failed: '{stderr.rstrip()}'!"
+        yield from LsblkCommand.map_to_block_devices(lsblk_blockdevices)
 
-            logger.exception(message)
-            raise PartitionError("Could not initialize the block devices!") from e
-
-        lsblk_parsed_output = json.loads(lsblk_process.stdout)
-        lsblk_blockdevices = always_iterable(
-            lsblk_parsed_output.get(LsblkJsonKey.BLOCKDEVICES.value)
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        raise NotImplementedError(
+            f"Class '{LsblkCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.get_mounted_partitions.__name__}' method!"
         )
 
-        yield from LsblkCommand._map_to_block_devices(lsblk_blockdevices)
-
     # pylint: disable=unused-argument
     def save_partition_table(self, partition_table: PartitionTable) -> None:
         raise NotImplementedError(
@@ -106,33 +91,59 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
         self, block_device: BlockDevice
     ) -> PartitionTable:
         logger = self._logger
+        device_name = block_device.name
+
+        logger.info(
+            f"Initializing the physical partition table for device '{device_name}'."
+        )
+
+        with self._snapshot_lock:
+            if self._lsblk_blockdevices_index is None:
+                self._take_topology_snapshot()
+
+            lsblk_blockdevices_index = none_throws(self._lsblk_blockdevices_index)
+
+        esp_uuid = self.package_config.esp_uuid
+
+        return LsblkCommand.map_to_partition_table(
+            lsblk_blockdevices_index, block_device, esp_uuid
+        )
+
+    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
+        raise NotImplementedError(
+            f"Class '{LsblkCommand.__name__}' does not implement the "
+            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
+        )
+
+    def _take_topology_snapshot(self) -> list[Any]:
+        logger = self._logger
+        process_executor = self._process_executor
         lsblk_columns = [
+            LsblkColumn.DEVICE_NAME,
+            LsblkColumn.DEVICE_TYPE,
+            LsblkColumn.MAJOR_MINOR,
             LsblkColumn.PTABLE_UUID,
             LsblkColumn.PTABLE_TYPE,
             LsblkColumn.PART_UUID,
             LsblkColumn.PART_TYPE,
             LsblkColumn.PART_LABEL,
             LsblkColumn.FS_UUID,
-            LsblkColumn.DEVICE_NAME,
             LsblkColumn.FS_TYPE,
             LsblkColumn.FS_LABEL,
             LsblkColumn.FS_MOUNT_POINT,
         ]
-        device_name = block_device.name
         output = constants.COLUMN_SEPARATOR.join(
             [lsblk_column_key.value.upper() for lsblk_column_key in lsblk_columns]
         )
-        lsblk_command = f"lsblk {device_name} --json --paths --tree --output {output}"
+        # without the --merge option, a holder shared by several devices (e.g.,
+        # a RAID array) is listed under every one of them, which is what their
+        # partition tables need, whereas the block devices are merged later on
+        lsblk_command = f"lsblk --json --paths --tree --output {output}"
 
         try:
-            logger.info(
-                f"Initializing the physical partition table for device '{device_name}' using lsblk."
-            )
             logger.debug(f"Running command '{lsblk_command}'.")
 
-            lsblk_process = subprocess.run(
-                lsblk_command.split(), check=True, capture_output=True, text=True
-            )
+            lsblk_output = process_executor.run(lsblk_command.split())
         except CalledProcessError as e:
             stderr = checked_cast(str, e.stderr)
 
@@ -142,14 +153,51 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
                 message = f"lsblk execution failed: '{stderr.rstrip()}'!"
 
             logger.exception(message)
-            raise PartitionError(
-                f"Could not initialize the physical partition table for '{device_name}'!"
-            ) from e
+            raise PartitionError("Could not initialize the block devices!") from e
 
-        lsblk_parsed_output = json.loads(lsblk_process.stdout)
-        lsblk_blockdevice = one(
-            lsblk_parsed_output.get(LsblkJsonKey.BLOCKDEVICES.value)
+        lsblk_parsed_output = json.loads(lsblk_output)
+        lsblk_blockdevices = list(
+            always_iterable(lsblk_parsed_output.get(LsblkJsonKey.BLOCKDEVICES.value))
+        )
+        self._lsblk_blockdevices_index = LsblkCommand.index_lsblk_blockdevices(
+            lsblk_blockdevices
         )
+
+        return lsblk_blockdevices
+
+    @staticmethod
+    def index_lsblk_blockdevices(lsblk_blockdevices: Iterable[Any]) -> dict[str, Any]:
+        lsblk_blockdevices_index: dict[str, Any] = {}
+
+        LsblkCommand._index_lsblk_blockdevices(
+            lsblk_blockdevices, lsblk_blockdevices_index
+        )
+
+        return lsblk_blockdevices_index
+
+    @staticmethod
+    def map_to_partition_table(
+        lsblk_blockdevices_index: dict[str, Any],
+        block_device: BlockDevice,
+        esp_uuid: UUID,
+    ) -> PartitionTable:
+        device_name = block_device.name
+        lsblk_blockdevice = lsblk_blockdevices_index.get(device_name)
+
+        if lsblk_blockdevice is None:
+            major_number = block_device.major_number
+            minor_number = block_device.minor_number
+
+            if major_number is not None and minor_number is not None:
+                lsblk_blockdevice = lsblk_blockdevices_index.get(
+                    f"{major_number}:{minor_number}"
+                )
+
+        if lsblk_blockdevice is None:
+            raise PartitionError(
+                f"Could not find the '{device_name}' device in the device topology!"
+            )
+
         lsblk_partition_table_columns = [
             default_if_none(
                 lsblk_blockdevice.get(lsblk_column_key.value), constants.EMPTY_STR
@@ -159,7 +207,6 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
                 LsblkColumn.PTABLE_TYPE,
             ]
         ]
-        esp_uuid = self.package_config.esp_uuid
         lsblk_partitions = always_iterable(
             lsblk_blockdevice.get(LsblkJsonKey.CHILDREN.value)
         )
@@ -170,17 +217,73 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
             .with_partitions(LsblkCommand._map_to_partitions(lsblk_partitions))
         )
 
-    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
-        raise NotImplementedError(
-            f"Class '{LsblkCommand.__name__}' does not implement the "
-            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
+    @staticmethod
+    def map_to_block_devices(
+        lsblk_blockdevices: Iterable[Any],
+    ) -> Iterator[BlockDevice]:
+        lsblk_blockdevices_list = list(lsblk_blockdevices)
+        last_holder_parents: dict[str, Optional[str]] = {}
+
+        LsblkCommand._find_last_holder_parents(
+            lsblk_blockdevices_list, None, last_holder_parents
+        )
+
+        yield from LsblkCommand._map_to_merged_block_devices(
+            lsblk_blockdevices_list, None, last_holder_parents
         )
 
     @staticmethod
-    def _map_to_block_devices(
+    def _index_lsblk_blockdevices(
+        lsblk_blockdevices: Iterable[Any], lsblk_blockdevices_index: dict[str, Any]
+    ) -> None:
+        for lsblk_blockdevice in lsblk_blockdevices:
+            for lsblk_column_key in [LsblkColumn.DEVICE_NAME, LsblkColumn.MAJOR_MINOR]:
+                key = lsblk_blockdevice.get(lsblk_column_key.value)
+
+                if not is_none_or_whitespace(key):
+                    lsblk_blockdevices_index.setdefault(key, lsblk_blockdevice)
+
+            lsblk_children = always_iterable(
+                lsblk_blockdevice.get(LsblkJsonKey.CHILDREN.value)
+            )
+
+            LsblkCommand._index_lsblk_blockdevices(
+                lsblk_children, lsblk_blockdevices_index
+            )
+
+    @staticmethod
+    def _find_last_holder_parents(
+        lsblk_blockdevices: Iterable[Any],
+        parent_key: Optional[str],
+        last_holder_parents: dict[str, Optional[str]],
+    ) -> None:
+        for lsblk_blockdevice in lsblk_blockdevices:
+            key = LsblkCommand._get_lsblk_blockdevice_key(lsblk_blockdevice)
+
+            last_holder_parents[key] = parent_key
+
+            lsblk_children = always_iterable(
+                lsblk_blockdevice.get(LsblkJsonKey.CHILDREN.value)
+            )
+
+            LsblkCommand._find_last_holder_parents(
+                lsblk_children, key, last_holder_parents
+            )
+
+    # same as with lsblk's --merge option, a holder shared by several devices
+    # is a dependency of only the last one of them
+    @staticmethod
+    def _map_to_merged_block_devices(
         lsblk_blockdevices: Iterable[Any],
+        parent_key: Optional[str],
+        last_holder_parents: dict[str, Optional[str]],
     ) -> Iterator[BlockDevice]:
         for lsblk_blockdevice in lsblk_blockdevices:
+            key = LsblkCommand._get_lsblk_blockdevice_key(lsblk_blockdevice)
+
+            if last_holder_parents[key] != parent_key:
+                continue
+
             lsblk_blockdevice_columns = [
                 default_if_none(
                     lsblk_blockdevice.get(lsblk_column_key.value), constants.EMPTY_STR
@@ -197,10 +300,23 @@ class LsblkCommand(DeviceCommand, ConfigurableMixin):
 
             yield (
                 BlockDevice(*lsblk_blockdevice_columns).with_dependencies(
-                    LsblkCommand._map_to_block_devices(lsblk_dependencies)
+                    LsblkCommand._map_to_merged_block_devices(
+                        lsblk_dependencies, key, last_holder_parents
+                    )
                 )
             )
 
+    @staticmethod
+    def _get_lsblk_blockdevice_key(lsblk_blockdevice: Any) -> str:
+        major_minor = lsblk_blockdevice.get(LsblkColumn.MAJOR_MINOR.value)
+
+        if not is_none_or_whitespace(major_minor):
+            return major_minor
+
+        return default_if_none(
+            lsblk_blockdevice.get(LsblkColumn.DEVICE_NAME.value), constants.EMPTY_STR
+        )
+
     @staticmethod
     def _map_to_partitions(
         lsblk_partitions: Iterable[Any],
@@ -0,0 +1,299 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from refind_btrfs.common import constants
+from refind_btrfs.common.abc.commands import DeviceCommand
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.enums import (
+    MountinfoColumn,
+    MountinfoSuffixColumn,
+    UdevProperty,
+)
+from refind_btrfs.common.exceptions import PartitionError
+from refind_btrfs.device import (
+    BlockDevice,
+    Filesystem,
+    Partition,
+    PartitionTable,
+    Subvolume,
+)
+from refind_btrfs.utility.helpers import (
+    has_items,
+    none_throws,
+    unescape_octal_sequences_in,
+)
+
+from .udev_database import UdevDatabase
+
+
+class MountinfoEntry(NamedTuple):
+    major_minor: str
+    device_name: str
+    fs_type: str
+    mount_point: str
+    mount_options: str
+
+
+class MountinfoCommand(DeviceCommand):
+    def __init__(
+        self,
+        logger_factory: BaseLoggerFactory,
+        root_directory: Path = constants.ROOT_DIR,
+    ) -> None:
+        self._logger = logger_factory.logger(__name__)
+        self._mountinfo_file_path = root_directory / constants.MOUNTINFO_FILE
+        self._udev_database = UdevDatabase(root_directory / constants.UDEV_DATA_DIR)
+        self._mountinfo_content: Optional[str] = None
+        self._mountinfo_entries: list[MountinfoEntry] = []
+        self._entries_by_major_minor: dict[str, list[int]] = {}
+        self._entries_by_device_name: dict[str, list[int]] = {}
+        self._mountinfo_lock = Lock()
+
+    def is_available(self) -> bool:
+        return self._mountinfo_file_path.exists() and self._udev_database.exists()
+
+    def get_block_devices(self) -> Iterator[BlockDevice]:
+        raise NotImplementedError(
+            f"Class '{MountinfoCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.get_block_devices.__name__}' method!"
+        )
+
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        logger = self._logger
+
+        logger.info("Initializing the mounted partitions using mountinfo.")
+
+        with self._mountinfo_lock:
+            self._refresh_mountinfo_index()
+
+            mountinfo_entries = self._mountinfo_entries
+
+        yield from self._map_to_partitions(mountinfo_entries, {})
+
+    # pylint: disable=unused-argument
+    def save_partition_table(self, partition_table: PartitionTable) -> None:
+        raise NotImplementedError(
+            f"Class '{MountinfoCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.save_partition_table.__name__}' method!"
+        )
+
+    def _block_device_partition_table(
+        self, block_device: BlockDevice
+    ) -> PartitionTable:
+        logger = self._logger
+        device_name = block_device.name
+
+        logger.info(
+            f"Initializing the live partition table for device '{device_name}' using mountinfo."
+        )
+
+        with self._mountinfo_lock:
+            self._refresh_mountinfo_index()
+
+            mountinfo_entries = self._mountinfo_entries
+            entries_by_major_minor = self._entries_by_major_minor
+            entries_by_device_name = self._entries_by_device_name
+
+        major_minors = dict(MountinfoCommand._get_major_minors_of(block_device))
+        matched_positions: set[int] = set()
+
+        for name, major_minor in major_minors.items():
+            matched_positions.update(entries_by_device_name.get(name, []))
+            matched_positions.update(entries_by_major_minor.get(major_minor, []))
+
+        matched_entries = [
+            mountinfo_entries[position] for position in sorted(matched_positions)
+        ]
+
+        return PartitionTable(
+            constants.EMPTY_HEX_UUID, constants.MTAB_PT_TYPE
+        ).with_partitions(self._map_to_partitions(matched_entries, major_minors))
+
+    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
+        raise NotImplementedError(
+            f"Class '{MountinfoCommand.__name__}' does not implement the "
+            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
+        )
+
+    def _refresh_mountinfo_index(self) -> None:
+        logger = self._logger
+        mountinfo_file_path = self._mountinfo_file_path
+
+        try:
+            mountinfo_content = mountinfo_file_path.read_text()
+        except OSError as e:
+            logger.exception("Path.read_text() call failed!")
+            raise PartitionError(
+                f"Could not read from the '{mountinfo_file_path}' file!"
+            ) from e
+
+        if mountinfo_content == self._mountinfo_content:
+            return
+
+        logger.debug(f"Parsing the '{mountinfo_file_path}' file.")
+
+        mountinfo_entries = list(
+            MountinfoCommand.map_to_mountinfo_entries(mountinfo_content)
+        )
+        entries_by_major_minor: dict[str, list[int]] = {}
+        entries_by_device_name: dict[str, list[int]] = {}
+
+        for position, mountinfo_entry in enumerate(mountinfo_entries):
+            entries_by_major_minor.setdefault(mountinfo_entry.major_minor, []).append(
+                position
+            )
+            entries_by_device_name.setdefault(mountinfo_entry.device_name, []).append(
+                position
+            )
+
+        self._mountinfo_content = mountinfo_content
+        self._mountinfo_entries = mountinfo_entries
+        self._entries_by_major_minor = entries_by_major_minor
+        self._entries_by_device_name = entries_by_device_name
+
+    def _map_to_partitions(
+        self, mountinfo_entries: Iterable[MountinfoEntry], major_minors: dict[str, str]
+    ) -> Iterator[Partition]:
+        udev_database = self._udev_database
+
+        for mountinfo_entry in mountinfo_entries:
+            device_name = mountinfo_entry.device_name
+            major_minor = major_minors.get(device_name, mountinfo_entry.major_minor)
+            major_number, minor_number = BlockDevice.try_parse_major_minor(
+                major_minor
+            )
+            udev_properties: dict[str, str] = {}
+
+            if major_number is not None and minor_number is not None:
+                udev_properties = udev_database.get_properties_for(
+                    major_number, minor_number
+                )
+
+            part_columns = [
+                udev_properties.get(UdevProperty.PART_UUID.value, constants.EMPTY_STR),
+                device_name,
+                udev_properties.get(UdevProperty.PART_LABEL.value, constants.EMPTY_STR),
+            ]
+            fs_columns = [
+                udev_properties.get(UdevProperty.FS_UUID.value, constants.EMPTY_STR),
+                udev_properties.get(UdevProperty.FS_LABEL.value, constants.EMPTY_STR),
+                mountinfo_entry.fs_type,
+                mountinfo_entry.mount_point,
+            ]
+
+            yield (
+                Partition(*part_columns).with_filesystem(
+                    Filesystem(*fs_columns).with_mount_options(
+                        mountinfo_entry.mount_options
+                    )
+                )
+            )
+
+    @staticmethod
+    def map_to_mountinfo_entries(mountinfo_content: str) -> Iterator[MountinfoEntry]:
+        prefix_columns_count = MountinfoColumn.FS_MOUNT_OPTIONS.value + 1
+        suffix_columns_count = len(MountinfoSuffixColumn)
+        mount_points: set[str] = set()
+
+        for mountinfo_line in mountinfo_content.splitlines():
+            split_mountinfo_entry = mountinfo_line.split()
+
+            if len(split_mountinfo_entry) < prefix_columns_count:
+                continue
+
+            try:
+                separator_position = split_mountinfo_entry.index(
+                    constants.MOUNTINFO_FIELDS_SEPARATOR, prefix_columns_count
+                )
+            except ValueError:
+                continue
+
+            suffix_columns = split_mountinfo_entry[separator_position + 1 :]
+
+            if len(suffix_columns) < suffix_columns_count:
+                continue
+
+            device_name = unescape_octal_sequences_in(
+                suffix_columns[MountinfoSuffixColumn.DEVICE_NAME.value]
+            )
+            mount_point = unescape_octal_sequences_in(
+                split_mountinfo_entry[MountinfoColumn.FS_MOUNT_POINT.value]
+            )
+
+            # only the real (device backed) filesystems are of interest and
+            # over-mounted mount points are skipped, same as "findmnt --real --uniq"
+            if not device_name.startswith(constants.FORWARD_SLASH):
+                continue
+
+            if mount_point in mount_points:
+                continue
+
+            mount_points.add(mount_point)
+
+            yield MountinfoEntry(
+                split_mountinfo_entry[MountinfoColumn.MAJOR_MINOR.value],
+                device_name,
+                suffix_columns[MountinfoSuffixColumn.FS_TYPE.value],
+                mount_point,
+                MountinfoCommand._merge_mount_options(
+                    split_mountinfo_entry[MountinfoColumn.FS_MOUNT_OPTIONS.value],
+                    suffix_columns[MountinfoSuffixColumn.FS_SUPER_OPTIONS.value],
+                ),
+            )
+
+    @staticmethod
+    def _merge_mount_options(vfs_options: str, super_options: str) -> str:
+        access_mode_options = ["rw", "ro"]
+        merged_options = vfs_options.split(constants.COLUMN_SEPARATOR)
+
+        merged_options.extend(
+            option
+            for option in super_options.split(constants.COLUMN_SEPARATOR)
+            if option not in access_mode_options and option not in merged_options
+        )
+
+        return constants.COLUMN_SEPARATOR.join(
+            option for option in merged_options if has_items(option)
+        )
+
+    @staticmethod
+    def _get_major_minors_of(block_device: BlockDevice) -> Iterator[tuple[str, str]]:
+        major_number = block_device.major_number
+        minor_number = block_device.minor_number
+        major_minor = (
+            f"{major_number}:{minor_number}"
+            if major_number is not None and minor_number is not None
+            else constants.EMPTY_STR
+        )
+
+        yield (block_device.name, major_minor)
+
+        dependencies = block_device.dependencies
+
+        if has_items(dependencies):
+            for dependency in none_throws(dependencies):
+                yield from MountinfoCommand._get_major_minors_of(dependency)
@@ -0,0 +1,228 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional
+
+from more_itertools import first_true
+
+from refind_btrfs.common import constants
+from refind_btrfs.common.enums import SnapshotSearchLayout
+from refind_btrfs.utility.helpers import has_items
+
+
+class SnapshotLocator(ABC):
+    @abstractmethod
+    def is_applicable_to(self, directory: Path) -> bool:
+        pass
+
+    @abstractmethod
+    def get_candidate_directories_in(
+        self, directory: Path, max_depth: int
+    ) -> Iterator[Path]:
+        pass
+
+    @abstractmethod
+    def is_candidate_directory(self, directory: Path, subdirectory: Path) -> bool:
+        pass
+
+    @staticmethod
+    def for_layout(
+        layout: SnapshotSearchLayout, directory: Path
+    ) -> Optional[SnapshotLocator]:
+        if layout == SnapshotSearchLayout.GENERIC:
+            return None
+
+        snapshot_locators: dict[SnapshotSearchLayout, SnapshotLocator] = {
+            SnapshotSearchLayout.SNAPPER: SnapperSnapshotLocator(),
+            SnapshotSearchLayout.TIMESHIFT: TimeshiftSnapshotLocator(),
+        }
+
+        if layout == SnapshotSearchLayout.AUTO:
+            return first_true(
+                snapshot_locators.values(),
+                pred=lambda snapshot_locator: snapshot_locator.is_applicable_to(
+                    directory
+                ),
+            )
+
+        snapshot_locator = snapshot_locators[layout]
+
+        # a directory which doesn't have the declared layout is searched as
+        # if it were a generic one rather than not at all
+        if snapshot_locator.is_applicable_to(directory):
+            return snapshot_locator
+
+        return None
+
+    @staticmethod
+    def _get_subdirectory_names_in(directory: Path) -> Iterator[str]:
+        try:
+            with os.scandir(directory) as directory_entries:
+                subdirectory_names = sorted(
+                    directory_entry.name
+                    for directory_entry in directory_entries
+                    if directory_entry.is_dir()
+                )
+        except OSError:
+            return
+
+        yield from subdirectory_names
+
+
+class SnapperSnapshotLocator(SnapshotLocator):
+    def is_applicable_to(self, directory: Path) -> bool:
+        # every subdirectory has to be a <number> one (files, such as the
+        # grub-snapshot.cfg one, are fine) and at least one of them has to
+        # contain the snapshot directory, otherwise nothing would be left for
+        # the subvolumes outside of this layout (the newest <number> one may
+        # not contain it yet while snapper is still creating the snapshot)
+        subdirectory_names = list(SnapshotLocator._get_subdirectory_names_in(directory))
+
+        if not has_items(subdirectory_names) or not all(
+            subdirectory_name.isdigit() for subdirectory_name in subdirectory_names
+        ):
+            return False
+
+        number_directory_names = sorted(subdirectory_names, key=int, reverse=True)
+
+        for number_directory_name in number_directory_names:
+            snapshot_directory = (
+                directory / number_directory_name / constants.SNAPPER_SNAPSHOT_DIR_NAME
+            )
+
+            if snapshot_directory.is_dir():
+                return True
+
+        return False
+
+    def get_candidate_directories_in(
+        self, directory: Path, max_depth: int
+    ) -> Iterator[Path]:
+        # <directory>/<number>/snapshot, newest first
+        if max_depth < 2:
+            return
+
+        number_directory_names = sorted(
+            (
+                subdirectory_name
+                for subdirectory_name in SnapshotLocator._get_subdirectory_names_in(
+                    directory
+                )
+                if subdirectory_name.isdigit()
+            ),
+            key=int,
+            reverse=True,
+        )
+
+        for number_directory_name in number_directory_names:
+            candidate_directory = (
+                directory / number_directory_name / constants.SNAPPER_SNAPSHOT_DIR_NAME
+            )
+
+            if candidate_directory.is_dir():
+                yield candidate_directory
+
+    def is_candidate_directory(self, directory: Path, subdirectory: Path) -> bool:
+        if not subdirectory.is_relative_to(directory):
+            return False
+
+        relative_parts = subdirectory.relative_to(directory).parts
+
+        return (
+            len(relative_parts) == 2
+            and relative_parts[0].isdigit()
+            and relative_parts[1] == constants.SNAPPER_SNAPSHOT_DIR_NAME
+        )
+
+
+class TimeshiftSnapshotLocator(SnapshotLocator):
+    def is_applicable_to(self, directory: Path) -> bool:
+        return self._get_snapshots_directory_in(directory) is not None
+
+    def get_candidate_directories_in(
+        self, directory: Path, max_depth: int
+    ) -> Iterator[Path]:
+        snapshots_directory = self._get_snapshots_directory_in(directory)
+
+        if snapshots_directory is None:
+            return
+
+        # <snapshots_directory>/<date>/@*, newest first
+        depth_offset = len(snapshots_directory.relative_to(directory).parts)
+
+        if max_depth < depth_offset + 2:
+            return
+
+        date_directory_names = sorted(
+            SnapshotLocator._get_subdirectory_names_in(snapshots_directory),
+            reverse=True,
+        )
+
+        for date_directory_name in date_directory_names:
+            date_directory = snapshots_directory / date_directory_name
+
+            for subvolume_directory_name in SnapshotLocator._get_subdirectory_names_in(
+                date_directory
+            ):
+                if subvolume_directory_name.startswith(
+                    constants.TIMESHIFT_SUBVOLUME_PREFIX
+                ):
+                    yield date_directory / subvolume_directory_name
+
+    def is_candidate_directory(self, directory: Path, subdirectory: Path) -> bool:
+        snapshots_directory = self._get_snapshots_directory_in(directory)
+
+        if snapshots_directory is None or not subdirectory.is_relative_to(
+            snapshots_directory
+        ):
+            return False
+
+        relative_parts = subdirectory.relative_to(snapshots_directory).parts
+
+        return len(relative_parts) == 2 and relative_parts[1].startswith(
+            constants.TIMESHIFT_SUBVOLUME_PREFIX
+        )
+
+    @staticmethod
+    def _get_snapshots_directory_in(directory: Path) -> Optional[Path]:
+        if (
+            directory.name == constants.TIMESHIFT_SNAPSHOTS_DIR_NAME
+            and directory.parent.name == constants.TIMESHIFT_DIR_NAME
+        ):
+            return directory
+
+        snapshots_directory = (
+            directory
+            / constants.TIMESHIFT_DIR_NAME
+            / constants.TIMESHIFT_SNAPSHOTS_DIR_NAME
+        )
+
+        if snapshots_directory.is_dir():
+            return snapshots_directory
+
+        return None
@@ -0,0 +1,734 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain
+from pathlib import Path, PurePosixPath
+from threading import Lock
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Set
+from uuid import UUID
+
+import btrfsutil
+from more_itertools import first_true
+
+from refind_btrfs.common import (
+    ConfigurableMixin,
+    DirectorySearchState,
+    SnapshotSearch,
+    SnapshotSearchKey,
+    SnapshotSearchState,
+    constants,
+)
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.abc.providers import (
+    BasePackageConfigProvider,
+    BasePersistenceProvider,
+)
+from refind_btrfs.common.enums import SnapshotSearchLayout
+from refind_btrfs.device import Subvolume, SubvolumeRecord
+from refind_btrfs.utility.helpers import (
+    default_if_none,
+    find_all_matched_subvolumes_in,
+    get_directory_mtimes_in,
+    get_subdirectories_in,
+    has_items,
+    none_throws,
+    try_get_mtime_of,
+)
+
+from .snapshot_locators import SnapshotLocator
+from .subvolume_index import SubvolumeIndex
+
+if TYPE_CHECKING:
+    from .btrfsutil_command import BtrfsUtilCommand
+
+
+class SnapshotSelection(NamedTuple):
+    count: int
+    required_uuids: Set[UUID]
+
+
+class SnapshotSearcher(ConfigurableMixin):
+    def __init__(
+        self,
+        logger_factory: BaseLoggerFactory,
+        package_config_provider: BasePackageConfigProvider,
+        persistence_provider: BasePersistenceProvider,
+        subvolume_command: BtrfsUtilCommand,
+    ) -> None:
+        ConfigurableMixin.__init__(self, package_config_provider)
+
+        self._logger = logger_factory.logger(__name__)
+        self._persistence_provider = persistence_provider
+        self._subvolume_command = subvolume_command
+        self._searched_directories: Set[Path] = set()
+        self._searched_directories_lock = Lock()
+        self._subvolume_indexes: dict[Path, SubvolumeIndex] = {}
+        self._subvolume_indexes_lock = Lock()
+
+    def get_all_source_snapshots_for(self, parent: Subvolume) -> Iterator[Subvolume]:
+        self._searched_directories.clear()
+        self._subvolume_indexes.clear()
+
+        package_config = self.package_config
+        snapshot_searches = package_config.snapshot_searches
+
+        if not has_items(snapshot_searches):
+            return
+
+        max_workers = min(
+            package_config.snapshot_search_concurrency, len(snapshot_searches)
+        )
+
+        persistence_provider = self._persistence_provider
+        previous_search_states = persistence_provider.get_snapshot_search_states()
+        snapshot_selection = self._get_snapshot_selection()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            current_search_states = dict(
+                executor.map(
+                    lambda snapshot_search: self._get_snapshot_search_state_for(
+                        snapshot_search,
+                        parent,
+                        previous_search_states,
+                        snapshot_selection,
+                    ),
+                    snapshot_searches,
+                )
+            )
+
+        persistence_provider.save_snapshot_search_states(current_search_states)
+
+        # the results are merged independently of the order in which the
+        # (possibly overlapping) searches have been completed
+        snapshots = {
+            snapshot.filesystem_path: snapshot
+            for search_state in current_search_states.values()
+            for snapshot in map(Subvolume.from_record, search_state.snapshot_records)
+        }
+
+        for filesystem_path in sorted(snapshots):
+            yield snapshots[filesystem_path]
+
+    def get_all_snapshots_in(self, directory: Path) -> Iterator[Subvolume]:
+        yield from self._search_for_snapshots_in(
+            directory, 1, layout=SnapshotSearchLayout.GENERIC
+        )
+
+    def _get_snapshot_search_state_for(
+        self,
+        snapshot_search: SnapshotSearch,
+        parent: Subvolume,
+        previous_search_states: dict[SnapshotSearchKey, SnapshotSearchState],
+        snapshot_selection: Optional[SnapshotSelection],
+    ) -> tuple[SnapshotSearchKey, SnapshotSearchState]:
+        search_key = SnapshotSearchKey.of(parent, snapshot_search)
+        previous_search_state = previous_search_states.get(search_key)
+        previous_directory_states = (
+            previous_search_state.directory_states
+            if previous_search_state is not None
+            else {}
+        )
+        is_nested = snapshot_search.is_nested
+        max_depth = snapshot_search.max_depth
+        layout = snapshot_search.layout
+
+        # nested snapshots aren't necessarily ordered along with their parents
+        if is_nested:
+            snapshot_selection = None
+
+        directory = search_key.directory
+        directory_state = self._get_directory_search_state_for(
+            directory,
+            max_depth,
+            parent,
+            layout,
+            snapshot_selection,
+            previous_directory_states.get(directory),
+        )
+        directory_states = {directory: directory_state}
+
+        if is_nested:
+            relative_directory = directory.relative_to(directory.root)
+
+            for snapshot_record in directory_state.snapshot_records:
+                nested_directory = (
+                    Path(snapshot_record.filesystem_path) / relative_directory
+                )
+
+                if nested_directory.is_dir():
+                    directory_states[
+                        nested_directory
+                    ] = self._get_directory_search_state_for(
+                        nested_directory,
+                        max_depth,
+                        parent,
+                        layout,
+                        None,
+                        previous_directory_states.get(nested_directory),
+                    )
+
+        return (search_key, SnapshotSearchState(directory_states))
+
+    def _get_directory_search_state_for(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Subvolume,
+        layout: SnapshotSearchLayout,
+        snapshot_selection: Optional[SnapshotSelection],
+        previous_directory_state: Optional[DirectorySearchState],
+    ) -> DirectorySearchState:
+        logger = self._logger
+        generation = self._try_get_own_generation_of(directory)
+        selection_count = (
+            snapshot_selection.count if snapshot_selection is not None else None
+        )
+
+        if (
+            previous_directory_state is not None
+            and previous_directory_state.is_sufficient_for(selection_count)
+        ):
+            # the directory's own subvolume hasn't been written to at all
+            if (
+                generation is not None
+                and generation == previous_directory_state.generation
+            ):
+                logger.info(
+                    f"Reusing the previously found snapshots in the '{directory}' directory."
+                )
+
+                return previous_directory_state
+
+            # only the directory itself is examined for a partial (selected)
+            # result, so it is discarded on any change beneath the directory
+            # whenever that can be told from the directory's generation
+            if not previous_directory_state.is_partial() or generation is None:
+                reused_directory_state = self._try_reuse_directory_search_state(
+                    directory, max_depth, parent, generation, previous_directory_state
+                )
+
+                if reused_directory_state is not None:
+                    return reused_directory_state
+
+        # only the snapshots of the known layouts are selected while they're
+        # being searched for, every other search finds all of them
+        if (
+            snapshot_selection is not None
+            and SnapshotLocator.for_layout(layout, directory) is None
+        ):
+            snapshot_selection = None
+            selection_count = None
+
+        snapshots = list(
+            self._search_for_snapshots_in(
+                directory,
+                max_depth,
+                parent=parent,
+                layout=layout,
+                snapshot_selection=snapshot_selection,
+            )
+        )
+        directory_mtimes = get_directory_mtimes_in(
+            directory,
+            max_depth - 1 if snapshot_selection is None else 0,
+            {snapshot.filesystem_path for snapshot in snapshots},
+        )
+
+        return DirectorySearchState.of(
+            generation, directory_mtimes, snapshots, selection_count
+        )
+
+    def _try_reuse_directory_search_state(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Subvolume,
+        generation: Optional[int],
+        previous_directory_state: DirectorySearchState,
+    ) -> Optional[DirectorySearchState]:
+        logger = self._logger
+        previous_directory_mtimes = previous_directory_state.directory_mtimes
+        current_directory_mtimes = {
+            previous_directory: try_get_mtime_of(previous_directory)
+            for previous_directory in previous_directory_mtimes
+        }
+        changed_directories = [
+            previous_directory
+            for previous_directory, mtime in previous_directory_mtimes.items()
+            if current_directory_mtimes[previous_directory] != mtime
+        ]
+
+        if not has_items(changed_directories):
+            logger.info(
+                f"Reusing the previously found snapshots in the '{directory}' directory."
+            )
+
+            return previous_directory_state._replace(generation=generation)
+
+        # a partial (selected) result can't be patched because the
+        # snapshots which would replace the deleted ones are unknown
+        if not previous_directory_state.is_partial() and all(
+            changed_directory.is_relative_to(directory)
+            for changed_directory in changed_directories
+        ):
+            return self._rescan_changed_directories_in(
+                directory,
+                max_depth,
+                parent,
+                generation,
+                previous_directory_state,
+                {
+                    changed_directory: current_directory_mtimes[changed_directory]
+                    for changed_directory in changed_directories
+                },
+            )
+
+        return None
+
+    def _rescan_changed_directories_in(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Subvolume,
+        generation: Optional[int],
+        previous_directory_state: DirectorySearchState,
+        changed_directory_mtimes: dict[Path, Optional[int]],
+    ) -> DirectorySearchState:
+        logger = self._logger
+        previous_directory_mtimes = previous_directory_state.directory_mtimes
+        previous_snapshot_records = {
+            Path(snapshot_record.filesystem_path): snapshot_record
+            for snapshot_record in previous_directory_state.snapshot_records
+        }
+        directory_mtimes = {
+            previous_directory: mtime
+            for previous_directory, mtime in previous_directory_mtimes.items()
+            if previous_directory not in changed_directory_mtimes
+        }
+        snapshot_records = [
+            snapshot_record
+            for filesystem_path, snapshot_record in previous_snapshot_records.items()
+            if filesystem_path.parent in directory_mtimes
+        ]
+
+        for changed_directory, mtime in changed_directory_mtimes.items():
+            # the directory itself is gone, along with everything in it
+            if mtime is None:
+                continue
+
+            logger.info(f"Rescanning the changed '{changed_directory}' directory.")
+
+            directory_mtimes[changed_directory] = mtime
+            remaining_depth = (
+                max_depth - len(changed_directory.relative_to(directory).parts) - 1
+            )
+
+            try:
+                subdirectories = get_subdirectories_in(changed_directory)
+            except OSError:
+                continue
+
+            for subdirectory in subdirectories:
+                # the previously examined directories are accounted for on
+                # their own, whether they have changed or not
+                if subdirectory in previous_directory_mtimes:
+                    continue
+
+                previous_snapshot_record = previous_snapshot_records.get(subdirectory)
+
+                if (
+                    previous_snapshot_record is not None
+                    and SnapshotSearcher._is_same_subvolume_as(
+                        subdirectory, previous_snapshot_record
+                    )
+                ):
+                    snapshot_records.append(previous_snapshot_record)
+
+                    continue
+
+                found_snapshots = list(
+                    self._walk_for_snapshots_in(subdirectory, remaining_depth, parent)
+                )
+                found_directories = {
+                    snapshot.filesystem_path for snapshot in found_snapshots
+                }
+
+                snapshot_records.extend(
+                    snapshot.to_record() for snapshot in found_snapshots
+                )
+
+                if subdirectory not in found_directories:
+                    directory_mtimes.update(
+                        get_directory_mtimes_in(
+                            subdirectory, remaining_depth - 1, found_directories
+                        )
+                    )
+
+        return DirectorySearchState(
+            generation, directory_mtimes, snapshot_records, None
+        )
+
+    def _search_for_snapshots_in(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Optional[Subvolume] = None,
+        layout: SnapshotSearchLayout = SnapshotSearchLayout.AUTO,
+        snapshot_selection: Optional[SnapshotSelection] = None,
+    ) -> Iterator[Subvolume]:
+        logger = self._logger
+
+        if parent is None:
+            logger.info(f"Getting all snapshots in the '{directory}' directory.")
+        else:
+            logical_path = parent.logical_path
+
+            logger.info(
+                f"Searching for snapshots of the '{logical_path}' "
+                f"subvolume in the '{directory}' directory."
+            )
+
+        resolved_path = directory.resolve()
+        snapshot_locator = SnapshotLocator.for_layout(layout, resolved_path)
+
+        if snapshot_locator is None and layout not in (
+            SnapshotSearchLayout.AUTO,
+            SnapshotSearchLayout.GENERIC,
+        ):
+            logger.info(
+                f"The '{directory}' directory doesn't have the {layout.value} "
+                "layout, searching it as a generic one."
+            )
+
+        # the known layouts are located newest first, which makes it possible
+        # to stop as soon as enough snapshots were found instead of examining
+        # every one of them, whereas the listed subvolume paths tell which
+        # candidates exist and which subvolumes are outside of the layout
+        if snapshot_locator is not None and snapshot_selection is not None:
+            subvolume_paths = self._get_subvolume_paths_in(resolved_path, max_depth)
+
+            if subvolume_paths is not None:
+                yield from self._take_selected_snapshots_from(
+                    self._locate_snapshots_in(
+                        resolved_path,
+                        max_depth,
+                        snapshot_locator,
+                        parent,
+                        subvolume_paths,
+                    ),
+                    snapshot_selection,
+                )
+
+                # these can't be ordered up front so none of them is skipped
+                for subvolume_path in sorted(subvolume_paths):
+                    if snapshot_locator.is_candidate_directory(
+                        resolved_path, subvolume_path
+                    ) or any(
+                        ancestor in subvolume_paths
+                        for ancestor in subvolume_path.parents
+                    ):
+                        continue
+
+                    if self._try_mark_as_searched(subvolume_path):
+                        snapshot = self._get_snapshot_from(subvolume_path, parent)
+
+                        if snapshot is not None:
+                            yield snapshot
+
+                return
+
+        subvolume_index = self._get_subvolume_index_for(resolved_path)
+
+        if subvolume_index is not None:
+            snapshots = subvolume_index.find_snapshots_in(
+                resolved_path, max_depth, parent=parent
+            )
+
+            for snapshot in snapshots:
+                if self._try_mark_as_searched(snapshot.filesystem_path):
+                    yield snapshot
+        elif snapshot_locator is not None:
+            yield from self._locate_snapshots_in(
+                resolved_path, max_depth, snapshot_locator, parent
+            )
+        else:
+            yield from self._walk_for_snapshots_in(directory, max_depth, parent)
+
+    def _locate_snapshots_in(
+        self,
+        directory: Path,
+        max_depth: int,
+        snapshot_locator: SnapshotLocator,
+        parent: Optional[Subvolume] = None,
+        subvolume_paths: Optional[Set[Path]] = None,
+    ) -> Iterator[Subvolume]:
+        candidate_directories = snapshot_locator.get_candidate_directories_in(
+            directory, max_depth
+        )
+
+        for candidate_directory in candidate_directories:
+            resolved_path = candidate_directory.resolve()
+
+            if subvolume_paths is not None and resolved_path not in subvolume_paths:
+                continue
+
+            if self._try_mark_as_searched(resolved_path):
+                snapshot = self._get_snapshot_from(resolved_path, parent)
+
+                if snapshot is not None:
+                    yield snapshot
+
+    @staticmethod
+    def _take_selected_snapshots_from(
+        snapshots: Iterable[Subvolume], snapshot_selection: SnapshotSelection
+    ) -> Iterator[Subvolume]:
+        selection_count = snapshot_selection.count
+        missing_uuids = set(snapshot_selection.required_uuids)
+        previous_sort_key: Optional[tuple[datetime, int]] = None
+        is_ordered = True
+        taken_count = 0
+
+        # the candidates are ordered by their names, which merely suggests
+        # how old they are, so the stop is confirmed against the creation
+        # times (the same order the snapshots are selected in later on) and
+        # every candidate is examined as soon as that order is violated
+        for snapshot in snapshots:
+            sort_key = snapshot.sort_key
+            is_selection_complete = taken_count >= selection_count and not has_items(
+                missing_uuids
+            )
+            is_ordered = is_ordered and (
+                previous_sort_key is None or sort_key < previous_sort_key
+            )
+
+            missing_uuids.discard(snapshot.uuid)
+            taken_count += 1
+            previous_sort_key = sort_key
+
+            yield snapshot
+
+            # this snapshot is older than every one taken before it
+            if is_selection_complete and is_ordered:
+                return
+
+    def _walk_for_snapshots_in(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Optional[Subvolume] = None,
+    ) -> Iterator[Subvolume]:
+        yield from find_all_matched_subvolumes_in(
+            directory,
+            max_depth,
+            lambda path: self._get_snapshot_from(path, parent),
+            self._try_mark_as_searched,
+        )
+
+    def _get_snapshot_from(
+        self, filesystem_path: Path, parent: Optional[Subvolume] = None
+    ) -> Optional[Subvolume]:
+        subvolume_command = self._subvolume_command
+        subvolume = subvolume_command.get_subvolume_from(filesystem_path)
+
+        if subvolume is not None:
+            is_matched = (
+                subvolume.is_snapshot_of(parent)
+                if parent is not None
+                else subvolume.is_snapshot()
+            )
+
+            if is_matched:
+                return subvolume
+
+        return None
+
+    def _get_subvolume_paths_in(
+        self, directory: Path, max_depth: int
+    ) -> Optional[set[Path]]:
+        logger = self._logger
+
+        try:
+            subvolume_directory = first_true(
+                chain([directory], directory.parents),
+                pred=lambda path: btrfsutil.is_subvolume(str(path)),
+            )
+
+            if subvolume_directory is None:
+                return None
+
+            subvolume_paths: set[Path] = set()
+
+            # only the paths are listed, which is a lot cheaper than getting
+            # the info of every nested subvolume
+            with btrfsutil.SubvolumeIterator(
+                str(subvolume_directory)
+            ) as subvolume_iterator:
+                for relative_path, _ in subvolume_iterator:
+                    subvolume_path = subvolume_directory / relative_path
+
+                    if (
+                        subvolume_path.is_relative_to(directory)
+                        and subvolume_path != directory
+                        and len(subvolume_path.relative_to(directory).parts)
+                        <= max_depth
+                    ):
+                        subvolume_paths.add(subvolume_path)
+        except btrfsutil.BtrfsUtilError:
+            logger.warning(
+                f"Could not list the subvolumes in the '{directory}' directory."
+            )
+
+            return None
+
+        return subvolume_paths
+
+    def _get_subvolume_index_for(self, directory: Path) -> Optional[SubvolumeIndex]:
+        if not directory.is_dir():
+            return None
+
+        with self._subvolume_indexes_lock:
+            return self._get_or_create_subvolume_index_for(directory)
+
+    def _get_or_create_subvolume_index_for(
+        self, directory: Path
+    ) -> Optional[SubvolumeIndex]:
+        logger = self._logger
+        subvolume_command = self._subvolume_command
+        subvolume_indexes = self._subvolume_indexes
+
+        try:
+            subvolume_directory = first_true(
+                chain([directory], directory.parents),
+                pred=lambda path: btrfsutil.is_subvolume(str(path)),
+            )
+
+            if subvolume_directory is None:
+                return None
+
+            if subvolume_directory in subvolume_indexes:
+                return subvolume_indexes[subvolume_directory]
+
+            subvolume_directory_str = str(subvolume_directory)
+            root_subvolume = none_throws(
+                subvolume_command.get_subvolume_from(subvolume_directory)
+            )
+            root_logical_path = PurePosixPath(root_subvolume.logical_path)
+            subvolumes = [root_subvolume]
+
+            logger.debug(
+                f"Indexing all subvolumes nested in the '{subvolume_directory}' subvolume."
+            )
+
+            with btrfsutil.SubvolumeIterator(
+                subvolume_directory_str, info=True
+            ) as subvolume_iterator:
+                for relative_path, subvolume_info in subvolume_iterator:
+                    is_read_only = bool(
+                        subvolume_info.flags & constants.SUBVOLUME_READ_ONLY_FLAG
+                    )
+
+                    subvolumes.append(
+                        subvolume_command.map_to_subvolume(
+                            subvolume_directory / relative_path,
+                            str(root_logical_path / relative_path),
+                            subvolume_info,
+                            is_read_only,
+                        )
+                    )
+
+        except btrfsutil.BtrfsUtilError:
+            logger.warning(
+                f"Could not index the subvolumes containing the '{directory}' "
+                "directory, falling back to walking it."
+            )
+
+            return None
+
+        subvolume_index = SubvolumeIndex(subvolumes)
+
+        subvolume_indexes[subvolume_directory] = subvolume_index
+
+        return subvolume_index
+
+    def _get_snapshot_selection(self) -> Optional[SnapshotSelection]:
+        snapshot_manipulation = self.package_config.snapshot_manipulation
+        selection_count = snapshot_manipulation.selection_count
+
+        if selection_count == sys.maxsize:
+            return None
+
+        persistence_provider = self._persistence_provider
+        previous_run_result = persistence_provider.get_previous_run_result()
+        required_uuids = {
+            default_if_none(bootable_snapshot.created_from, bootable_snapshot).uuid
+            for bootable_snapshot in previous_run_result.bootable_snapshots
+        }
+
+        return SnapshotSelection(selection_count, required_uuids)
+
+    def _try_get_own_generation_of(self, directory: Path) -> Optional[int]:
+        # only a subvolume's own generation is of any use, the one of the
+        # subvolume containing the directory changes on every write to it
+        try:
+            directory_str = str(directory)
+
+            if btrfsutil.is_subvolume(directory_str):
+                subvolume_info = btrfsutil.subvolume_info(directory_str)
+
+                return subvolume_info.generation
+        except btrfsutil.BtrfsUtilError:
+            self._logger.warning(
+                f"Could not get the generation of the '{directory}' subvolume."
+            )
+
+        return None
+
+    @staticmethod
+    def _is_same_subvolume_as(
+        directory: Path, subvolume_record: SubvolumeRecord
+    ) -> bool:
+        try:
+            directory_str = str(directory)
+
+            return (
+                btrfsutil.is_subvolume(directory_str)
+                and btrfsutil.subvolume_id(directory_str) == subvolume_record.num_id
+            )
+        except btrfsutil.BtrfsUtilError:
+            return False
+
+    def _try_mark_as_searched(self, directory: Path) -> bool:
+        searched_directories = self._searched_directories
+
+        with self._searched_directories_lock:
+            if directory in searched_directories:
+                return False
+
+            searched_directories.add(directory)
+
+            return True
@@ -0,0 +1,79 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from uuid import UUID
+
+from refind_btrfs.device import Subvolume
+
+
+class SubvolumeIndex:
+    def __init__(self, subvolumes: Iterable[Subvolume]) -> None:
+        self._subvolumes_by_path: dict[Path, Subvolume] = {}
+        self._subvolumes_by_parent_uuid: dict[UUID, list[Subvolume]] = {}
+
+        for subvolume in sorted(
+            subvolumes, key=lambda subvolume: subvolume.filesystem_path
+        ):
+            self._subvolumes_by_path[subvolume.filesystem_path] = subvolume
+            self._subvolumes_by_parent_uuid.setdefault(
+                subvolume.parent_uuid, []
+            ).append(subvolume)
+
+    def find_snapshots_in(
+        self,
+        directory: Path,
+        max_depth: int,
+        parent: Optional[Subvolume] = None,
+    ) -> Iterator[Subvolume]:
+        if parent is not None:
+            candidates = self._subvolumes_by_parent_uuid.get(parent.uuid, [])
+        else:
+            candidates = [
+                subvolume
+                for subvolume in self._subvolumes_by_path.values()
+                if subvolume.is_snapshot()
+            ]
+
+        found_paths: set[Path] = set()
+
+        # the candidates are sorted by their paths so a snapshot is always
+        # visited before the ones nested in it, same as in a directory walk
+        for candidate in candidates:
+            filesystem_path = candidate.filesystem_path
+
+            if not filesystem_path.is_relative_to(directory):
+                continue
+
+            depth = len(filesystem_path.relative_to(directory).parts)
+
+            if depth > max_depth:
+                continue
+
+            if any(ancestor in found_paths for ancestor in filesystem_path.parents):
+                continue
+
+            found_paths.add(filesystem_path)
+
+            yield candidate
@@ -0,0 +1,324 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from pathlib import Path
+from threading import Lock
+from typing import Any, Iterator, Optional
+
+from refind_btrfs.common import ConfigurableMixin, constants
+from refind_btrfs.common.abc.commands import DeviceCommand
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.abc.providers import BasePackageConfigProvider
+from refind_btrfs.common.enums import (
+    BlockDeviceType,
+    LsblkColumn,
+    LsblkJsonKey,
+    SysfsAttribute,
+    UdevProperty,
+)
+from refind_btrfs.common.exceptions import PartitionError
+from refind_btrfs.device import BlockDevice, Partition, PartitionTable, Subvolume
+from refind_btrfs.utility.helpers import has_items, is_none_or_whitespace, none_throws
+
+from .lsblk_command import LsblkCommand
+from .mountinfo_command import MountinfoCommand
+from .udev_database import UdevDatabase
+
+
+# the nodes read from sysfs have the same shape as the ones in lsblk's output,
+# so they are mapped to block devices and partition tables in the same way
+class SysfsCommand(DeviceCommand, ConfigurableMixin):
+    def __init__(
+        self,
+        logger_factory: BaseLoggerFactory,
+        package_config_provider: BasePackageConfigProvider,
+        root_directory: Path = constants.ROOT_DIR,
+    ) -> None:
+        ConfigurableMixin.__init__(self, package_config_provider)
+
+        self._logger = logger_factory.logger(__name__)
+        self._sys_block_directory = root_directory / constants.SYS_BLOCK_DIR
+        self._mountinfo_file_path = root_directory / constants.MOUNTINFO_FILE
+        self._udev_database = UdevDatabase(root_directory / constants.UDEV_DATA_DIR)
+        self._sysfs_nodes_index: Optional[dict[str, Any]] = None
+        self._snapshot_lock = Lock()
+
+    def is_available(self) -> bool:
+        return self._sys_block_directory.is_dir() and self._udev_database.exists()
+
+    def get_block_devices(self) -> Iterator[BlockDevice]:
+        logger = self._logger
+
+        logger.info("Initializing the block devices using sysfs.")
+
+        sysfs_nodes = self._take_topology_snapshot()
+
+        yield from LsblkCommand.map_to_block_devices(sysfs_nodes)
+
+    def get_mounted_partitions(self) -> Iterator[Partition]:
+        raise NotImplementedError(
+            f"Class '{SysfsCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.get_mounted_partitions.__name__}' method!"
+        )
+
+    # pylint: disable=unused-argument
+    def save_partition_table(self, partition_table: PartitionTable) -> None:
+        raise NotImplementedError(
+            f"Class '{SysfsCommand.__name__}' does not implement the "
+            f"'{DeviceCommand.save_partition_table.__name__}' method!"
+        )
+
+    def _block_device_partition_table(
+        self, block_device: BlockDevice
+    ) -> PartitionTable:
+        logger = self._logger
+        device_name = block_device.name
+
+        logger.info(
+            f"Initializing the physical partition table for device '{device_name}'."
+        )
+
+        with self._snapshot_lock:
+            if self._sysfs_nodes_index is None:
+                self._take_topology_snapshot()
+
+            sysfs_nodes_index = none_throws(self._sysfs_nodes_index)
+
+        esp_uuid = self.package_config.esp_uuid
+
+        return LsblkCommand.map_to_partition_table(
+            sysfs_nodes_index, block_device, esp_uuid
+        )
+
+    def _subvolume_partition_table(self, subvolume: Subvolume) -> PartitionTable:
+        raise NotImplementedError(
+            f"Class '{SysfsCommand.__name__}' does not implement the "
+            f"'{DeviceCommand._subvolume_partition_table.__name__}' method!"
+        )
+
+    def _take_topology_snapshot(self) -> list[Any]:
+        logger = self._logger
+        sys_block_directory = self._sys_block_directory
+
+        try:
+            logger.debug(f"Reading the '{sys_block_directory}' directory.")
+
+            mount_points = self._read_mount_points()
+            sysfs_nodes: dict[str, dict[str, Any]] = {}
+            sysfs_directories: dict[str, Path] = {}
+
+            for disk_directory in sorted(sys_block_directory.iterdir()):
+                disk_node = self._read_sysfs_node(disk_directory, mount_points)
+
+                if disk_node is None:
+                    continue
+
+                disk_kernel_name = disk_directory.name
+
+                sysfs_nodes[disk_kernel_name] = disk_node
+                sysfs_directories[disk_kernel_name] = disk_directory
+
+                for partition_directory in sorted(disk_directory.iterdir()):
+                    partition_file = (
+                        partition_directory / SysfsAttribute.PARTITION.value
+                    )
+
+                    if not partition_file.exists():
+                        continue
+
+                    partition_node = self._read_sysfs_node(
+                        partition_directory, mount_points
+                    )
+
+                    if partition_node is None:
+                        continue
+
+                    partition_kernel_name = partition_directory.name
+
+                    sysfs_nodes[partition_kernel_name] = partition_node
+                    sysfs_directories[partition_kernel_name] = partition_directory
+                    disk_node.setdefault(LsblkJsonKey.CHILDREN.value, []).append(
+                        partition_node
+                    )
+
+            # same as with lsblk (without the --merge option), a holder shared
+            # by several devices (e.g., a RAID array or an LVM volume spanning
+            # multiple physical volumes) is listed under every one of them
+            for kernel_name, sysfs_directory in sysfs_directories.items():
+                holders_directory = sysfs_directory / SysfsAttribute.HOLDERS.value
+
+                for holder in SysfsCommand._list_directory(holders_directory):
+                    if holder.name in sysfs_nodes:
+                        sysfs_nodes[kernel_name].setdefault(
+                            LsblkJsonKey.CHILDREN.value, []
+                        ).append(sysfs_nodes[holder.name])
+
+            top_level_sysfs_nodes = [
+                sysfs_nodes[kernel_name]
+                for kernel_name, sysfs_directory in sysfs_directories.items()
+                if not (sysfs_directory / SysfsAttribute.PARTITION.value).exists()
+                and not has_items(
+                    SysfsCommand._list_directory(
+                        sysfs_directory / SysfsAttribute.SLAVES.value
+                    )
+                )
+            ]
+        except OSError as e:
+            logger.exception("Reading the sysfs attributes failed!")
+            raise PartitionError("Could not initialize the block devices!") from e
+
+        self._sysfs_nodes_index = LsblkCommand.index_lsblk_blockdevices(
+            top_level_sysfs_nodes
+        )
+
+        return top_level_sysfs_nodes
+
+    def _read_mount_points(self) -> dict[str, str]:
+        mountinfo_file_path = self._mountinfo_file_path
+        mount_points: dict[str, str] = {}
+
+        if mountinfo_file_path.exists():
+            mountinfo_entries = MountinfoCommand.map_to_mountinfo_entries(
+                mountinfo_file_path.read_text()
+            )
+
+            for mountinfo_entry in mountinfo_entries:
+                mount_point = mountinfo_entry.mount_point
+
+                mount_points.setdefault(mountinfo_entry.device_name, mount_point)
+                mount_points.setdefault(mountinfo_entry.major_minor, mount_point)
+
+        return mount_points
+
+    def _read_sysfs_node(
+        self, sysfs_directory: Path, mount_points: dict[str, str]
+    ) -> Optional[dict[str, Any]]:
+        major_minor = SysfsCommand._read_attribute(
+            sysfs_directory, SysfsAttribute.MAJOR_MINOR
+        )
+        major_number, minor_number = BlockDevice.try_parse_major_minor(major_minor)
+
+        if major_number is None or minor_number is None:
+            return None
+
+        # same as lsblk, RAM disks and empty devices are not listed
+        if major_number == constants.RAM_DEVICE_MAJOR_NUMBER:
+            return None
+
+        size = SysfsCommand._read_attribute(sysfs_directory, SysfsAttribute.SIZE)
+
+        if size == "0":
+            return None
+
+        kernel_name = sysfs_directory.name
+        dm_name = SysfsCommand._read_attribute(sysfs_directory, SysfsAttribute.DM_NAME)
+        device_name = (
+            str(constants.DEV_MAPPER_DIR / dm_name)
+            if not is_none_or_whitespace(dm_name)
+            else str(constants.ROOT_DIR / constants.DEV_DIR / kernel_name)
+        )
+        udev_properties = self._udev_database.get_properties_for(
+            major_number, minor_number
+        )
+        sysfs_node: dict[str, Any] = {
+            LsblkColumn.DEVICE_NAME.value: device_name,
+            LsblkColumn.DEVICE_TYPE.value: SysfsCommand._get_device_type(
+                sysfs_directory
+            ),
+            LsblkColumn.MAJOR_MINOR.value: major_minor,
+            LsblkColumn.FS_MOUNT_POINT.value: mount_points.get(
+                device_name, mount_points.get(major_minor)
+            ),
+        }
+
+        for lsblk_column_key, udev_property_key in [
+            (LsblkColumn.PTABLE_UUID, UdevProperty.PTABLE_UUID),
+            (LsblkColumn.PTABLE_TYPE, UdevProperty.PTABLE_TYPE),
+            (LsblkColumn.PART_UUID, UdevProperty.PART_UUID),
+            (LsblkColumn.PART_TYPE, UdevProperty.PART_TYPE),
+            (LsblkColumn.PART_LABEL, UdevProperty.PART_LABEL),
+            (LsblkColumn.FS_UUID, UdevProperty.FS_UUID),
+            (LsblkColumn.FS_TYPE, UdevProperty.FS_TYPE),
+            (LsblkColumn.FS_LABEL, UdevProperty.FS_LABEL),
+        ]:
+            sysfs_node[lsblk_column_key.value] = udev_properties.get(
+                udev_property_key.value
+            )
+
+        return sysfs_node
+
+    @staticmethod
+    def _get_device_type(sysfs_directory: Path) -> str:
+        if (sysfs_directory / SysfsAttribute.PARTITION.value).exists():
+            return BlockDeviceType.PART.value
+
+        dm_name = SysfsCommand._read_attribute(sysfs_directory, SysfsAttribute.DM_NAME)
+
+        if not is_none_or_whitespace(dm_name):
+            dm_uuid = SysfsCommand._read_attribute(
+                sysfs_directory, SysfsAttribute.DM_UUID
+            )
+
+            if constants.DM_UUID_SEPARATOR in dm_uuid:
+                dm_uuid_prefix = dm_uuid.split(constants.DM_UUID_SEPARATOR, 1)[0].lower()
+
+                # kpartx mappings are reported as partitions by lsblk
+                if dm_uuid_prefix.startswith(BlockDeviceType.PART.value):
+                    return BlockDeviceType.PART.value
+
+                return dm_uuid_prefix
+
+            return BlockDeviceType.DM.value
+
+        md_level = SysfsCommand._read_attribute(sysfs_directory, SysfsAttribute.MD_LEVEL)
+
+        if not is_none_or_whitespace(md_level):
+            return md_level
+
+        if sysfs_directory.name.startswith(BlockDeviceType.LOOP.value):
+            return BlockDeviceType.LOOP.value
+
+        scsi_device_type = SysfsCommand._read_attribute(
+            sysfs_directory, SysfsAttribute.SCSI_DEVICE_TYPE
+        )
+
+        if scsi_device_type == constants.SCSI_ROM_DEVICE_TYPE:
+            return BlockDeviceType.ROM.value
+
+        return BlockDeviceType.DISK.value
+
+    @staticmethod
+    def _read_attribute(sysfs_directory: Path, sysfs_attribute: SysfsAttribute) -> str:
+        attribute_file_path = sysfs_directory / sysfs_attribute.value
+
+        if not attribute_file_path.is_file():
+            return constants.EMPTY_STR
+
+        return attribute_file_path.read_text().strip()
+
+    @staticmethod
+    def _list_directory(directory: Path) -> list[Path]:
+        if not directory.is_dir():
+            return []
+
+        return sorted(directory.iterdir())
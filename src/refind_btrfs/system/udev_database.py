@@ -0,0 +1,74 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+from pathlib import Path
+
+from refind_btrfs.common import constants
+from refind_btrfs.common.enums import UdevProperty
+from refind_btrfs.utility.helpers import unescape_hex_sequences_in
+
+
+class UdevDatabase:
+    def __init__(self, data_directory: Path) -> None:
+        self._data_directory = data_directory
+
+    def exists(self) -> bool:
+        data_directory = self._data_directory
+
+        return data_directory.exists() and data_directory.is_dir()
+
+    def get_properties_for(self, major_number: int, minor_number: int) -> dict[str, str]:
+        data_file_path = self._data_directory / (
+            f"{constants.UDEV_BLOCK_DEVICE_PREFIX}{major_number}:{minor_number}"
+        )
+        properties: dict[str, str] = {}
+
+        try:
+            with data_file_path.open("r") as data_file:
+                for data_line in data_file:
+                    if data_line.startswith(constants.UDEV_PROPERTY_PREFIX):
+                        split_property = (
+                            data_line.removeprefix(constants.UDEV_PROPERTY_PREFIX)
+                            .rstrip(constants.NEWLINE)
+                            .split(constants.PARAMETERIZED_OPTION_SEPARATOR, 1)
+                        )
+
+                        if len(split_property) == 2:
+                            properties[split_property[0]] = split_property[1]
+        except OSError:
+            return properties
+
+        encoded_label = properties.get(UdevProperty.FS_LABEL_ENC.value)
+
+        if encoded_label is not None:
+            properties[UdevProperty.FS_LABEL.value] = unescape_hex_sequences_in(
+                encoded_label
+            )
+
+        part_label_key = UdevProperty.PART_LABEL.value
+        part_label = properties.get(part_label_key)
+
+        if part_label is not None:
+            properties[part_label_key] = unescape_hex_sequences_in(part_label)
+
+        return properties
@@ -58,10 +58,12 @@ from refind_btrfs.common.enums import (
     BtrfsLogoVariant,
     BtrfsLogoVerticalAlignment,
     ConfigInitializationType,
+    DeviceTopologySource,
     IconConfigKey,
     PathRelation,
     SnapshotManipulationConfigKey,
     SnapshotSearchConfigKey,
+    SnapshotSearchLayout,
     TopLevelConfigKey,
 )
 from refind_btrfs.common.exceptions import PackageConfigError
@@ -85,8 +87,10 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
         constants.EMPTY_UUID,
         True,
         True,
-        [SnapshotSearch(Path("/.snapshots"), False, 2)],
-        SnapshotManipulation(5, False, Path("/root/.refind-btrfs"), set()),
+        4,
+        DeviceTopologySource.COMMANDS,
+        [SnapshotSearch(Path("/.snapshots"), False, 2, SnapshotSearchLayout.AUTO)],
+        SnapshotManipulation(5, False, Path("/root/.refind-btrfs"), set(), False),
         BootStanzaGeneration(
             "refind.conf",
             True,
@@ -186,6 +190,34 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
             bool,
             default_package_config,
         )
+        snapshot_search_concurrency_key = (
+            TopLevelConfigKey.SNAPSHOT_SEARCH_CONCURRENCY.value
+        )
+        snapshot_search_concurrency = cast(
+            int,
+            FilePackageConfigProvider._get_config_value(
+                container,
+                snapshot_search_concurrency_key,
+                int,
+                default_package_config,
+            ),
+        )
+
+        if snapshot_search_concurrency <= 0:
+            raise PackageConfigError(
+                f"The '{snapshot_search_concurrency_key}' option must be greater than zero!"
+            )
+
+        device_topology_source = FilePackageConfigProvider._get_config_value(
+            container,
+            TopLevelConfigKey.DEVICE_TOPOLOGY_SOURCE.value,
+            str,
+            default_package_config,
+            (
+                DeviceTopologySource,
+                lambda value: try_convert_str_to_enum(value, DeviceTopologySource),
+            ),
+        )
         snapshot_searches_key = TopLevelConfigKey.SNAPSHOT_SEARCH.value
         default_snapshot_searches = default_package_config.snapshot_searches
 
@@ -257,6 +289,8 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
             esp_uuid,
             exit_if_root_is_snapshot,
             exit_if_no_changes_are_detected,
+            snapshot_search_concurrency,
+            device_topology_source,
             snapshot_searches,
             snapshot_manipulation,
             boot_stanza_generation,
@@ -307,7 +341,18 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
                     f"The '{max_depth_key}' option must be greater than zero!"
                 )
 
-            yield SnapshotSearch(directory, is_nested, max_depth)
+            layout = FilePackageConfigProvider._get_config_value(
+                container,
+                SnapshotSearchConfigKey.LAYOUT.value,
+                str,
+                default_snapshot_search,
+                (
+                    SnapshotSearchLayout,
+                    lambda value: try_convert_str_to_enum(value, SnapshotSearchLayout),
+                ),
+            )
+
+            yield SnapshotSearch(directory, is_nested, max_depth, layout)
 
     @staticmethod
     def _map_to_snapshot_manipulation(
@@ -393,6 +438,13 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
 
                 uuids.append(uuid)
 
+        cleanup_in_background = FilePackageConfigProvider._get_config_value(
+            container,
+            SnapshotManipulationConfigKey.CLEANUP_IN_BACKGROUND.value,
+            bool,
+            default_snapshot_manipulation,
+        )
+
         return SnapshotManipulation(
             selection_count,
             modify_read_only_flag,
@@ -408,6 +460,7 @@ class FilePackageConfigProvider(BasePackageConfigProvider):
                 )
                 for uuid in uuids
             ),
+            cleanup_in_background,
         )
 
     @staticmethod
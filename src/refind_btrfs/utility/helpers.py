@@ -22,12 +22,23 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # endregion
 
 import errno
+import hashlib
 import os
 import re
 from enum import Enum
 from inspect import ismethod
 from pathlib import Path
-from typing import Any, Iterator, Optional, Sized, Type, TypeVar, cast
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    Optional,
+    Set,
+    Sized,
+    Type,
+    TypeVar,
+    cast,
+)
 from uuid import UUID
 
 from more_itertools import first
@@ -157,6 +168,146 @@ def find_all_directories_in(
             )
 
 
+def find_all_matched_subvolumes_in(
+    root_directory: Path,
+    max_depth: int,
+    matcher: Callable[[Path], Optional[TParam]],
+    try_mark_as_searched: Optional[Callable[[Path], bool]] = None,
+) -> Iterator[TParam]:
+    if max_depth < 0 or not root_directory.is_dir():
+        return
+
+    if try_mark_as_searched is None:
+        searched_directories: Set[Path] = set()
+
+        def try_mark_as_searched(directory: Path) -> bool:
+            if directory in searched_directories:
+                return False
+
+            searched_directories.add(directory)
+
+            return True
+
+    resolved_path = root_directory.resolve()
+    is_subvolume_candidate = (
+        resolved_path.stat().st_ino == constants.SUBVOLUME_ROOT_INODE
+    )
+
+    yield from _find_all_matched_subvolumes_in(
+        resolved_path,
+        is_subvolume_candidate,
+        max_depth,
+        0,
+        matcher,
+        try_mark_as_searched,
+    )
+
+
+def _find_all_matched_subvolumes_in(
+    directory: Path,
+    is_subvolume_candidate: bool,
+    max_depth: int,
+    current_depth: int,
+    matcher: Callable[[Path], Optional[TParam]],
+    try_mark_as_searched: Callable[[Path], bool],
+) -> Iterator[TParam]:
+    if not try_mark_as_searched(directory):
+        return
+
+    # the root directory of every Btrfs subvolume has the same inode number,
+    # which rules out all of the other directories without further ado
+    if is_subvolume_candidate:
+        matched = matcher(directory)
+
+        if matched is not None:
+            yield matched
+
+            return
+
+    if current_depth == max_depth:
+        return
+
+    with os.scandir(directory) as directory_entries:
+        subdirectories = [
+            (
+                Path(directory_entry.path).resolve()
+                if directory_entry.is_symlink()
+                else Path(directory_entry.path),
+                directory_entry.stat().st_ino == constants.SUBVOLUME_ROOT_INODE,
+            )
+            for directory_entry in directory_entries
+            if directory_entry.is_dir()
+        ]
+
+    for subdirectory, is_subdirectory_candidate in subdirectories:
+        yield from _find_all_matched_subvolumes_in(
+            subdirectory,
+            is_subdirectory_candidate,
+            max_depth,
+            current_depth + 1,
+            matcher,
+            try_mark_as_searched,
+        )
+
+
+def get_directory_mtimes_in(
+    root_directory: Path, max_depth: int, excluded_directories: Set[Path]
+) -> dict[Path, int]:
+    directory_mtimes: dict[Path, int] = {}
+
+    if max_depth < 0 or not root_directory.is_dir():
+        return directory_mtimes
+
+    directories = [(root_directory.resolve(), 0)]
+
+    while has_items(directories):
+        directory, current_depth = directories.pop()
+
+        if directory in directory_mtimes:
+            continue
+
+        try:
+            directory_mtimes[directory] = directory.stat().st_mtime_ns
+
+            if current_depth < max_depth:
+                directories.extend(
+                    (subdirectory, current_depth + 1)
+                    for subdirectory in get_subdirectories_in(directory)
+                    if subdirectory not in excluded_directories
+                )
+        except OSError:
+            continue
+
+    return directory_mtimes
+
+
+def get_subdirectories_in(directory: Path) -> list[Path]:
+    with os.scandir(directory) as directory_entries:
+        return [
+            Path(directory_entry.path).resolve()
+            if directory_entry.is_symlink()
+            else Path(directory_entry.path)
+            for directory_entry in directory_entries
+            if directory_entry.is_dir()
+        ]
+
+
+def try_get_mtime_of(directory: Path) -> Optional[int]:
+    try:
+        return directory.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def try_get_content_hash_of(file_path: Path) -> Optional[str]:
+    try:
+        file_content = file_path.read_bytes()
+    except OSError:
+        return None
+
+    return hashlib.blake2b(file_content, digest_size=16).hexdigest()
+
+
 def discern_path_relation_of(path_pair: tuple[Path, Path]) -> PathRelation:
     first_resolved = path_pair[0].resolve()
     second_resolved = path_pair[1].resolve()
@@ -247,6 +398,54 @@ def replace_root_part_in(
     return normalize_dir_separators_in(substituted_full_path, separator_replacement)
 
 
+def unescape_octal_sequences_in(value: str) -> str:
+    pattern = re.compile(constants.OCTAL_ESCAPE_PATTERN)
+
+    return pattern.sub(lambda match: chr(int(match.group(1), 8)), value)
+
+
+def unescape_hex_sequences_in(value: str) -> str:
+    pattern = re.compile(constants.HEX_ESCAPE_PATTERN)
+
+    return pattern.sub(lambda match: chr(int(match.group(1), 16)), value)
+
+
+def get_device_topology_fingerprint(
+    *additional_values: str, root_directory: Path = constants.ROOT_DIR
+) -> Optional[str]:
+    digest = hashlib.sha256()
+    udev_data_directory = root_directory / constants.UDEV_DATA_DIR
+
+    try:
+        for file_path in [
+            root_directory / constants.PARTITIONS_FILE,
+            root_directory / constants.MOUNTINFO_FILE,
+        ]:
+            digest.update(file_path.read_bytes())
+
+        with os.scandir(udev_data_directory) as udev_entries:
+            udev_entry_stats = [
+                (udev_entry.name, udev_entry.stat())
+                for udev_entry in udev_entries
+                if udev_entry.name.startswith(constants.UDEV_BLOCK_DEVICE_PREFIX)
+            ]
+
+        udev_entry_states = sorted(
+            f"{udev_entry_name}:{udev_entry_stat.st_mtime_ns}:{udev_entry_stat.st_size}"
+            for udev_entry_name, udev_entry_stat in udev_entry_stats
+        )
+
+        for udev_entry_state in udev_entry_states:
+            digest.update(udev_entry_state.encode())
+    except OSError:
+        return None
+
+    for additional_value in additional_values:
+        digest.update(additional_value.encode())
+
+    return digest.hexdigest()
+
+
 def replace_item_in(
     items_list: list[TParam], current: TParam, replacement: Optional[TParam] = None
 ) -> None:
@@ -21,15 +21,15 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 # endregion
 
-from typing import Iterator
+from typing import Iterator, Optional
 
 from injector import Binder, Module, SingletonScope, multiprovider
 from transitions.core import State
 from watchdog.events import FileSystemEventHandler
 
 from refind_btrfs.boot.file_refind_config_provider import FileRefindConfigProvider
-from refind_btrfs.common import CheckableObserver
-from refind_btrfs.common.abc import BaseRunner
+from refind_btrfs.common import CheckableObserver, ProcessBundle
+from refind_btrfs.common.abc import BaseProcessExecutor, BaseRunner
 from refind_btrfs.common.abc.factories import (
     BaseDeviceCommandFactory,
     BaseIconCommandFactory,
@@ -41,8 +41,8 @@ from refind_btrfs.common.abc.providers import (
     BasePersistenceProvider,
     BaseRefindConfigProvider,
 )
-from refind_btrfs.common.enums import StateNames
-from refind_btrfs.console import CLIRunner
+from refind_btrfs.common.enums import PersistenceBackend, StateNames
+from refind_btrfs.console import CLIRunner, GarbageCollectionRunner
 from refind_btrfs.service import SnapshotEventHandler, SnapshotObserver, WatchdogRunner
 from refind_btrfs.state_management import Model, States
 from refind_btrfs.system import (
@@ -50,15 +50,34 @@ from refind_btrfs.system import (
     PillowIconCommandFactory,
     SystemDeviceCommandFactory,
 )
-from refind_btrfs.utility.helpers import has_method
+from refind_btrfs.utility.helpers import default_if_none, has_method
 
 from .file_package_config_provider import FilePackageConfigProvider
 from .logger_factories import StreamLoggerFactory, SystemdLoggerFactory
 from .shelve_persistence_provider import ShelvePersistenceProvider
+from .sqlite_persistence_provider import SqlitePersistenceProvider
+from .subprocess_executor import SubprocessExecutor
 
 
 class CommonModule(Module):
+    def __init__(
+        self,
+        process_bundle: Optional[ProcessBundle] = None,
+        persistence_backend: PersistenceBackend = PersistenceBackend.SHELVE,
+        is_dry_run: bool = False,
+    ) -> None:
+        self._process_bundle = default_if_none(process_bundle, ProcessBundle.none())
+        self._persistence_backend = persistence_backend
+        self._is_dry_run = is_dry_run
+
     def configure(self, binder: Binder) -> None:
+        persistence_provider_type = (
+            SqlitePersistenceProvider
+            if self._persistence_backend == PersistenceBackend.SQLITE
+            else ShelvePersistenceProvider
+        )
+
+        binder.bind(ProcessBundle, to=self._process_bundle)
         binder.bind(BaseDeviceCommandFactory, to=SystemDeviceCommandFactory)
         binder.bind(BaseSubvolumeCommandFactory, to=BtrfsUtilSubvolumeCommandFactory)
         binder.bind(BaseIconCommandFactory, to=PillowIconCommandFactory)
@@ -73,8 +92,9 @@ class CommonModule(Module):
             BaseRefindConfigProvider, to=FileRefindConfigProvider, scope=SingletonScope
         )
         binder.bind(
-            BasePersistenceProvider, to=ShelvePersistenceProvider, scope=SingletonScope
+            BasePersistenceProvider, to=persistence_provider_type, scope=SingletonScope
         )
+        binder.bind(BaseProcessExecutor, to=SubprocessExecutor, scope=SingletonScope)
 
     @multiprovider
     def provide_states(self, model: Model) -> States:
@@ -85,7 +105,9 @@ class CommonModule(Module):
             value: str = state_name.value
             arguments = [value]
 
-            if has_method(model, value):
+            if self._is_dry_run and state_name == StateNames.PROCESS_CHANGES:
+                arguments.append(model.skip_changes.__name__)
+            elif has_method(model, value):
                 arguments *= 2
 
             yield State(*arguments)
@@ -107,3 +129,11 @@ class CLIModule(CommonModule):
 
         binder.bind(BaseRunner, to=CLIRunner)
         binder.bind(BaseLoggerFactory, to=StreamLoggerFactory)
+
+
+class GarbageCollectionModule(CommonModule):
+    def configure(self, binder: Binder) -> None:
+        super().configure(binder)
+
+        binder.bind(BaseRunner, to=GarbageCollectionRunner)
+        binder.bind(BaseLoggerFactory, to=StreamLoggerFactory)
@@ -0,0 +1,89 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+import pickle
+from typing import Any, Callable, NamedTuple, Optional, cast
+
+from semantic_version import Version
+
+from refind_btrfs.common.enums import LocalDbKey
+from refind_btrfs.state_management.model import ProcessingResult
+
+
+class ItemMigration(NamedTuple):
+    target_version: Version
+    migrate: Callable[[Any], Any]
+
+
+class ItemSchema(NamedTuple):
+    version: Version
+    migrations: dict[Version, ItemMigration]
+
+    def is_current(self, version: Version) -> bool:
+        return version == self.version
+
+    def is_loadable(self, version: Version) -> bool:
+        return self.is_current(version) or version in self.migrations
+
+    def load(self, version: Version, encoded_item: bytes) -> Optional[Any]:
+        if not self.is_loadable(version):
+            return None
+
+        # an item may be corrupted or an outdated one may refer to classes
+        # whose shape has since changed, either way it's treated as missing
+        try:
+            item = pickle.loads(encoded_item)
+
+            while not self.is_current(version):
+                migration = self.migrations.get(version)
+
+                if migration is None:
+                    return None
+
+                item = migration.migrate(item)
+                version = migration.target_version
+        except (pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+        return item
+
+
+# both of the persistence providers store the same items, which is why the
+# versions and the migrations are shared between them
+ITEM_SCHEMAS = {
+    LocalDbKey.PACKAGE_CONFIG.value: ItemSchema(Version("1.9.0"), {}),
+    LocalDbKey.REFIND_CONFIGS.value: ItemSchema(Version("1.2.0"), {}),
+    LocalDbKey.PROCESSING_RESULT.value: ItemSchema(
+        Version("2.0.0"),
+        {
+            # the last released version, which persisted the whole object graph
+            Version("1.1.0"): ItemMigration(
+                Version("2.0.0"),
+                lambda item: cast(ProcessingResult, item).to_record(),
+            ),
+        },
+    ),
+    LocalDbKey.BLOCK_DEVICE_TOPOLOGY.value: ItemSchema(Version("1.5.0"), {}),
+    LocalDbKey.SNAPSHOT_SEARCH_STATES.value: ItemSchema(Version("2.0.0"), {}),
+    LocalDbKey.PENDING_REMOVALS.value: ItemSchema(Version("2.0.0"), {}),
+}
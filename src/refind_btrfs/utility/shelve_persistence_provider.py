@@ -21,79 +21,114 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 # endregion
 
+import dbm
+import pickle
 import shelve
+from contextlib import contextmanager
 from pathlib import Path
 from shelve import Shelf
-from typing import Any, Optional, TypeVar, cast
+from threading import RLock
+from typing import Any, Iterator, Optional, TypeVar, cast
 
 from semantic_version import Version
 
 from refind_btrfs.boot import RefindConfig
-from refind_btrfs.common import PackageConfig, constants
+from refind_btrfs.common import (
+    GarbageCollectionResult,
+    PackageConfig,
+    SnapshotSearchKey,
+    SnapshotSearchState,
+    constants,
+)
 from refind_btrfs.common.abc.providers import BasePersistenceProvider
 from refind_btrfs.common.enums import LocalDbKey
-from refind_btrfs.state_management.model import ProcessingResult
-from refind_btrfs.utility.helpers import checked_cast
+from refind_btrfs.common.exceptions import PersistenceError
+from refind_btrfs.device import Subvolume, SubvolumeRecord
+from refind_btrfs.state_management.model import (
+    BlockDeviceTopology,
+    ProcessingResult,
+    ProcessingResultRecord,
+)
+from refind_btrfs.utility.helpers import checked_cast, has_items, none_throws
+from refind_btrfs.utility.item_schemas import ITEM_SCHEMAS
 
 TItem = TypeVar("TItem")
 
 
 class ShelvePersistenceProvider(BasePersistenceProvider):
     def __init__(self) -> None:
-        version_suffix = constants.DB_ITEM_VERSION_SUFFIX
-
         self._db_filename = str(constants.DB_FILE)
-        self._current_versions = {
-            f"{LocalDbKey.PACKAGE_CONFIG.value}_{version_suffix}": Version("1.3.0"),
-            f"{LocalDbKey.REFIND_CONFIGS.value}_{version_suffix}": Version("1.0.0"),
-            f"{LocalDbKey.PROCESSING_RESULT.value}_{version_suffix}": Version("1.1.0"),
-        }
+        self._session_lock = RLock()
+        self._session_depth = 0
+        self._session_items: dict[str, Optional[bytes]] = {}
+        self._dirty_keys: set[str] = set()
+
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        with self._session_lock:
+            self._session_depth += 1
+
+        try:
+            yield
+        finally:
+            with self._session_lock:
+                self._session_depth -= 1
+
+                if self._session_depth == 0:
+                    self._flush_session()
 
     def get_package_config(self) -> Optional[PackageConfig]:
         db_key = LocalDbKey.PACKAGE_CONFIG.value
 
-        with shelve.open(self._db_filename) as local_db:
-            item = self._get_item(db_key, local_db)
+        item = self._get_item(db_key)
 
-            if item is not None:
-                package_config = checked_cast(PackageConfig, item)
+        if item is not None:
+            package_config = checked_cast(PackageConfig, item)
+            file_stat = package_config.file_stat
 
-                if not package_config.is_modified(constants.PACKAGE_CONFIG_FILE):
-                    return package_config
+            if not package_config.is_modified(constants.PACKAGE_CONFIG_FILE):
+                if package_config.file_stat is not file_stat:
+                    self._save_item(package_config, db_key)
+
+                return package_config
 
         return None
 
     def save_package_config(self, value: PackageConfig) -> None:
         db_key = LocalDbKey.PACKAGE_CONFIG.value
 
-        with shelve.open(self._db_filename) as local_db:
-            self._save_item(value, db_key, local_db)
+        self._save_item(value, db_key)
 
     def get_refind_config(self, file_path: Path) -> Optional[RefindConfig]:
         db_key = LocalDbKey.REFIND_CONFIGS.value
 
-        with shelve.open(self._db_filename) as local_db:
-            item = self._get_item(db_key, local_db)
+        with self._session_lock:
+            item = self._get_item(db_key)
 
             if item is not None:
                 all_refind_configs = checked_cast(dict[Path, RefindConfig], item)
                 refind_config = all_refind_configs.get(file_path)
 
                 if refind_config is not None:
+                    file_stat = refind_config.file_stat
+
                     if refind_config.is_modified(file_path):
                         del all_refind_configs[file_path]
 
-                        self._save_item(all_refind_configs, db_key, local_db)
+                        self._save_item(all_refind_configs, db_key)
                     else:
+                        if refind_config.file_stat is not file_stat:
+                            self._save_item(all_refind_configs, db_key)
+
                         return refind_config
 
-        return None
+            return None
 
     def save_refind_config(self, value: RefindConfig) -> None:
         db_key = LocalDbKey.REFIND_CONFIGS.value
 
-        with shelve.open(self._db_filename) as local_db:
-            item = self._get_item(db_key, local_db)
+        with self._session_lock:
+            item = self._get_item(db_key)
             all_refind_configs: Optional[dict[Path, RefindConfig]] = None
 
             if item is not None:
@@ -104,40 +139,316 @@ class ShelvePersistenceProvider(BasePersistenceProvider):
             file_path = value.file_path
             all_refind_configs[file_path] = value
 
-            self._save_item(all_refind_configs, db_key, local_db)
+            self._save_item(all_refind_configs, db_key)
 
     def get_previous_run_result(self) -> ProcessingResult:
         db_key = LocalDbKey.PROCESSING_RESULT.value
 
-        with shelve.open(self._db_filename) as local_db:
-            item = self._get_item(db_key, local_db)
+        item = self._get_item(db_key)
 
-            if item is not None:
-                return cast(ProcessingResult, item)
+        if item is not None:
+            return ProcessingResult.from_record(cast(ProcessingResultRecord, item))
 
         return ProcessingResult.none()
 
     def save_current_run_result(self, value: ProcessingResult) -> None:
         db_key = LocalDbKey.PROCESSING_RESULT.value
 
-        with shelve.open(self._db_filename) as local_db:
-            self._save_item(value, db_key, local_db)
+        self._save_item(value.to_record(), db_key)
 
-    def _get_item(self, value_key: str, local_db: Shelf) -> Optional[Any]:
-        version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
-        default_version = Version("0.0.0")
-        current_version = self._current_versions[version_key]
-        actual_version = (
-            checked_cast(Version, local_db[version_key])
-            if version_key in local_db
-            else default_version
+    def get_block_device_topology(self) -> Optional[BlockDeviceTopology]:
+        db_key = LocalDbKey.BLOCK_DEVICE_TOPOLOGY.value
+
+        item = self._get_item(db_key)
+
+        if item is not None:
+            return cast(BlockDeviceTopology, item)
+
+        return None
+
+    def save_block_device_topology(self, value: BlockDeviceTopology) -> None:
+        db_key = LocalDbKey.BLOCK_DEVICE_TOPOLOGY.value
+
+        self._save_item(value, db_key)
+
+    def get_snapshot_search_states(
+        self,
+    ) -> dict[SnapshotSearchKey, SnapshotSearchState]:
+        db_key = LocalDbKey.SNAPSHOT_SEARCH_STATES.value
+
+        item = self._get_item(db_key)
+
+        if item is not None:
+            return cast(dict[SnapshotSearchKey, SnapshotSearchState], item)
+
+        return {}
+
+    def save_snapshot_search_states(
+        self, value: dict[SnapshotSearchKey, SnapshotSearchState]
+    ) -> None:
+        db_key = LocalDbKey.SNAPSHOT_SEARCH_STATES.value
+
+        self._save_item(value, db_key)
+
+    def get_pending_removals(self) -> list[Subvolume]:
+        db_key = LocalDbKey.PENDING_REMOVALS.value
+
+        item = self._get_item(db_key)
+
+        if item is not None:
+            return [
+                Subvolume.from_record(snapshot_record)
+                for snapshot_record in cast(list[SubvolumeRecord], item)
+            ]
+
+        return []
+
+    def save_pending_removals(self, value: list[Subvolume]) -> None:
+        db_key = LocalDbKey.PENDING_REMOVALS.value
+
+        self._save_item([snapshot.to_record() for snapshot in value], db_key)
+
+    def collect_garbage(
+        self, is_compaction_forced: bool = False
+    ) -> GarbageCollectionResult:
+        with self._session_lock:
+            if self._session_depth > 0:
+                raise PersistenceError(
+                    "The garbage cannot be collected while a session is open!"
+                )
+
+            size_before = self._get_db_size()
+            removed_entry_count = 0
+            retained_entries: dict[bytes, bytes] = {}
+
+            try:
+                with shelve.open(self._db_filename) as local_db:
+                    all_db_keys = set(local_db.keys())
+                    stale_db_keys: list[str] = []
+
+                    for db_key in LocalDbKey:
+                        value_key = db_key.value
+                        version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
+
+                        all_db_keys.discard(version_key)
+
+                        if value_key not in all_db_keys:
+                            continue
+
+                        all_db_keys.discard(value_key)
+
+                        # the versions are compared without loading the items
+                        if not ShelvePersistenceProvider._has_loadable_version(
+                            value_key, local_db
+                        ):
+                            removed_entry_count += 1
+                            stale_db_keys.extend([value_key, version_key])
+
+                            continue
+
+                        if db_key == LocalDbKey.REFIND_CONFIGS:
+                            # the configs are loaded the same way as during a
+                            # run, so the unreadable ones are pruned as well
+                            item = ITEM_SCHEMAS[value_key].load(
+                                ShelvePersistenceProvider._read_version(
+                                    value_key, local_db
+                                ),
+                                none_throws(
+                                    ShelvePersistenceProvider._read_encoded_item(
+                                        value_key, local_db
+                                    )
+                                ),
+                            )
+
+                            if item is None:
+                                removed_entry_count += 1
+                                stale_db_keys.extend([value_key, version_key])
+
+                                continue
+
+                            all_refind_configs = checked_cast(
+                                dict[Path, RefindConfig], item
+                            )
+                            existing_refind_configs = {
+                                file_path: refind_config
+                                for file_path, refind_config in all_refind_configs.items()
+                                if file_path.exists()
+                            }
+                            removed_refind_config_count = len(all_refind_configs) - len(
+                                existing_refind_configs
+                            )
+
+                            if removed_refind_config_count > 0:
+                                removed_entry_count += removed_refind_config_count
+                                ShelvePersistenceProvider._write_encoded_item(
+                                    pickle.dumps(existing_refind_configs),
+                                    value_key,
+                                    local_db,
+                                )
+
+                    removed_entry_count += len(all_db_keys)
+                    stale_db_keys.extend(all_db_keys)
+
+                    for stale_db_key in stale_db_keys:
+                        del local_db[stale_db_key]
+
+                    key_encoding = local_db.keyencoding
+                    retained_entries = {
+                        encoded_db_key: local_db.dict[encoded_db_key]
+                        for encoded_db_key in (
+                            db_key.encode(key_encoding) for db_key in local_db.keys()
+                        )
+                    }
+
+                retained_size = sum(
+                    len(encoded_db_key) + len(encoded_item)
+                    for encoded_db_key, encoded_item in retained_entries.items()
+                )
+                free_space_size = size_before - retained_size
+
+                # dbm files never shrink, so they have to be created anew, which
+                # is done only if it can actually reclaim something worthwhile
+                # (the retained size is merely an estimate, as some of the dbm
+                # implementations pad every entry)
+                is_compacted = (
+                    is_compaction_forced
+                    or removed_entry_count > 0
+                    or (
+                        free_space_size >= constants.MIN_DB_FREE_SPACE_SIZE
+                        and free_space_size / size_before
+                        >= constants.MAX_DB_FREE_SPACE_RATIO
+                    )
+                )
+
+                if is_compacted:
+                    # the already pickled items are copied over as they are
+                    with shelve.open(self._db_filename, flag="n") as local_db:
+                        for encoded_db_key, encoded_item in retained_entries.items():
+                            local_db.dict[encoded_db_key] = encoded_item
+            except (OSError, *dbm.error) as e:
+                raise PersistenceError(
+                    f"Could not collect the garbage in the '{self._db_filename}' database!"
+                ) from e
+
+            return GarbageCollectionResult(
+                removed_entry_count, is_compacted, size_before, self._get_db_size()
+            )
+
+    def _get_db_size(self) -> int:
+        db_path = Path(self._db_filename)
+        db_file_paths = [
+            db_path.with_name(f"{db_path.name}{db_file_suffix}")
+            for db_file_suffix in constants.DBM_FILE_SUFFIXES
+        ]
+
+        return sum(
+            db_file_path.stat().st_size
+            for db_file_path in db_file_paths
+            if db_file_path.exists()
         )
 
-        return local_db.get(value_key) if actual_version >= current_version else None
+    # within a session, the items are kept pickled so that every caller gets
+    # its own copy and the mutations made afterwards are never persisted
+    def _get_item(self, value_key: str) -> Optional[Any]:
+        with self._session_lock:
+            is_in_session = self._session_depth > 0
+            session_items = self._session_items
+
+            if is_in_session and value_key in session_items:
+                encoded_item = session_items[value_key]
+
+                return pickle.loads(encoded_item) if encoded_item is not None else None
+
+            with shelve.open(self._db_filename) as local_db:
+                version = ShelvePersistenceProvider._read_version(value_key, local_db)
+                encoded_item = ShelvePersistenceProvider._read_encoded_item(
+                    value_key, local_db
+                )
+
+            item: Optional[Any] = None
+
+            if encoded_item is not None:
+                item = self._load_item(value_key, version, encoded_item)
+
+            # a migrated item is already cached by being saved anew
+            if is_in_session:
+                session_items.setdefault(
+                    value_key, encoded_item if item is not None else None
+                )
+
+            return item
+
+    def _save_item(self, item: TItem, value_key: str) -> None:
+        encoded_item = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._session_lock:
+            if self._session_depth > 0:
+                self._session_items[value_key] = encoded_item
+                self._dirty_keys.add(value_key)
+            else:
+                with shelve.open(self._db_filename) as local_db:
+                    ShelvePersistenceProvider._write_encoded_item(
+                        encoded_item, value_key, local_db
+                    )
+
+    def _flush_session(self) -> None:
+        session_items = self._session_items
+        dirty_keys = self._dirty_keys
+
+        try:
+            if has_items(dirty_keys):
+                with shelve.open(self._db_filename) as local_db:
+                    for value_key in sorted(dirty_keys):
+                        ShelvePersistenceProvider._write_encoded_item(
+                            none_throws(session_items[value_key]), value_key, local_db
+                        )
+        finally:
+            session_items.clear()
+            dirty_keys.clear()
+
+    def _load_item(
+        self, value_key: str, version: Version, encoded_item: bytes
+    ) -> Optional[Any]:
+        item_schema = ITEM_SCHEMAS[value_key]
+        item = item_schema.load(version, encoded_item)
+
+        # a migrated item is written back, so it's migrated only once
+        if item is not None and not item_schema.is_current(version):
+            self._save_item(item, value_key)
+
+        return item
+
+    @staticmethod
+    def _read_version(value_key: str, local_db: Shelf) -> Version:
+        version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
+
+        if version_key in local_db:
+            return checked_cast(Version, local_db[version_key])
+
+        return Version("0.0.0")
+
+    @staticmethod
+    def _read_encoded_item(value_key: str, local_db: Shelf) -> Optional[bytes]:
+        encoded_value_key = value_key.encode(local_db.keyencoding)
+
+        if encoded_value_key in local_db.dict:
+            return local_db.dict[encoded_value_key]
+
+        return None
+
+    @staticmethod
+    def _has_loadable_version(value_key: str, local_db: Shelf) -> bool:
+        item_schema = ITEM_SCHEMAS[value_key]
+        version = ShelvePersistenceProvider._read_version(value_key, local_db)
+
+        return item_schema.is_loadable(version)
 
-    def _save_item(self, item: TItem, value_key: str, local_db: Shelf) -> None:
+    @staticmethod
+    def _write_encoded_item(
+        encoded_item: bytes, value_key: str, local_db: Shelf
+    ) -> None:
         version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
-        current_version = self._current_versions[version_key]
+        current_version = ITEM_SCHEMAS[value_key].version
 
-        local_db[value_key] = item
+        local_db.dict[value_key.encode(local_db.keyencoding)] = encoded_item
         local_db[version_key] = current_version
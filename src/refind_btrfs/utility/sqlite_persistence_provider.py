@@ -0,0 +1,517 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+import dbm
+import pickle
+import shelve
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from shelve import Shelf
+from sqlite3 import Connection
+from threading import RLock
+from typing import Any, Iterator, Optional, cast
+
+from semantic_version import Version
+
+from refind_btrfs.boot import RefindConfig
+from refind_btrfs.common import (
+    GarbageCollectionResult,
+    PackageConfig,
+    SnapshotSearchKey,
+    SnapshotSearchState,
+    constants,
+)
+from refind_btrfs.common.abc.providers import BasePersistenceProvider
+from refind_btrfs.common.enums import LocalDbKey
+from refind_btrfs.common.exceptions import PersistenceError
+from refind_btrfs.device import Subvolume, SubvolumeRecord
+from refind_btrfs.state_management.model import (
+    BlockDeviceTopology,
+    ProcessingResult,
+    ProcessingResultRecord,
+)
+from refind_btrfs.utility.helpers import checked_cast, has_items
+from refind_btrfs.utility.item_schemas import ITEM_SCHEMAS
+
+CREATE_ITEMS_TABLE_STATEMENT = """
+    CREATE TABLE IF NOT EXISTS items (
+        item_key TEXT NOT NULL,
+        entry_key TEXT NOT NULL,
+        version TEXT NOT NULL,
+        value BLOB NOT NULL,
+        PRIMARY KEY (item_key, entry_key)
+    ) WITHOUT ROWID
+"""
+SELECT_ITEM_STATEMENT = """
+    SELECT version, value FROM items WHERE item_key = ? AND entry_key = ?
+"""
+UPSERT_ITEM_STATEMENT = """
+    INSERT INTO items (item_key, entry_key, version, value) VALUES (?, ?, ?, ?)
+    ON CONFLICT (item_key, entry_key) DO UPDATE SET
+        version = excluded.version, value = excluded.value
+"""
+SELECT_ALL_ITEM_KEYS_STATEMENT = """
+    SELECT item_key, entry_key, version FROM items
+"""
+DELETE_ITEM_STATEMENT = """
+    DELETE FROM items WHERE item_key = ? AND entry_key = ?
+"""
+SQLITE_DB_USER_VERSION = 1
+
+
+class SqlitePersistenceProvider(BasePersistenceProvider):
+    def __init__(self) -> None:
+        self._db_filename = str(constants.SQLITE_DB_FILE)
+        self._connection: Optional[Connection] = None
+        self._session_lock = RLock()
+        self._session_depth = 0
+        self._session_items: dict[tuple[str, str], Optional[bytes]] = {}
+        self._dirty_keys: set[tuple[str, str]] = set()
+
+    # the items are read without a transaction and the changed ones are written
+    # at the end in a single one, so the write lock is held as briefly as
+    # possible and a concurrent run is never blocked for the whole session
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        with self._session_lock:
+            self._session_depth += 1
+
+        try:
+            yield
+        finally:
+            with self._session_lock:
+                self._session_depth -= 1
+
+                if self._session_depth == 0:
+                    self._flush_session()
+
+    def get_package_config(self) -> Optional[PackageConfig]:
+        item_key = LocalDbKey.PACKAGE_CONFIG.value
+        item = self._get_item(item_key)
+
+        if item is not None:
+            package_config = checked_cast(PackageConfig, item)
+            file_stat = package_config.file_stat
+
+            if not package_config.is_modified(constants.PACKAGE_CONFIG_FILE):
+                if package_config.file_stat is not file_stat:
+                    self._save_item(package_config, item_key)
+
+                return package_config
+
+        return None
+
+    def save_package_config(self, value: PackageConfig) -> None:
+        item_key = LocalDbKey.PACKAGE_CONFIG.value
+
+        self._save_item(value, item_key)
+
+    def get_refind_config(self, file_path: Path) -> Optional[RefindConfig]:
+        item_key = LocalDbKey.REFIND_CONFIGS.value
+        entry_key = str(file_path)
+        item = self._get_item(item_key, entry_key)
+
+        if item is not None:
+            refind_config = checked_cast(RefindConfig, item)
+            file_stat = refind_config.file_stat
+
+            if not refind_config.is_modified(file_path):
+                if refind_config.file_stat is not file_stat:
+                    self._save_item(refind_config, item_key, entry_key)
+
+                return refind_config
+
+            self._delete_item(item_key, entry_key)
+
+        return None
+
+    def save_refind_config(self, value: RefindConfig) -> None:
+        item_key = LocalDbKey.REFIND_CONFIGS.value
+        entry_key = str(value.file_path)
+
+        self._save_item(value, item_key, entry_key)
+
+    def get_previous_run_result(self) -> ProcessingResult:
+        item_key = LocalDbKey.PROCESSING_RESULT.value
+        item = self._get_item(item_key)
+
+        if item is not None:
+            return ProcessingResult.from_record(cast(ProcessingResultRecord, item))
+
+        return ProcessingResult.none()
+
+    def save_current_run_result(self, value: ProcessingResult) -> None:
+        item_key = LocalDbKey.PROCESSING_RESULT.value
+
+        self._save_item(value.to_record(), item_key)
+
+    def get_block_device_topology(self) -> Optional[BlockDeviceTopology]:
+        item_key = LocalDbKey.BLOCK_DEVICE_TOPOLOGY.value
+        item = self._get_item(item_key)
+
+        if item is not None:
+            return cast(BlockDeviceTopology, item)
+
+        return None
+
+    def save_block_device_topology(self, value: BlockDeviceTopology) -> None:
+        item_key = LocalDbKey.BLOCK_DEVICE_TOPOLOGY.value
+
+        self._save_item(value, item_key)
+
+    def get_snapshot_search_states(
+        self,
+    ) -> dict[SnapshotSearchKey, SnapshotSearchState]:
+        item_key = LocalDbKey.SNAPSHOT_SEARCH_STATES.value
+        item = self._get_item(item_key)
+
+        if item is not None:
+            return cast(dict[SnapshotSearchKey, SnapshotSearchState], item)
+
+        return {}
+
+    def save_snapshot_search_states(
+        self, value: dict[SnapshotSearchKey, SnapshotSearchState]
+    ) -> None:
+        item_key = LocalDbKey.SNAPSHOT_SEARCH_STATES.value
+
+        self._save_item(value, item_key)
+
+    def get_pending_removals(self) -> list[Subvolume]:
+        item_key = LocalDbKey.PENDING_REMOVALS.value
+        item = self._get_item(item_key)
+
+        if item is not None:
+            return [
+                Subvolume.from_record(snapshot_record)
+                for snapshot_record in cast(list[SubvolumeRecord], item)
+            ]
+
+        return []
+
+    def save_pending_removals(self, value: list[Subvolume]) -> None:
+        item_key = LocalDbKey.PENDING_REMOVALS.value
+
+        self._save_item([snapshot.to_record() for snapshot in value], item_key)
+
+    def collect_garbage(
+        self, is_compaction_forced: bool = False
+    ) -> GarbageCollectionResult:
+        with self._session_lock:
+            if self._session_depth > 0:
+                raise PersistenceError(
+                    "The garbage cannot be collected while a session is open!"
+                )
+
+            size_before = self._get_db_size()
+
+            try:
+                connection = self._get_connection()
+                all_item_keys = connection.execute(
+                    SELECT_ALL_ITEM_KEYS_STATEMENT
+                ).fetchall()
+                stale_item_keys = [
+                    (item_key, entry_key)
+                    for item_key, entry_key, version in all_item_keys
+                    if SqlitePersistenceProvider._is_stale(item_key, entry_key, version)
+                ]
+
+                if has_items(stale_item_keys):
+                    connection.execute("BEGIN IMMEDIATE")
+
+                    try:
+                        connection.executemany(DELETE_ITEM_STATEMENT, stale_item_keys)
+                        connection.execute("COMMIT")
+                    except sqlite3.Error:
+                        connection.execute("ROLLBACK")
+                        raise
+
+                # the whole database is rewritten by VACUUM, which is why it's
+                # done only if it can actually reclaim something worthwhile
+                is_compacted = (
+                    is_compaction_forced
+                    or has_items(stale_item_keys)
+                    or self._get_free_space_ratio(connection)
+                    >= constants.MAX_DB_FREE_SPACE_RATIO
+                )
+
+                if is_compacted:
+                    connection.execute("VACUUM")
+                    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                raise PersistenceError(
+                    f"Could not collect the garbage in the '{self._db_filename}' database!"
+                ) from e
+
+            return GarbageCollectionResult(
+                len(stale_item_keys), is_compacted, size_before, self._get_db_size()
+            )
+
+    def _get_connection(self) -> Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self._db_filename,
+                timeout=constants.SQLITE_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+
+            # the write-ahead log lets the readers proceed alongside a writer
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(CREATE_ITEMS_TABLE_STATEMENT)
+
+            (user_version,) = connection.execute("PRAGMA user_version").fetchone()
+
+            if user_version == 0:
+                SqlitePersistenceProvider._import_shelve_items(connection)
+
+            self._connection = connection
+
+        return self._connection
+
+    # the items persisted by the shelve based provider are carried over once,
+    # so switching to this provider loses none of them (the shelve database
+    # itself is left as it is)
+    @staticmethod
+    def _import_shelve_items(connection: Connection) -> None:
+        shelve_db_filename = str(constants.DB_FILE)
+        shelve_rows: list[tuple[str, str, str, bytes]] = []
+
+        if dbm.whichdb(shelve_db_filename):
+            try:
+                with shelve.open(shelve_db_filename, flag="r") as shelve_db:
+                    shelve_rows.extend(
+                        SqlitePersistenceProvider._get_shelve_rows_from(shelve_db)
+                    )
+            except (OSError, pickle.UnpicklingError, *dbm.error):
+                # a shelve database which can't be read has nothing to carry over
+                shelve_rows.clear()
+
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            (user_version,) = connection.execute("PRAGMA user_version").fetchone()
+
+            # a concurrent run might have carried them over in the meantime
+            if user_version == 0:
+                connection.executemany(UPSERT_ITEM_STATEMENT, shelve_rows)
+                connection.execute(f"PRAGMA user_version = {SQLITE_DB_USER_VERSION}")
+
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _get_shelve_rows_from(
+        shelve_db: Shelf,
+    ) -> Iterator[tuple[str, str, str, bytes]]:
+        for db_key in LocalDbKey:
+            item_key = db_key.value
+            version_key = f"{item_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
+            encoded_item_key = item_key.encode(shelve_db.keyencoding)
+
+            if version_key not in shelve_db or encoded_item_key not in shelve_db.dict:
+                continue
+
+            version = checked_cast(Version, shelve_db[version_key])
+
+            if not ITEM_SCHEMAS[item_key].is_loadable(version):
+                continue
+
+            # the shelve database keeps all of the rEFInd configs in one item
+            if db_key == LocalDbKey.REFIND_CONFIGS:
+                all_refind_configs = checked_cast(
+                    dict[Path, RefindConfig], shelve_db[item_key]
+                )
+
+                for file_path, refind_config in all_refind_configs.items():
+                    yield (
+                        item_key,
+                        str(file_path),
+                        str(version),
+                        pickle.dumps(refind_config, protocol=pickle.HIGHEST_PROTOCOL),
+                    )
+            else:
+                yield (
+                    item_key,
+                    constants.EMPTY_STR,
+                    str(version),
+                    shelve_db.dict[encoded_item_key],
+                )
+
+    def _get_db_size(self) -> int:
+        db_file_paths = [
+            Path(self._db_filename),
+            Path(f"{self._db_filename}-wal"),
+        ]
+
+        return sum(
+            db_file_path.stat().st_size
+            for db_file_path in db_file_paths
+            if db_file_path.exists()
+        )
+
+    @staticmethod
+    def _get_free_space_ratio(connection: Connection) -> float:
+        (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+        (freelist_count,) = connection.execute("PRAGMA freelist_count").fetchone()
+
+        if page_count == 0:
+            return 0.0
+
+        return freelist_count / page_count
+
+    @staticmethod
+    def _is_stale(item_key: str, entry_key: str, version: str) -> bool:
+        item_schema = ITEM_SCHEMAS.get(item_key)
+
+        if item_schema is None:
+            return True
+
+        try:
+            actual_version = Version(version)
+        except ValueError:
+            return True
+
+        if not item_schema.is_loadable(actual_version):
+            return True
+
+        if item_key == LocalDbKey.REFIND_CONFIGS.value:
+            return not Path(entry_key).exists()
+
+        return False
+
+    def _flush_session(self) -> None:
+        session_items = self._session_items
+        dirty_keys = self._dirty_keys
+
+        try:
+            if has_items(dirty_keys):
+                connection = self._get_connection()
+
+                connection.execute("BEGIN IMMEDIATE")
+
+                try:
+                    for item_key, entry_key in sorted(dirty_keys):
+                        encoded_item = session_items[(item_key, entry_key)]
+
+                        if encoded_item is not None:
+                            self._write_encoded_item(encoded_item, item_key, entry_key)
+                        else:
+                            connection.execute(
+                                DELETE_ITEM_STATEMENT, (item_key, entry_key)
+                            )
+
+                    connection.execute("COMMIT")
+                except sqlite3.Error:
+                    connection.execute("ROLLBACK")
+                    raise
+        finally:
+            session_items.clear()
+            dirty_keys.clear()
+
+    # within a session, the items are kept pickled so that every caller gets
+    # its own copy and the mutations made afterwards are never persisted
+    def _get_item(
+        self, item_key: str, entry_key: str = constants.EMPTY_STR
+    ) -> Optional[Any]:
+        with self._session_lock:
+            is_in_session = self._session_depth > 0
+            session_items = self._session_items
+            session_key = (item_key, entry_key)
+
+            if is_in_session and session_key in session_items:
+                encoded_item = session_items[session_key]
+
+                return pickle.loads(encoded_item) if encoded_item is not None else None
+
+            connection = self._get_connection()
+            row = connection.execute(
+                SELECT_ITEM_STATEMENT, (item_key, entry_key)
+            ).fetchone()
+            item: Optional[Any] = None
+
+            if row is not None:
+                item = self._load_item(item_key, entry_key, Version(row[0]), row[1])
+
+            # a migrated item is already cached by being saved anew
+            if is_in_session:
+                session_items.setdefault(
+                    session_key, row[1] if item is not None else None
+                )
+
+            return item
+
+    def _save_item(
+        self, item: Any, item_key: str, entry_key: str = constants.EMPTY_STR
+    ) -> None:
+        encoded_item = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._session_lock:
+            if self._session_depth > 0:
+                session_key = (item_key, entry_key)
+
+                self._session_items[session_key] = encoded_item
+                self._dirty_keys.add(session_key)
+            else:
+                self._write_encoded_item(encoded_item, item_key, entry_key)
+
+    def _delete_item(
+        self, item_key: str, entry_key: str = constants.EMPTY_STR
+    ) -> None:
+        with self._session_lock:
+            if self._session_depth > 0:
+                session_key = (item_key, entry_key)
+
+                # a missing item is written as a deleted one
+                self._session_items[session_key] = None
+                self._dirty_keys.add(session_key)
+            else:
+                connection = self._get_connection()
+
+                connection.execute(DELETE_ITEM_STATEMENT, (item_key, entry_key))
+
+    def _load_item(
+        self, item_key: str, entry_key: str, version: Version, encoded_item: bytes
+    ) -> Optional[Any]:
+        item_schema = ITEM_SCHEMAS[item_key]
+        item = item_schema.load(version, encoded_item)
+
+        # a migrated item is written back, so it's migrated only once
+        if item is not None and not item_schema.is_current(version):
+            self._save_item(item, item_key, entry_key)
+
+        return item
+
+    def _write_encoded_item(
+        self, encoded_item: bytes, item_key: str, entry_key: str
+    ) -> None:
+        connection = self._get_connection()
+        current_version = ITEM_SCHEMAS[item_key].version
+
+        connection.execute(
+            UPSERT_ITEM_STATEMENT,
+            (item_key, entry_key, str(current_version), encoded_item),
+        )
@@ -0,0 +1,180 @@
+# region Licensing
+# SPDX-FileCopyrightText: 2020-2024 Luka Žaja <luka.zaja@protonmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" refind-btrfs - Generate rEFInd manual boot stanzas from Btrfs snapshots
+Copyright (C) 2020-2024 Luka Žaja
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# endregion
+
+import json
+import subprocess
+import time
+from subprocess import CalledProcessError, TimeoutExpired
+from threading import Lock
+from typing import Any
+
+from injector import inject
+
+from refind_btrfs.common import ProcessBundle, constants
+from refind_btrfs.common.abc import BaseProcessExecutor
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.enums import ProcessBundleKey, ProcessBundleMode
+from refind_btrfs.common.exceptions import ProcessBundleError
+
+
+class SubprocessExecutor(BaseProcessExecutor):
+    @inject
+    def __init__(
+        self, logger_factory: BaseLoggerFactory, process_bundle: ProcessBundle
+    ) -> None:
+        self._logger = logger_factory.logger(__name__)
+        self._process_bundle = process_bundle
+        self._cached_outputs: dict[str, str] = {}
+        self._bundled_outputs: dict[str, dict[str, Any]] = {}
+        self._elapsed_times: dict[str, list[float]] = {}
+        self._lock = Lock()
+
+        if process_bundle.is_replaying():
+            self._bundled_outputs = self._load_bundle()
+
+    def run(self, command: list[str]) -> str:
+        logger = self._logger
+        process_bundle = self._process_bundle
+        command_key = constants.SPACE.join(command)
+
+        with self._lock:
+            cached_output = self._cached_outputs.get(command_key)
+
+        if cached_output is not None:
+            logger.debug(f"Reusing the output of command '{command_key}'.")
+
+            return cached_output
+
+        start_time = time.perf_counter()
+
+        if process_bundle.is_replaying():
+            bundled_output = self._replay(command_key)
+        else:
+            bundled_output = self._execute(command)
+
+        elapsed_time = time.perf_counter() - start_time
+        stdout = bundled_output[ProcessBundleKey.STDOUT.value]
+        return_code = bundled_output[ProcessBundleKey.RETURN_CODE.value]
+
+        logger.debug(
+            f"Command '{command_key}' exited with code {return_code} after "
+            f"{elapsed_time:.3f}s and produced {len(stdout)} characters of output."
+        )
+
+        with self._lock:
+            self._elapsed_times.setdefault(command_key, []).append(elapsed_time)
+
+            if process_bundle.is_recording():
+                self._bundled_outputs[command_key] = bundled_output
+                self._save_bundle()
+
+            if return_code == 0:
+                self._cached_outputs[command_key] = stdout
+
+        if return_code != 0:
+            raise CalledProcessError(
+                return_code,
+                command,
+                stdout,
+                bundled_output[ProcessBundleKey.STDERR.value],
+            )
+
+        return stdout
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cached_outputs.clear()
+            self._elapsed_times.clear()
+
+    def has_bundle(self) -> bool:
+        return self._process_bundle.mode != ProcessBundleMode.NONE
+
+    def log_latency_summary(self) -> None:
+        logger = self._logger
+
+        with self._lock:
+            elapsed_times = sorted(
+                self._elapsed_times.items(),
+                key=lambda item: sum(item[1]),
+                reverse=True,
+            )
+
+        for command_key, command_elapsed_times in elapsed_times:
+            logger.info(
+                f"Command '{command_key}' ran {len(command_elapsed_times)} time(s) "
+                f"for {sum(command_elapsed_times):.3f}s in total "
+                f"({max(command_elapsed_times):.3f}s at most)."
+            )
+
+    def _execute(self, command: list[str]) -> dict[str, Any]:
+        timeout = constants.PROCESS_TIMEOUT
+
+        try:
+            process = subprocess.run(
+                command, capture_output=True, check=False, text=True, timeout=timeout
+            )
+        except TimeoutExpired:
+            return {
+                ProcessBundleKey.STDOUT.value: constants.EMPTY_STR,
+                ProcessBundleKey.STDERR.value: f"Timed out after {timeout} seconds.",
+                ProcessBundleKey.RETURN_CODE.value: constants.EX_NOT_OK,
+            }
+
+        return {
+            ProcessBundleKey.STDOUT.value: process.stdout,
+            ProcessBundleKey.STDERR.value: process.stderr,
+            ProcessBundleKey.RETURN_CODE.value: process.returncode,
+        }
+
+    def _replay(self, command_key: str) -> dict[str, Any]:
+        bundled_output = self._bundled_outputs.get(command_key)
+
+        if bundled_output is None:
+            return {
+                ProcessBundleKey.STDOUT.value: constants.EMPTY_STR,
+                ProcessBundleKey.STDERR.value: "No recorded output found.",
+                ProcessBundleKey.RETURN_CODE.value: constants.EX_NOT_OK,
+            }
+
+        return bundled_output
+
+    def _load_bundle(self) -> dict[str, dict[str, Any]]:
+        logger = self._logger
+        file_path = self._process_bundle.file_path
+
+        logger.info(f"Replaying the process outputs from the '{file_path}' file.")
+
+        try:
+            with open(str(file_path), "r", encoding="utf-8") as bundle_file:
+                return json.load(bundle_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.exception("json.load() call failed!")
+            raise ProcessBundleError(
+                f"Could not load the process outputs from the '{file_path}' file!"
+            ) from e
+
+    def _save_bundle(self) -> None:
+        file_path = self._process_bundle.file_path
+
+        with open(str(file_path), "w", encoding="utf-8") as bundle_file:
+            json.dump(self._bundled_outputs, bundle_file, indent=2)
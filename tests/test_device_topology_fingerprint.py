@@ -0,0 +1,118 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from refind_btrfs.common import constants
+from refind_btrfs.utility.helpers import get_device_topology_fingerprint
+
+ESP_UUID = "c12a7328-f81f-11d2-ba4b-00a0c93ec93b"
+
+
+@pytest.fixture
+def root_directory(tmp_path: Path) -> Path:
+    udev_data_directory = tmp_path / constants.UDEV_DATA_DIR
+
+    udev_data_directory.mkdir(parents=True)
+    (tmp_path / constants.MOUNTINFO_FILE).parent.mkdir(parents=True)
+    (tmp_path / constants.PARTITIONS_FILE).write_text("8 0 1000 sda\n")
+    (tmp_path / constants.MOUNTINFO_FILE).write_text(
+        "1 0 0:25 / / rw - btrfs /dev/sda2 rw\n"
+    )
+    (udev_data_directory / "b8:0").write_text("E:ID_FS_TYPE=btrfs\n")
+    (udev_data_directory / "c1:3").write_text("E:DEVNAME=/dev/null\n")
+
+    return tmp_path
+
+
+def test_fingerprint_is_stable_while_the_topology_is_unchanged(
+    root_directory: Path,
+) -> None:
+    fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+    assert fingerprint is not None
+    assert fingerprint == get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+
+@pytest.mark.parametrize(
+    "file_path", [constants.PARTITIONS_FILE, constants.MOUNTINFO_FILE]
+)
+def test_fingerprint_changes_along_with_the_kernel_files(
+    root_directory: Path, file_path: Path
+) -> None:
+    fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+    with (root_directory / file_path).open("a") as kernel_file:
+        kernel_file.write("changed\n")
+
+    assert fingerprint != get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+
+def test_fingerprint_changes_along_with_the_block_device_udev_entries(
+    root_directory: Path,
+) -> None:
+    udev_data_directory = root_directory / constants.UDEV_DATA_DIR
+    udev_entry_path = udev_data_directory / "b8:0"
+    fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+    udev_entry_stat = udev_entry_path.stat()
+
+    os.utime(
+        udev_entry_path,
+        ns=(udev_entry_stat.st_atime_ns, udev_entry_stat.st_mtime_ns + 1),
+    )
+
+    touched_fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+    (udev_data_directory / "b8:16").write_text("E:ID_FS_TYPE=vfat\n")
+
+    added_fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+    assert len({fingerprint, touched_fingerprint, added_fingerprint}) == 3
+
+
+def test_fingerprint_ignores_the_other_udev_entries(root_directory: Path) -> None:
+    fingerprint = get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+    (root_directory / constants.UDEV_DATA_DIR / "c4:1").write_text("E:DEVNAME=tty\n")
+
+    assert fingerprint == get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    )
+
+
+def test_fingerprint_depends_on_the_additional_values(root_directory: Path) -> None:
+    assert get_device_topology_fingerprint(
+        ESP_UUID, root_directory=root_directory
+    ) != get_device_topology_fingerprint(root_directory=root_directory)
+
+
+def test_fingerprint_is_missing_without_the_udev_database(
+    root_directory: Path,
+) -> None:
+    udev_data_directory = root_directory / constants.UDEV_DATA_DIR
+
+    for udev_entry_path in udev_data_directory.iterdir():
+        udev_entry_path.unlink()
+
+    udev_data_directory.rmdir()
+
+    assert (
+        get_device_topology_fingerprint(ESP_UUID, root_directory=root_directory)
+        is None
+    )
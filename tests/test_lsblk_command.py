@@ -0,0 +1,183 @@
+import json
+import logging
+from typing import Iterator, Optional
+from uuid import UUID
+
+import pytest
+
+from refind_btrfs.common.abc import BaseProcessExecutor
+from refind_btrfs.common.abc.factories import BaseLoggerFactory
+from refind_btrfs.common.abc.providers import BasePackageConfigProvider
+from refind_btrfs.device import BlockDevice
+from refind_btrfs.system.lsblk_command import LsblkCommand
+
+ESP_UUID = UUID("c12a7328-f81f-11d2-ba4b-00a0c93ec93b")
+RAID_MEMBER_TYPE = "linux_raid_member"
+
+
+def lsblk_node(
+    name: str,
+    d_type: str,
+    major_minor: str,
+    fs_type: Optional[str] = None,
+    mount_point: Optional[str] = None,
+    children: Optional[list[dict]] = None,
+) -> dict:
+    node = {
+        "name": name,
+        "type": d_type,
+        "maj:min": major_minor,
+        "ptuuid": None,
+        "pttype": "gpt" if d_type == "disk" else None,
+        "partuuid": f"{name}-partuuid" if d_type == "part" else None,
+        "parttype": None,
+        "partlabel": None,
+        "uuid": f"{name}-uuid",
+        "fstype": fs_type,
+        "label": None,
+        "mountpoint": mount_point,
+    }
+
+    if children is not None:
+        node["children"] = children
+
+    return node
+
+
+def raid_array() -> dict:
+    return lsblk_node("/dev/md0", "raid1", "9:0", "btrfs", "/")
+
+
+# lsblk without the --merge option lists the array under both of its members
+TWO_PARENT_TOPOLOGY = {
+    "blockdevices": [
+        lsblk_node(
+            "/dev/sda",
+            "disk",
+            "8:0",
+            children=[
+                lsblk_node("/dev/sda1", "part", "8:1", "vfat", "/boot/efi"),
+                lsblk_node(
+                    "/dev/sda2",
+                    "part",
+                    "8:2",
+                    RAID_MEMBER_TYPE,
+                    children=[raid_array()],
+                ),
+            ],
+        ),
+        lsblk_node(
+            "/dev/sdb",
+            "disk",
+            "8:16",
+            children=[
+                lsblk_node(
+                    "/dev/sdb1",
+                    "part",
+                    "8:17",
+                    RAID_MEMBER_TYPE,
+                    children=[raid_array()],
+                ),
+            ],
+        ),
+    ]
+}
+
+
+class FakeLoggerFactory(BaseLoggerFactory):
+    def get_handler(self) -> logging.Handler:
+        return logging.NullHandler()
+
+
+class FakePackageConfig:
+    esp_uuid = ESP_UUID
+
+
+class FakePackageConfigProvider(BasePackageConfigProvider):
+    def get_config(self) -> FakePackageConfig:  # type: ignore[override]
+        return FakePackageConfig()
+
+
+class FakeProcessExecutor(BaseProcessExecutor):
+    def __init__(self, output: str) -> None:
+        self.commands: list[list[str]] = []
+        self._output = output
+
+    def run(self, command: list[str]) -> str:
+        self.commands.append(command)
+
+        return self._output
+
+    def clear_cache(self) -> None:
+        pass
+
+    def has_bundle(self) -> bool:
+        return False
+
+    def log_latency_summary(self) -> None:
+        pass
+
+
+def walk(block_devices: list[BlockDevice]) -> Iterator[tuple[str, BlockDevice]]:
+    for block_device in block_devices:
+        for dependency in block_device.dependencies or []:
+            yield (block_device.name, dependency)
+
+        yield from walk(block_device.dependencies or [])
+
+
+@pytest.fixture
+def process_executor() -> FakeProcessExecutor:
+    return FakeProcessExecutor(json.dumps(TWO_PARENT_TOPOLOGY))
+
+
+@pytest.fixture
+def lsblk_command(process_executor: FakeProcessExecutor) -> LsblkCommand:
+    return LsblkCommand(
+        FakeLoggerFactory(), FakePackageConfigProvider(), process_executor
+    )
+
+
+def test_lsblk_is_run_once_without_merging(
+    lsblk_command: LsblkCommand, process_executor: FakeProcessExecutor
+) -> None:
+    block_devices = list(lsblk_command.get_block_devices())
+
+    for block_device in block_devices:
+        lsblk_command.get_partition_table_for(block_device)
+
+    assert len(process_executor.commands) == 1
+    assert "--merge" not in process_executor.commands[0]
+
+
+def test_shared_holder_is_a_dependency_of_the_last_parent_only(
+    lsblk_command: LsblkCommand,
+) -> None:
+    block_devices = list(lsblk_command.get_block_devices())
+    raid_array_parents = [
+        parent_name
+        for parent_name, dependency in walk(block_devices)
+        if dependency.name == "/dev/md0"
+    ]
+
+    assert [block_device.name for block_device in block_devices] == [
+        "/dev/sda",
+        "/dev/sdb",
+    ]
+    assert raid_array_parents == ["/dev/sdb1"]
+
+
+@pytest.mark.parametrize("device_name", ["/dev/sda", "/dev/sdb"])
+def test_shared_holder_is_in_the_partition_table_of_every_parent(
+    lsblk_command: LsblkCommand, device_name: str
+) -> None:
+    block_device = next(
+        block_device
+        for block_device in lsblk_command.get_block_devices()
+        if block_device.name == device_name
+    )
+    partition_table = lsblk_command.get_partition_table_for(block_device)
+    root = partition_table.root
+
+    assert root is not None
+    assert root.name == "/dev/md0"
@@ -0,0 +1,230 @@
+import shelve
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional, Type
+from uuid import uuid4
+
+import pytest
+from semantic_version import Version
+
+from refind_btrfs.common import constants
+from refind_btrfs.common.abc.factories import (
+    BaseDeviceCommandFactory,
+    BaseSubvolumeCommandFactory,
+)
+from refind_btrfs.common.abc.providers import BasePersistenceProvider
+from refind_btrfs.common.enums import LocalDbKey
+from refind_btrfs.device import (
+    BlockDevice,
+    Filesystem,
+    Partition,
+    PartitionTable,
+    Subvolume,
+)
+from refind_btrfs.device.subvolume import NumIdRelation, UuidRelation
+from refind_btrfs.state_management.model import (
+    BlockDevices,
+    BlockDeviceTopology,
+    ProcessingResult,
+)
+from refind_btrfs.utility.item_schemas import ITEM_SCHEMAS
+from refind_btrfs.utility.shelve_persistence_provider import (
+    ShelvePersistenceProvider,
+)
+from refind_btrfs.utility.sqlite_persistence_provider import (
+    SqlitePersistenceProvider,
+)
+
+PERSISTENCE_PROVIDER_TYPES = [ShelvePersistenceProvider, SqlitePersistenceProvider]
+
+
+def subvolume(num_id: int, is_read_only: bool = True) -> Subvolume:
+    return Subvolume(
+        Path(f"/.snapshots/{num_id}/snapshot"),
+        f"@/.snapshots/{num_id}/snapshot",
+        datetime(2024, 1, 1, 0, 0, num_id % 60),
+        UuidRelation(uuid4(), uuid4()),
+        NumIdRelation(num_id, 5),
+        is_read_only,
+    )
+
+
+class FakeDeviceCommand:
+    def __init__(self, partition: Partition) -> None:
+        self._partition = partition
+
+    def get_partition_table_for(self, block_device: BlockDevice) -> PartitionTable:
+        return PartitionTable(str(uuid4()), "gpt").with_partitions([self._partition])
+
+
+class FakeDeviceCommandFactory(BaseDeviceCommandFactory):
+    def __init__(self, partition: Partition) -> None:
+        self._partition = partition
+
+    def physical_device_command(self) -> FakeDeviceCommand:  # type: ignore[override]
+        return FakeDeviceCommand(self._partition)
+
+    def live_device_command(self) -> FakeDeviceCommand:  # type: ignore[override]
+        return FakeDeviceCommand(self._partition)
+
+    def static_device_command(self) -> FakeDeviceCommand:  # type: ignore[override]
+        return FakeDeviceCommand(self._partition)
+
+
+class FakeSubvolumeCommand:
+    def __init__(self, root_subvolume: Subvolume) -> None:
+        self._root_subvolume = root_subvolume
+
+    def get_subvolume_from(self, filesystem_path: Path) -> Optional[Subvolume]:
+        return self._root_subvolume
+
+    def get_all_source_snapshots_for(self, parent: Subvolume) -> Iterator[Subvolume]:
+        yield subvolume(257)
+
+
+class FakeSubvolumeCommandFactory(BaseSubvolumeCommandFactory):
+    def __init__(self, root_subvolume: Subvolume) -> None:
+        self._root_subvolume = root_subvolume
+
+    def subvolume_command(self) -> FakeSubvolumeCommand:  # type: ignore[override]
+        return FakeSubvolumeCommand(self._root_subvolume)
+
+
+@pytest.fixture(autouse=True)
+def local_db_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(constants, "DB_FILE", tmp_path / "local_db")
+    monkeypatch.setattr(constants, "SQLITE_DB_FILE", tmp_path / "local_db.sqlite3")
+
+
+@pytest.fixture(params=PERSISTENCE_PROVIDER_TYPES)
+def persistence_provider_type(
+    request: pytest.FixtureRequest,
+) -> Type[BasePersistenceProvider]:
+    return request.param
+
+
+def test_session_hands_out_copies_of_the_cached_items(
+    persistence_provider_type: Type[BasePersistenceProvider],
+) -> None:
+    persistence_provider = persistence_provider_type()
+
+    with persistence_provider.session():
+        persistence_provider.save_current_run_result(
+            ProcessingResult([subvolume(257)])
+        )
+
+        first_result = persistence_provider.get_previous_run_result()
+
+        first_result.bootable_snapshots.append(subvolume(258))
+
+        second_result = persistence_provider.get_previous_run_result()
+
+        assert first_result is not second_result
+        assert len(second_result.bootable_snapshots) == 1
+
+    persisted_result = persistence_provider_type().get_previous_run_result()
+
+    assert len(persisted_result.bootable_snapshots) == 1
+
+
+def test_session_writes_the_saved_items_once_it_ends(
+    persistence_provider_type: Type[BasePersistenceProvider],
+) -> None:
+    persistence_provider = persistence_provider_type()
+    snapshot = subvolume(257)
+
+    with persistence_provider.session():
+        persistence_provider.save_pending_removals([snapshot])
+
+        assert persistence_provider.get_pending_removals() == [snapshot]
+        assert persistence_provider_type().get_pending_removals() == []
+
+    assert persistence_provider_type().get_pending_removals() == [snapshot]
+
+
+def test_saved_topology_never_includes_the_discovered_subvolume(
+    persistence_provider_type: Type[BasePersistenceProvider],
+) -> None:
+    persistence_provider = persistence_provider_type()
+    filesystem = Filesystem(str(uuid4()), "root", constants.BTRFS_TYPE, "/")
+    partition = Partition(str(uuid4()), "/dev/sda2", "root").with_filesystem(
+        filesystem
+    )
+    root_device = BlockDevice("/dev/sda2", "part", "8:2")
+
+    root_device.initialize_live_partition_table_using(
+        FakeDeviceCommandFactory(partition)
+    )
+
+    with persistence_provider.session():
+        persistence_provider.save_block_device_topology(
+            BlockDeviceTopology("fingerprint", BlockDevices(None, root_device, None))
+        )
+
+        filesystem.initialize_subvolume_using(
+            FakeSubvolumeCommandFactory(subvolume(5, False))
+        )
+
+    assert filesystem.has_subvolume()
+
+    persisted_topology = persistence_provider_type().get_block_device_topology()
+
+    assert persisted_topology is not None
+    assert persisted_topology.fingerprint == "fingerprint"
+
+    persisted_root_device = persisted_topology.block_devices.root_device
+
+    assert persisted_root_device is not None
+
+    persisted_root = persisted_root_device.root
+
+    assert persisted_root is not None
+    assert persisted_root.filesystem is not None
+    assert not persisted_root.filesystem.has_subvolume()
+
+
+def test_processing_result_is_migrated_from_the_last_released_version() -> None:
+    value_key = LocalDbKey.PROCESSING_RESULT.value
+    version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
+    source_snapshot = subvolume(257)
+    bootable_snapshot = Subvolume(
+        Path("/root/.refind-btrfs/rwsnap_257"),
+        "@/root/.refind-btrfs/rwsnap_257",
+        datetime.min,
+        UuidRelation(uuid4(), source_snapshot.uuid),
+        NumIdRelation(300, 5),
+        False,
+    ).as_newly_created_from(source_snapshot)
+
+    with shelve.open(str(constants.DB_FILE)) as local_db:
+        local_db[value_key] = ProcessingResult([bootable_snapshot])
+        local_db[version_key] = Version("1.1.0")
+
+    persistence_provider = ShelvePersistenceProvider()
+
+    with persistence_provider.session():
+        processing_result = persistence_provider.get_previous_run_result()
+
+    assert processing_result.bootable_snapshots == [bootable_snapshot]
+
+    migrated_snapshot = processing_result.bootable_snapshots[0]
+
+    assert migrated_snapshot.is_newly_created()
+    assert migrated_snapshot.created_from == source_snapshot
+
+    with shelve.open(str(constants.DB_FILE)) as local_db:
+        assert local_db[version_key] == ITEM_SCHEMAS[value_key].version
+        assert not isinstance(local_db[value_key], ProcessingResult)
+
+
+def test_processing_result_of_an_unknown_version_is_discarded() -> None:
+    value_key = LocalDbKey.PROCESSING_RESULT.value
+    version_key = f"{value_key}_{constants.DB_ITEM_VERSION_SUFFIX}"
+
+    with shelve.open(str(constants.DB_FILE)) as local_db:
+        local_db[value_key] = ProcessingResult([subvolume(257)])
+        local_db[version_key] = Version("1.0.0")
+
+    processing_result = ShelvePersistenceProvider().get_previous_run_result()
+
+    assert not processing_result.has_bootable_snapshots()